@@ -0,0 +1,268 @@
+"""
+Cache sémantique des réponses du LLM.
+
+Une réponse est mémorisée avec l'embedding de la question qui l'a produite.
+Une nouvelle question dont la similarité cosinus avec une question en cache
+dépasse le seuil (config.ANSWER_CACHE_THRESHOLD) reçoit directement la
+réponse et les sources mémorisées, sans recherche ni appel au LLM.
+
+Chaque entrée est liée à un index (chemin + version) et aux documents
+sources qu'elle cite : quand l'index est reconstruit, seules les réponses
+citant une source modifiée sont supprimées, les autres restent valides pour
+la nouvelle version. Les entrées expirent (durée de vie) et les moins
+récemment utilisées sont évincées au-delà de la taille maximale. Le cache
+est stocké dans une base SQLite et survit aux redémarrages.
+"""
+import json
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Ajouter le chemin pour les imports
+sys.path.append(str(Path(__file__).parents[1]))
+
+from utils.logger import setup_logger
+import config
+
+logger = setup_logger("answer_cache")
+
+
+def _index_key(index_path) -> str:
+    return str(Path(index_path).resolve())
+
+
+def _unit(vector: Sequence[float]) -> np.ndarray:
+    array = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(array)
+    return array / norm if norm else array
+
+
+class AnswerCache:
+    """Cache persistant des réponses, interrogé par similarité de question."""
+
+    def __init__(
+        self,
+        cache_path: Path = None,
+        threshold: float = None,
+        max_entries: int = None,
+        ttl_seconds: float = None
+    ):
+        self.cache_path = Path(cache_path or config.ANSWER_CACHE_PATH)
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        self.threshold = config.ANSWER_CACHE_THRESHOLD if threshold is None else threshold
+        self.max_entries = max_entries or config.ANSWER_CACHE_MAX_ENTRIES
+        self.ttl_seconds = config.ANSWER_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.cache_path), timeout=30, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS answers (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                index_key TEXT NOT NULL,
+                index_version TEXT NOT NULL,
+                model TEXT NOT NULL,
+                question TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                answer TEXT NOT NULL,
+                sources TEXT NOT NULL,
+                provider TEXT,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS answers_index ON answers (index_key, index_version, model);
+        """)
+        # Matrices des questions en mémoire, par (index, version, modèle)
+        self._matrices: Dict[Tuple[str, str, str], Tuple[np.ndarray, np.ndarray]] = {}
+        self._data_version = None
+        self.hits = 0
+        self.misses = 0
+
+    def _refresh(self) -> None:
+        """Oublie les matrices en mémoire si un autre processus a écrit dans la base."""
+        data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version != self._data_version:
+            self._matrices.clear()
+            self._data_version = data_version
+
+    def _matrix(self, key: Tuple[str, str, str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Identifiants et embeddings normalisés des entrées valides d'un index."""
+        self._refresh()
+        if key not in self._matrices:
+            rows = self._conn.execute(
+                "SELECT id, embedding, created_at FROM answers "
+                "WHERE index_key = ? AND index_version = ? AND model = ?", key
+            ).fetchall()
+            if self.ttl_seconds:
+                oldest = time.time() - self.ttl_seconds
+                rows = [row for row in rows if row[2] >= oldest]
+            ids = np.array([row[0] for row in rows], dtype=np.int64)
+            matrix = (np.stack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+                      if rows else np.zeros((0, 0), dtype=np.float32))
+            self._matrices[key] = (ids, matrix)
+        return self._matrices[key]
+
+    def lookup(self, index_path, index_version: Optional[str], model: str,
+               query_vector: Sequence[float]) -> Optional[Dict[str, Any]]:
+        """
+        Cherche une réponse à une question similaire.
+
+        Args:
+            index_path: Dossier de l'index interrogé
+            index_version: Version courante de l'index
+            model: Modèle d'embeddings de la question
+            query_vector: Embedding de la question
+
+        Returns:
+            Dictionnaire (question, answer, sources, provider, similarity), ou None
+        """
+        key = (_index_key(index_path), index_version or "", model)
+        query = _unit(query_vector)
+        with self._lock:
+            ids, matrix = self._matrix(key)
+            if not len(ids) or matrix.shape[1] != query.shape[0]:
+                self.misses += 1
+                return None
+            similarities = matrix @ query
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+            if similarity < self.threshold:
+                self.misses += 1
+                return None
+
+            entry_id = int(ids[best])
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE answers SET last_used = ?, hits = hits + 1 WHERE id = ?",
+                    (time.time(), entry_id)
+                )
+            row = self._conn.execute(
+                "SELECT question, answer, sources, provider FROM answers WHERE id = ?", (entry_id,)
+            ).fetchone()
+            self.hits += 1
+
+        logger.info(f"♻️  Réponse en cache (similarité {similarity:.3f}): {row[0][:60]}")
+        return {
+            "question": row[0],
+            "answer": row[1],
+            "sources": json.loads(row[2]),
+            "provider": row[3],
+            "similarity": similarity,
+        }
+
+    def store(self, index_path, index_version: Optional[str], model: str, question: str,
+              query_vector: Sequence[float], answer: str, sources: Iterable[str],
+              provider: Optional[str] = None) -> None:
+        """
+        Mémorise la réponse à une question.
+
+        Args:
+            index_path: Dossier de l'index interrogé
+            index_version: Version de l'index utilisée pour la réponse
+            model: Modèle d'embeddings de la question
+            question: Question posée
+            query_vector: Embedding de la question
+            answer: Réponse du LLM
+            sources: Documents sources cités dans le contexte
+            provider: Fournisseur LLM ayant répondu
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO answers (index_key, index_version, model, question, embedding, answer, "
+                "sources, provider, created_at, last_used) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (_index_key(index_path), index_version or "", model, question,
+                 _unit(query_vector).tobytes(), answer,
+                 json.dumps(sorted(set(sources)), ensure_ascii=False), provider, now, now)
+            )
+            self._evict(now)
+            self._matrices.clear()
+
+    def _evict(self, now: float) -> None:
+        """Supprime les entrées expirées puis les moins récemment utilisées."""
+        if self.ttl_seconds:
+            self._conn.execute("DELETE FROM answers WHERE created_at < ?", (now - self.ttl_seconds,))
+        self._conn.execute(
+            "DELETE FROM answers WHERE id IN (SELECT id FROM answers ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+
+    def on_index_updated(self, index_path, old_version: Optional[str], new_version: str,
+                         changed_sources: Optional[Iterable[str]] = None) -> Dict[str, int]:
+        """
+        Rattache les réponses à la nouvelle version d'un index.
+
+        Les réponses citant une source modifiée sont supprimées ; les autres
+        passent à `new_version`. Sans liste de sources modifiées (reconstruction
+        complète), toutes les réponses de l'index sont supprimées.
+
+        Args:
+            index_path: Dossier de l'index reconstruit
+            old_version: Version précédente de l'index
+            new_version: Nouvelle version
+            changed_sources: Sources ajoutées, modifiées ou supprimées
+
+        Returns:
+            Nombre de réponses conservées (kept) et supprimées (deleted)
+        """
+        index_key = _index_key(index_path)
+        changed = None if changed_sources is None else set(changed_sources)
+        kept, deleted = [], []
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                "SELECT id, index_version, sources FROM answers WHERE index_key = ?", (index_key,)
+            ).fetchall()
+            for entry_id, version, sources in rows:
+                if changed is None or version != (old_version or "") or changed & set(json.loads(sources)):
+                    deleted.append(entry_id)
+                else:
+                    kept.append(entry_id)
+            self._conn.executemany("DELETE FROM answers WHERE id = ?", [(i,) for i in deleted])
+            self._conn.executemany(
+                "UPDATE answers SET index_version = ? WHERE id = ?", [(new_version, i) for i in kept]
+            )
+            self._matrices.clear()
+        if rows:
+            logger.info(f"Cache des réponses: {len(kept)} conservées, {len(deleted)} supprimées "
+                        f"après mise à jour de {Path(index_path).name}")
+        return {"kept": len(kept), "deleted": len(deleted)}
+
+    def clear(self) -> None:
+        """Vide complètement le cache."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM answers")
+            self._matrices.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Nombre d'entrées, succès et échecs depuis le démarrage du processus."""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+_shared_cache: Optional[AnswerCache] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_cache() -> AnswerCache:
+    """Retourne le cache des réponses partagé du processus."""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = AnswerCache()
+        return _shared_cache
+
+
+def cited_sources(docs) -> List[str]:
+    """Sources distinctes des documents du contexte, dans l'ordre d'apparition."""
+    return list(dict.fromkeys(doc.metadata.get('source', 'Unknown') for doc in docs))
@@ -0,0 +1,210 @@
+"""
+Décision d'appeler ou non le LLM selon la confiance de la recherche.
+
+La recherche renvoie la similarité cosinus de chaque chunk avec la question
+(`scored_search`). Selon le meilleur score et le type du document
+(config.LLM_GATING_THRESHOLDS) :
+
+- sous `min_score`, aucun extrait n'est pertinent : réponse « pas dans les
+  règlements », sans appel au LLM ;
+- au-dessus de `direct_score`, un extrait répond presque mot pour mot :
+  il est renvoyé directement, avec sa source ;
+- entre les deux, le LLM rédige la réponse.
+
+La politique compte les appels au LLM évités.
+"""
+import sys
+import threading
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from langchain_core.documents import Document
+
+# Ajouter le chemin pour les imports
+sys.path.append(str(Path(__file__).parents[1]))
+
+from utils.logger import setup_logger
+import config
+
+logger = setup_logger("answer_gating")
+
+LLM = "llm"
+NOT_FOUND = "not_found"
+EXTRACTIVE = "extractive"
+
+
+def distance_space(store) -> str:
+    """
+    Type de distance renvoyé par `similarity_search_with_score`.
+
+    Returns:
+        "l2" (FAISS, NumpyVectorStore, Chroma par défaut), "cosine" ou "ip"
+        (Chroma, selon `hnsw:space`), "max_inner_product" (FAISS en produit scalaire)
+    """
+    collection = getattr(store, "_collection", None)
+    if collection is not None:
+        return (getattr(collection, "metadata", None) or {}).get("hnsw:space", "l2")
+    strategy = getattr(store, "distance_strategy", None)
+    if str(getattr(strategy, "value", strategy)).upper() == "MAX_INNER_PRODUCT":
+        return "max_inner_product"
+    return "l2"
+
+
+def cosine_from_distance(distance: float, space: str = "l2") -> float:
+    """
+    Convertit une distance en similarité cosinus (embeddings normalisés).
+
+    Args:
+        distance: Valeur renvoyée par la base
+        space: Type de distance (voir `distance_space`)
+
+    Returns:
+        Similarité cosinus, bornée à [-1, 1]
+    """
+    if space == "l2":
+        cosine = 1.0 - float(distance) / 2.0  # |a - b|² = 2 - 2 cos(a, b)
+    elif space in ("cosine", "ip"):
+        cosine = 1.0 - float(distance)  # Chroma : 1 - cos, ou 1 - produit scalaire
+    elif space == "max_inner_product":
+        cosine = float(distance)
+    else:
+        raise ValueError(f"Type de distance inconnu: {space}")
+    return max(-1.0, min(1.0, cosine))
+
+
+def scored_search(store, question: str, k: int) -> List[Document]:
+    """
+    Recherche avec scores (`similarity_search_with_score`).
+
+    Args:
+        store: Base vectorielle LangChain (FAISS, Chroma, NumpyVectorStore)
+        question: Question de l'utilisateur
+        k: Nombre de chunks
+
+    Returns:
+        Copies des chunks, du plus au moins similaire, avec la similarité
+        cosinus dans `metadata['score']`
+    """
+    space = distance_space(store)
+    docs = [
+        Document(page_content=doc.page_content,
+                 metadata={**doc.metadata, 'score': cosine_from_distance(distance, space)})
+        for doc, distance in store.similarity_search_with_score(question, k=k)
+    ]
+    docs.sort(key=lambda doc: doc.metadata['score'], reverse=True)
+    return docs
+
+
+def dense_scored(docs: List[Document]) -> List[Document]:
+    """
+    Chunks d'un retriever, notés par leur similarité cosinus avec la question.
+
+    Les retrievers hybride et MMR placent cette similarité dans
+    `metadata['dense_score']` (le `score` hybride est un score fusionné, non
+    comparable aux seuils). Les chunks sans `dense_score` (BM25) gardent un
+    score absent : la décision revient alors au LLM.
+
+    Args:
+        docs: Chunks renvoyés par le retriever
+
+    Returns:
+        Copies des chunks, du plus au moins similaire, avec `metadata['score']`
+    """
+    scored = [
+        Document(page_content=doc.page_content,
+                 metadata={**doc.metadata, 'score': doc.metadata.get('dense_score')})
+        for doc in docs
+    ]
+    if all(doc.metadata['score'] is not None for doc in scored):
+        scored.sort(key=lambda doc: doc.metadata['score'], reverse=True)
+    return scored
+
+
+def thresholds_for(doc_type: str) -> Tuple[float, float]:
+    """
+    Seuils (min_score, direct_score) pour un type de document.
+
+    Les types sont comparés sans tenir compte de la casse ; un type sans
+    réglage propre reprend les valeurs de "default".
+    """
+    thresholds = {name.lower(): values for name, values in config.LLM_GATING_THRESHOLDS.items()}
+    values = {**thresholds["default"], **thresholds.get(str(doc_type).lower(), {})}
+    return values["min_score"], values["direct_score"]
+
+
+class GatingPolicy:
+    """Choix entre LLM, réponse extractive et « pas dans les règlements »."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts: Dict[str, int] = {LLM: 0, NOT_FOUND: 0, EXTRACTIVE: 0}
+
+    def decide(self, docs: List[Document]) -> str:
+        """
+        Décide comment répondre à partir des chunks récupérés.
+
+        Args:
+            docs: Chunks de `scored_search`, le meilleur en premier
+
+        Returns:
+            LLM, NOT_FOUND ou EXTRACTIVE
+        """
+        if not docs:
+            decision = NOT_FOUND
+        elif not config.LLM_GATING_ENABLED:
+            decision = LLM
+        else:
+            best = docs[0]
+            score = best.metadata.get('score')
+            doc_type = best.metadata.get('doc_type', 'default')
+            min_score, direct_score = thresholds_for(doc_type)
+            if score is None:
+                decision = LLM
+            elif score < min_score:
+                decision = NOT_FOUND
+            elif score >= direct_score:
+                decision = EXTRACTIVE
+            else:
+                decision = LLM
+
+        with self._lock:
+            self.counts[decision] += 1
+            avoided = self.counts[NOT_FOUND] + self.counts[EXTRACTIVE]
+        if decision != LLM:
+            score_text = f"{docs[0].metadata.get('score', 0):.2f}" if docs else "aucun résultat"
+            logger.info(f"🚦 Appel LLM évité ({decision}, meilleur score {score_text}) — "
+                        f"{avoided} évités au total")
+        return decision
+
+    def stats(self) -> Dict[str, float]:
+        """Décisions prises depuis le démarrage et part des appels LLM évités."""
+        with self._lock:
+            total = sum(self.counts.values())
+            avoided = self.counts[NOT_FOUND] + self.counts[EXTRACTIVE]
+            return {
+                **self.counts,
+                "avoided": avoided,
+                "avoided_rate": avoided / total if total else 0.0,
+            }
+
+
+_shared_policy = None
+_shared_lock = threading.Lock()
+
+
+def get_policy() -> GatingPolicy:
+    """Retourne la politique partagée du processus."""
+    global _shared_policy
+    with _shared_lock:
+        if _shared_policy is None:
+            _shared_policy = GatingPolicy()
+        return _shared_policy
+
+
+def extractive_answer(docs: List[Document]) -> str:
+    """Réponse directe : le meilleur extrait, avec sa source."""
+    best = docs[0]
+    source = best.metadata.get('source', 'Unknown')
+    page = best.metadata.get('page')
+    citation = f"{source}, page {page}" if page is not None else source
+    return f"{best.page_content.strip()}\n\n📄 Source : {citation}"
@@ -0,0 +1,293 @@
+"""
+Index BM25 précalculé et persistant.
+
+Les statistiques BM25 (corpus tokenisé, fréquences documentaires, longueurs)
+sont calculées une seule fois à l'indexation puis sauvegardées à côté de la
+base Chroma sous forme de tableaux NumPy. À la requête, les fichiers sont
+ouverts en mémoire mappée : aucun `db.get()` ni reconstruction du corpus.
+
+Format du dossier :
+    manifest.json      version de l'index vectoriel, paramètres BM25
+    vocab.json         liste des termes (l'identifiant est la position)
+    doc_freqs.npy      int32[V]   nombre de documents contenant le terme
+    postings_ptr.npy   int64[V+1] début des postings de chaque terme
+    postings_doc.npy   int32[P]   identifiants des documents
+    postings_tf.npy    uint16[P]  fréquence du terme dans le document
+    doc_lengths.npy    int32[N]   longueur (en tokens) de chaque document
+    texts.bin          textes UTF-8 concaténés
+    text_ptr.npy       int64[N+1] position de chaque texte dans texts.bin
+    metadatas.json     métadonnées des documents
+"""
+import json
+import re
+import shutil
+import sys
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+# Ajouter le chemin pour les imports
+sys.path.append(str(Path(__file__).parents[1]))
+
+from utils.logger import setup_logger
+
+logger = setup_logger("bm25_index")
+
+FORMAT_VERSION = 1
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Découpe un texte en tokens pour BM25 (minuscules, mots alphanumériques).
+
+    Args:
+        text: Texte à découper
+
+    Returns:
+        Liste de tokens
+    """
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25IndexBuilder:
+    """Accumule les documents puis écrit l'index BM25 sur disque."""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._texts: List[str] = []
+        self._metadatas: List[Dict[str, Any]] = []
+        self._term_counts: List[Counter] = []
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    def add(self, texts: Iterable[str], metadatas: Optional[Iterable[Dict[str, Any]]] = None) -> None:
+        """
+        Ajoute des documents à l'index.
+
+        Args:
+            texts: Contenus des documents
+            metadatas: Métadonnées associées (même ordre que `texts`)
+        """
+        texts = list(texts)
+        metadatas = list(metadatas) if metadatas is not None else [{} for _ in texts]
+        for text, metadata in zip(texts, metadatas):
+            self._texts.append(text)
+            self._metadatas.append(dict(metadata or {}))
+            self._term_counts.append(Counter(tokenize(text)))
+
+    def add_documents(self, documents: Iterable[Document]) -> None:
+        """Ajoute des `Document` LangChain à l'index."""
+        documents = list(documents)
+        self.add([d.page_content for d in documents], [d.metadata for d in documents])
+
+    def save(self, index_dir: Path, index_version: Optional[str] = None) -> Path:
+        """
+        Écrit l'index dans `index_dir` (remplace un éventuel index existant).
+
+        Args:
+            index_dir: Dossier de destination
+            index_version: Version de l'index vectoriel associé
+
+        Returns:
+            Chemin du dossier écrit
+        """
+        index_dir = Path(index_dir)
+        tmp_dir = index_dir.with_name(index_dir.name + ".tmp")
+        if tmp_dir.exists():
+            shutil.rmtree(tmp_dir)
+        tmp_dir.mkdir(parents=True)
+
+        vocab = sorted({term for counts in self._term_counts for term in counts})
+        term_ids = {term: i for i, term in enumerate(vocab)}
+
+        # Postings regroupés par terme (format CSR)
+        postings: List[List[tuple]] = [[] for _ in vocab]
+        for doc_id, counts in enumerate(self._term_counts):
+            for term, tf in counts.items():
+                postings[term_ids[term]].append((doc_id, tf))
+
+        ptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        ptr[1:] = np.cumsum([len(p) for p in postings])
+        postings_doc = np.fromiter(
+            (doc_id for plist in postings for doc_id, _ in plist), dtype=np.int32, count=int(ptr[-1])
+        )
+        postings_tf = np.fromiter(
+            (min(tf, 65535) for plist in postings for _, tf in plist), dtype=np.uint16, count=int(ptr[-1])
+        )
+        doc_freqs = np.diff(ptr).astype(np.int32)
+        doc_lengths = np.array([sum(c.values()) for c in self._term_counts], dtype=np.int32)
+
+        encoded = [text.encode("utf-8") for text in self._texts]
+        text_ptr = np.zeros(len(encoded) + 1, dtype=np.int64)
+        text_ptr[1:] = np.cumsum([len(e) for e in encoded])
+
+        np.save(tmp_dir / "doc_freqs.npy", doc_freqs)
+        np.save(tmp_dir / "postings_ptr.npy", ptr)
+        np.save(tmp_dir / "postings_doc.npy", postings_doc)
+        np.save(tmp_dir / "postings_tf.npy", postings_tf)
+        np.save(tmp_dir / "doc_lengths.npy", doc_lengths)
+        np.save(tmp_dir / "text_ptr.npy", text_ptr)
+        (tmp_dir / "texts.bin").write_bytes(b"".join(encoded))
+        (tmp_dir / "vocab.json").write_text(json.dumps(vocab, ensure_ascii=False), encoding="utf-8")
+        (tmp_dir / "metadatas.json").write_text(
+            json.dumps(self._metadatas, ensure_ascii=False, default=str), encoding="utf-8"
+        )
+        manifest = {
+            "format": FORMAT_VERSION,
+            "index_version": index_version,
+            "num_docs": len(self._texts),
+            "vocab_size": len(vocab),
+            "avg_doc_length": float(doc_lengths.mean()) if len(doc_lengths) else 0.0,
+            "k1": self.k1,
+            "b": self.b,
+        }
+        (tmp_dir / "manifest.json").write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+
+        # Remplacement du dossier en fin d'écriture
+        if index_dir.exists():
+            shutil.rmtree(index_dir)
+        tmp_dir.rename(index_dir)
+
+        logger.info(f"Index BM25 sauvegardé: {index_dir} "
+                    f"({len(self._texts)} documents, {len(vocab)} termes)")
+        return index_dir
+
+
+class BM25Index:
+    """Index BM25 en lecture seule, ouvert en mémoire mappée."""
+
+    def __init__(self, index_dir: Path):
+        self.index_dir = Path(index_dir)
+        self.manifest = json.loads((self.index_dir / "manifest.json").read_text(encoding="utf-8"))
+        if self.manifest.get("format") != FORMAT_VERSION:
+            raise ValueError(f"Format d'index BM25 non supporté: {self.manifest.get('format')}")
+
+        vocab = json.loads((self.index_dir / "vocab.json").read_text(encoding="utf-8"))
+        self.term_ids = {term: i for i, term in enumerate(vocab)}
+        self.k1 = self.manifest["k1"]
+        self.b = self.manifest["b"]
+        self.num_docs = self.manifest["num_docs"]
+        self.avg_doc_length = self.manifest["avg_doc_length"] or 1.0
+
+        self.doc_freqs = np.load(self.index_dir / "doc_freqs.npy", mmap_mode="r")
+        self.postings_ptr = np.load(self.index_dir / "postings_ptr.npy", mmap_mode="r")
+        self.postings_doc = np.load(self.index_dir / "postings_doc.npy", mmap_mode="r")
+        self.postings_tf = np.load(self.index_dir / "postings_tf.npy", mmap_mode="r")
+        self.doc_lengths = np.load(self.index_dir / "doc_lengths.npy", mmap_mode="r")
+        self.text_ptr = np.load(self.index_dir / "text_ptr.npy", mmap_mode="r")
+        texts_path = self.index_dir / "texts.bin"
+        self._texts = (
+            np.memmap(texts_path, dtype=np.uint8, mode="r")
+            if texts_path.stat().st_size else np.zeros(0, dtype=np.uint8)
+        )
+        self._metadatas: Optional[List[Dict[str, Any]]] = None
+
+        # Normalisation de longueur précalculée une fois par processus
+        self._length_norm = (
+            self.k1 * (1 - self.b + self.b * np.asarray(self.doc_lengths, dtype=np.float32) / self.avg_doc_length)
+        )
+
+    @property
+    def index_version(self) -> Optional[str]:
+        return self.manifest.get("index_version")
+
+    def __len__(self) -> int:
+        return self.num_docs
+
+    def get_scores(self, query: str) -> np.ndarray:
+        """
+        Calcule le score BM25 de chaque document pour `query`.
+
+        Args:
+            query: Requête en texte libre
+
+        Returns:
+            Tableau float32 de taille N
+        """
+        scores = np.zeros(self.num_docs, dtype=np.float32)
+        for term, qtf in Counter(tokenize(query)).items():
+            term_id = self.term_ids.get(term)
+            if term_id is None:
+                continue
+            start, end = self.postings_ptr[term_id], self.postings_ptr[term_id + 1]
+            docs = self.postings_doc[start:end]
+            tf = self.postings_tf[start:end].astype(np.float32)
+            df = float(self.doc_freqs[term_id])
+            idf = np.log1p((self.num_docs - df + 0.5) / (df + 0.5))
+            scores[docs] += qtf * idf * tf * (self.k1 + 1) / (tf + self._length_norm[docs])
+        return scores
+
+    def top_k(self, query: str, k: int) -> List[tuple]:
+        """
+        Retourne les `k` meilleurs documents.
+
+        Args:
+            query: Requête en texte libre
+            k: Nombre de résultats
+
+        Returns:
+            Liste de tuples (doc_id, score) triée par score décroissant
+        """
+        scores = self.get_scores(query)
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(int(i), float(scores[i])) for i in candidates if scores[i] > 0]
+
+    def get_metadatas(self) -> List[Dict[str, Any]]:
+        """Métadonnées de tous les documents, dans l'ordre des identifiants (chargées à la demande)."""
+        if self._metadatas is None:
+            self._metadatas = json.loads((self.index_dir / "metadatas.json").read_text(encoding="utf-8"))
+        return self._metadatas
+
+    def get_document(self, doc_id: int) -> Document:
+        """Reconstruit le `Document` d'identifiant `doc_id`."""
+        start, end = self.text_ptr[doc_id], self.text_ptr[doc_id + 1]
+        text = bytes(self._texts[start:end]).decode("utf-8")
+        return Document(page_content=text, metadata=dict(self.get_metadatas()[doc_id]))
+
+
+class PrebuiltBM25Retriever(BaseRetriever):
+    """Retriever LangChain adossé à un `BM25Index` précalculé."""
+
+    index: Any
+    k: int = 4
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return [self.index.get_document(doc_id) for doc_id, _ in self.index.top_k(query, self.k)]
+
+
+def load_bm25_index(index_dir: Path, expected_version: Optional[str] = None) -> Optional[BM25Index]:
+    """
+    Ouvre l'index BM25 s'il existe et correspond à l'index vectoriel.
+
+    Args:
+        index_dir: Dossier de l'index BM25
+        expected_version: Version attendue de l'index vectoriel
+
+    Returns:
+        Index ouvert, ou None s'il est absent ou périmé
+    """
+    if not (Path(index_dir) / "manifest.json").exists():
+        return None
+    try:
+        index = BM25Index(index_dir)
+    except Exception as e:
+        logger.warning(f"Index BM25 illisible ({index_dir}): {e}")
+        return None
+    if index.index_version != expected_version:
+        logger.info(f"Index BM25 périmé (version {index.index_version}, attendue {expected_version})")
+        return None
+    return index
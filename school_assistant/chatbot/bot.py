@@ -1,20 +1,27 @@
 #!/usr/bin/env python3
 """
 Chatbot RAG amélioré avec support multi-LLM
-- OpenAI (si clé API disponible)
+- Groq, OpenAI, DeepSeek (si clé API disponible)
 - Ollama (local, gratuit)
 - Fallback sur recherche documentaire
 """
-import os
 import sys
+from pathlib import Path
 from dotenv import load_dotenv
-from typing import Optional, List
+from typing import Optional, List, Tuple
 from langchain_core.documents import Document
 
+sys.path.append(str(Path(__file__).parents[1]))
+
 # Imports protégés
 try:
-    from langchain_community.vectorstores import FAISS
-    from langchain_community.embeddings import SentenceTransformerEmbeddings
+    from chatbot import engine_registry
+    from chatbot import answer_cache
+    from chatbot import answer_gating
+    from chatbot import llm_providers
+    from chatbot.context_packing import PackedContext, pack_context
+    from chatbot.context_compression import compressor
+    import config
 except ImportError as e:
     print(f"ERREUR D'IMPORT CRITIQUE: {e}")
     print("Installez les dépendances: pip install -r requirements.txt")
@@ -22,6 +29,65 @@ except ImportError as e:
 
 load_dotenv()
 
+FAISS_DIR = Path(__file__).resolve().parents[1] / "data" / "faiss_index"
+FAISS_MODEL = "all-MiniLM-L6-v2"
+
+
+def load_faiss_retriever(k: int = 3):
+    """Retourne le retriever FAISS partagé (chargé une seule fois par processus)."""
+    return engine_registry.get_retriever(
+        FAISS_DIR, FAISS_MODEL, ("similarity", k),
+        lambda: engine_registry.get_faiss_store(FAISS_DIR, FAISS_MODEL).as_retriever(
+            search_kwargs={"k": k}
+        )
+    )
+
+
+def search_faiss(question: str, k: int = 3) -> List[Document]:
+    """Chunks les plus proches de la question, avec leur similarité cosinus (`metadata['score']`)."""
+    return answer_gating.scored_search(engine_registry.get_faiss_store(FAISS_DIR, FAISS_MODEL), question, k)
+
+
+def warm_up():
+    """Précharge le modèle et l'index FAISS avant la première question."""
+    engine_registry.warm_up(load_faiss_retriever)
+
+
+def find_cached_answer(question: str) -> Tuple[List[float], Optional[dict]]:
+    """
+    Cherche une réponse déjà donnée à une question similaire.
+    
+    Returns:
+        Tuple (embedding de la question, réponse en cache ou None)
+    """
+    query_vector = engine_registry.get_cached_embeddings(FAISS_MODEL, normalize=False).embed_query(question)
+    if not config.ANSWER_CACHE_ENABLED:
+        return query_vector, None
+    cached = answer_cache.get_shared_cache().lookup(
+        FAISS_DIR, engine_registry.read_index_version(FAISS_DIR), FAISS_MODEL, query_vector
+    )
+    return query_vector, cached
+
+
+def remember_answer(question: str, query_vector: List[float], answer: str,
+                    docs: List[Document], provider: str) -> None:
+    """Mémorise une réponse du LLM avec les sources de son contexte."""
+    if not config.ANSWER_CACHE_ENABLED:
+        return
+    answer_cache.get_shared_cache().store(
+        FAISS_DIR, engine_registry.read_index_version(FAISS_DIR), FAISS_MODEL,
+        question, query_vector, answer, answer_cache.cited_sources(docs), provider
+    )
+
+
+def build_context(docs: List[Document], query_vector: List[float]) -> PackedContext:
+    """
+    Prépare le contexte du prompt : chunks fusionnés, phrases proches de la
+    question, dans le budget de tokens.
+    """
+    embeddings = engine_registry.get_sentence_embeddings(FAISS_MODEL, normalize=False)
+    return pack_context(docs, compress=compressor(query_vector, embeddings))
+
 
 def _format_excerpts(docs: List[Document]) -> str:
     """Formate les extraits de documents de manière lisible."""
@@ -41,197 +107,89 @@ def _format_excerpts(docs: List[Document]) -> str:
     return formatted
 
 
-def _try_groq(context: str, question: str) -> Optional[str]:
-    """Tente d'utiliser Groq (priorité 1 - gratuit et rapide)."""
-    api_key = os.getenv("GROQ_API_KEY")
-    
-    if not api_key:
-        return None
-    
-    try:
-        from langchain_groq import ChatGroq
-        
-        llm = ChatGroq(
-            model="llama-3.3-70b-versatile",
-            groq_api_key=api_key,
-            temperature=0
-        )
-        
-        prompt = f"""Tu es un assistant scolaire spécialisé dans les règlements de l'Académie Provinciale des Métiers (APM).
-
-Utilise UNIQUEMENT les informations suivantes pour répondre à la question.
-Si la réponse n'est pas dans le contexte, dis-le clairement.
-
-CONTEXTE DES RÈGLEMENTS :
-{context}
-
-QUESTION : {question}
-
-RÉPONSE (en français, claire et concise) :"""
-
-        response = llm.invoke(prompt)
-        return response.content
-        
-    except Exception as e:
-        return None
-
-
-def _try_openai(context: str, question: str) -> Optional[str]:
-    """Tente d'utiliser OpenAI."""
-    api_key = os.getenv("OPENAI_API_KEY")
-    
-    if not api_key:
-        return None
-    
-    try:
-        from langchain_openai import ChatOpenAI  # Compatible DeepSeek
-        
-        llm = ChatOpenAI(
-            temperature=0,
-            model_name="gpt-3.5-turbo",
-            openai_api_key=api_key
-        )
-        
-        prompt = f"""Tu es un assistant scolaire spécialisé dans les règlements de l'Académie Provinciale des Métiers (APM).
-
-Utilise UNIQUEMENT les informations suivantes pour répondre à la question.
-Si la réponse n'est pas dans le contexte, dis-le clairement.
-
-CONTEXTE DES RÈGLEMENTS :
-{context}
-
-QUESTION : {question}
-
-RÉPONSE (en français, claire et concise) :"""
-
-        response = llm.invoke(prompt)
-        return response.content
-        
-    except Exception as e:
-        error_msg = str(e)
-        if "insufficient_quota" in error_msg or "429" in error_msg:
-            return None  # Quota épuisé, essayer Ollama
-        raise
-
-
-def _try_ollama(context: str, question: str) -> Optional[str]:
-    """Tente d'utiliser Ollama."""
-    try:
-        from langchain_community.llms import Ollama
-        
-        base_url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
-        model = os.getenv("OLLAMA_MODEL", "mistral")
-        
-        llm = Ollama(
-            base_url=base_url,
-            model=model,
-            temperature=0
-        )
-        
-        prompt = f"""Tu es un assistant scolaire spécialisé dans les règlements de l'APM.
-
-Utilise UNIQUEMENT les informations suivantes pour répondre.
-
-CONTEXTE :
-{context}
-
-QUESTION : {question}
-
-RÉPONSE (française, concise) :"""
-
-        response = llm.invoke(prompt)
-        return response
-        
-    except Exception as e:
-        # Ollama non installé ou non démarré
-        return None
-
-
 def ask_bot(question: str, verbose: bool = True):
     """
     Recherche et répond à une question sur les règlements.
     
-    Stratégie de fallback :
-    1. OpenAI (si clé valide)
-    2. Ollama (si installé et démarré)
-    3. Recherche documentaire (toujours disponible)
+    Stratégie :
+    0. Sans extrait assez proche de la question : « pas dans les règlements » ;
+       extrait quasi identique à la question : réponse directe (sans LLM)
+    1. Groq, OpenAI, DeepSeek et Ollama, du plus rapide au plus lent selon
+       les temps de réponse observés, lancés en parallèle avec couverture :
+       le suivant démarre si le précédent tarde ou échoue, la première
+       réponse est retenue
+    2. Recherche documentaire (toujours disponible, et si le délai global
+       est dépassé)
     """
-    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    db_dir = os.path.join(base_dir, "data", "faiss_index")
-
-    # 1. Charger la base FAISS
+    # 1. Charger la base FAISS (partagée entre les questions)
     if verbose:
         print(f"\n🔍 Recherche pour : '{question}'")
     
     try:
-        embedding_function = SentenceTransformerEmbeddings(model_name="all-MiniLM-L6-v2")
-        db = FAISS.load_local(db_dir, embedding_function, allow_dangerous_deserialization=True)
+        engine_registry.get_faiss_store(FAISS_DIR, FAISS_MODEL)
     except Exception as e:
         print(f"❌ Erreur lors du chargement de la base : {e}")
         print(f"   Exécutez d'abord : python school_assistant/chatbot/setup_rag.py")
         return
 
-    # 2. Récupérer les documents pertinents
-    retriever = db.as_retriever(search_kwargs={"k": 3})
-    docs = retriever.invoke(question)
+    # 2. Réponse déjà donnée à une question similaire ?
+    query_vector, cached = find_cached_answer(question)
+    if cached:
+        if verbose:
+            print(f"   ♻️  Réponse en cache (similarité {cached['similarity']:.2f})")
+        print(f"\n{'='*70}")
+        print("📝 RÉPONSE")
+        print('='*70)
+        print(cached['answer'])
+        print(f"\n📚 Sources : {', '.join(cached['sources'])}")
+        print('='*70)
+        return
+    
+    # 3. Récupérer les documents pertinents
+    docs = search_faiss(question, k=3)
     
-    if not docs:
-        print("\n⚠️  Aucun document pertinent trouvé.")
+    # 4. Le LLM est-il utile ? (seuils par type de document)
+    decision = answer_gating.get_policy().decide(docs)
+    if decision == answer_gating.NOT_FOUND:
+        print(f"\n⚠️  {config.LLM_GATING_NOT_FOUND_MESSAGE}")
+        return
+    if decision == answer_gating.EXTRACTIVE:
+        if verbose:
+            print(f"   🎯 Extrait quasi identique (score {docs[0].metadata['score']:.2f}), réponse directe")
+        print(f"\n{'='*70}")
+        print("📝 RÉPONSE")
+        print('='*70)
+        print(answer_gating.extractive_answer(docs))
+        print('='*70)
         return
     
-    context = "\n\n".join([doc.page_content for doc in docs])
+    # Chunks fusionnés et compressés dans le budget de tokens du prompt
+    packed = build_context(docs, query_vector)
+    context = packed.text
     
-    # 3. Stratégie de génération de réponse
+    # 5. Stratégie de génération de réponse
     if verbose:
+        print(f"   🧮 Contexte : {packed.tokens} tokens ({packed.saved_tokens} économisés)")
         print("💭 Génération de la réponse...")
     
-    # Tentative 1 : Groq (priorité - gratuit et rapide)
-    try:
-        response = _try_groq(context, question)
-        if response:
-            if verbose:
-                print("   ✅ Utilisation : Groq (Llama 3.3)")
-            print(f"\n{'='*70}")
-            print("📝 RÉPONSE")
-            print('='*70)
-            print(response)
-            print('='*70)
-            return
-    except Exception as e:
-        if verbose:
-            print(f"   ⚠️  Groq indisponible : {e}")
-    
-    # Tentative 2 : OpenAI/DeepSeek
-    try:
-        response = _try_openai(context, question)
-        if response:
-            if verbose:
-                print("   ✅ Utilisation : OpenAI/DeepSeek")
-            print(f"\n{'='*70}")
-            print("📝 RÉPONSE")
-            print('='*70)
-            print(response)
-            print('='*70)
-            return
-    except Exception as e:
-        if verbose:
-            print(f"   ⚠️  OpenAI indisponible : {e}")
-    
-    # Tentative 3 : Ollama
-    try:
-        response = _try_ollama(context, question)
-        if response:
-            if verbose:
-                print("   ✅ Utilisation : Ollama (local)")
-            print(f"\n{'='*70}")
-            print("📝 RÉPONSE")
-            print('='*70)
-            print(response)
-            print('='*70)
-            return
-    except Exception as e:
+    # Fournisseurs interrogés en parallèle avec couverture, ordonnés par le routeur ;
+    # la réponse s'affiche au fil de la génération
+    stream = llm_providers.generate_stream(context, question)
+    if stream:
         if verbose:
-            print(f"   ℹ️  Ollama non disponible")
+            print(f"   ✅ Utilisation : {llm_providers.provider_label(stream.provider)}")
+        print(f"\n{'='*70}")
+        print("📝 RÉPONSE")
+        print('='*70)
+        for chunk in stream:
+            print(chunk, end="", flush=True)
+        print()
+        if stream.complete:
+            remember_answer(question, query_vector, stream.text, packed.documents, stream.provider)
+        else:
+            print("⚠️  Réponse interrompue")
+        print('='*70)
+        return
     
     # Fallback : Recherche documentaire
     if verbose:
@@ -254,6 +212,9 @@ def interactive_mode():
     print("="*70)
     print("Tapez 'exit' ou 'quit' pour quitter\n")
     
+    # Charger le modèle et l'index une seule fois pour toute la session
+    warm_up()
+    
     while True:
         try:
             question = input("❓ Votre question : ").strip()
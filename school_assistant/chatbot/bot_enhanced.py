@@ -1,7 +1,6 @@
 """
 Bot RAG amélioré avec retrieval hybride et métadonnées.
 """
-import os
 import sys
 from pathlib import Path
 from typing import List
@@ -10,15 +9,51 @@ from dotenv import load_dotenv
 # Ajouter le chemin pour les imports
 sys.path.append(str(Path(__file__).parents[1]))
 
-from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_openai import ChatOpenAI
 from langchain_core.documents import Document
+from chatbot import answer_gating
+from chatbot import engine_registry
+from chatbot import llm_providers
+from chatbot.context_packing import pack_context
+from chatbot.context_compression import compressor
 from utils.logger import setup_logger
+import config
 
 load_dotenv()
 logger = setup_logger("bot_enhanced")
 
+CHROMA_DIR = Path(__file__).resolve().parents[1] / "data" / "chroma_db_enhanced"
+COLLECTION_NAME = "reglements_ecole"
+EMBEDDING_MODEL = "sentence-transformers/paraphrase-multilingual-mpnet-base-v2"
+
+PROMPT_TEMPLATE = """Tu es un assistant scolaire spécialisé dans les règlements d'établissement belges.
+
+Réponds à la question de l'utilisateur en te basant UNIQUEMENT sur le contexte fourni ci-dessous.
+
+INSTRUCTIONS:
+- Sois précis et concis
+- Cite les sources (nom du document et numéro de page)
+- Si la réponse n'est pas dans le contexte, dis-le clairement
+- Utilise un langage professionnel mais accessible
+
+CONTEXTE:
+{context}
+
+QUESTION: {question}
+
+RÉPONSE:"""
+
+
+def load_db():
+    """Retourne la base Chroma partagée (chargée une seule fois par processus)."""
+    return engine_registry.get_chroma_store(
+        CHROMA_DIR, EMBEDDING_MODEL, collection_name=COLLECTION_NAME
+    )
+
+
+def warm_up():
+    """Précharge le modèle d'embeddings et la base avant la première question."""
+    engine_registry.warm_up(load_db)
+
 
 def format_results_with_metadata(docs: List[Document]) -> str:
     """
@@ -59,40 +94,21 @@ def ask_bot_enhanced(question: str, k: int = 5):
         question: Question de l'utilisateur
         k: Nombre de documents à récupérer
     """
-    base_dir = Path(__file__).resolve().parents[1]
-    chroma_dir = base_dir / "data" / "chroma_db_enhanced"
-    
     # Vérifier que la DB existe
-    if not chroma_dir.exists():
-        logger.error(f"❌ Base de données introuvable: {chroma_dir}")
+    if not CHROMA_DIR.exists():
+        logger.error(f"❌ Base de données introuvable: {CHROMA_DIR}")
         print("\n⚠️ La base de données n'existe pas encore.")
         print("   Veuillez d'abord exécuter: python school_assistant/chatbot/setup_rag_enhanced.py")
         return
     
-    # Charger les embeddings
-    logger.info("Chargement du modèle d'embeddings...")
-    embedding_function = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/paraphrase-multilingual-mpnet-base-v2",
-        model_kwargs={'device': 'cpu'},
-        encode_kwargs={'normalize_embeddings': True}
-    )
+    # Charger la DB (modèle et base partagés entre les questions)
+    db = load_db()
     
-    # Charger la DB
-    logger.info("Chargement de la base vectorielle...")
-    db = Chroma(
-        persist_directory=str(chroma_dir),
-        embedding_function=embedding_function,
-        collection_name="reglements_ecole"
-    )
-    
-    # Recherche avec MMR (Maximum Marginal Relevance) pour la diversité
+    # Recherche avec scores (similarité cosinus, pour la décision d'appeler le LLM)
     logger.info(f"🔍 Recherche pour: '{question}'")
     print(f"\n🤖 Recherche en cours pour: '{question}'\n")
     
-    docs = db.similarity_search(
-        question,
-        k=k,
-    )
+    docs = answer_gating.scored_search(db, question, k)
     
     if not docs:
         print("❌ Aucun document pertinent trouvé.")
@@ -101,68 +117,56 @@ def ask_bot_enhanced(question: str, k: int = 5):
     
     logger.info(f"✅ {len(docs)} documents trouvés")
     
-    # Préparer le contexte
-    context = "\n\n---\n\n".join([
-        f"[Source: {doc.metadata.get('source', 'N/A')}, Page {doc.metadata.get('page', '?')}]\n{doc.page_content}"
-        for doc in docs
-    ])
+    # Appel au LLM évité si aucun extrait n'est assez proche, ou si l'un
+    # d'eux répond presque mot pour mot (seuils par type de document)
+    decision = answer_gating.get_policy().decide(docs)
+    if decision == answer_gating.NOT_FOUND:
+        print(f"ℹ️ {config.LLM_GATING_NOT_FOUND_MESSAGE}")
+        return
+    if decision == answer_gating.EXTRACTIVE:
+        print("=" * 70)
+        print(f"🎯 RÉPONSE DIRECTE (score {docs[0].metadata['score']:.2f})")
+        print("=" * 70)
+        print(answer_gating.extractive_answer(docs))
+        return
     
-    # Utiliser l'IA si disponible
-    api_key = os.getenv("OPENAI_API_KEY")
+    # Préparer le contexte (chunks fusionnés, phrases utiles, budget de tokens)
+    embeddings = engine_registry.get_cached_embeddings(EMBEDDING_MODEL)
+    packed = pack_context(
+        docs,
+        separator="\n\n---\n\n",
+        format_document=lambda doc: (
+            f"[Source: {doc.metadata.get('source', 'N/A')}, Page {doc.metadata.get('page', '?')}]\n{doc.page_content}"
+        ),
+        compress=compressor(embeddings.embed_query(question),
+                            engine_registry.get_sentence_embeddings(EMBEDDING_MODEL))
+    )
+    context = packed.text
     
-    if api_key:
-        logger.info("Génération de la réponse avec GPT...")
-        try:
-            llm = ChatOpenAI(
-                temperature=0,
-                model_name="gpt-3.5-turbo",
-                openai_api_key=api_key
-            )
-            
-            prompt = f"""Tu es un assistant scolaire spécialisé dans les règlements d'établissement belges.
-
-Réponds à la question de l'utilisateur en te basant UNIQUEMENT sur le contexte fourni ci-dessous.
-
-INSTRUCTIONS:
-- Sois précis et concis
-- Cite les sources (nom du document et numéro de page)
-- Si la réponse n'est pas dans le contexte, dis-le clairement
-- Utilise un langage professionnel mais accessible
-
-CONTEXTE:
-{context}
-
-QUESTION: {question}
-
-RÉPONSE:"""
-
-            response = llm.invoke(prompt)
-            
-            print("=" * 70)
-            print("💡 RÉPONSE GÉNÉRÉE PAR L'IA")
-            print("=" * 70)
-            print(response.content)
-            print("\n" + "=" * 70)
-            print("📚 SOURCES CONSULTÉES")
-            print("=" * 70)
-            print(format_results_with_metadata(docs))
-            
-            logger.info("✅ Réponse générée avec succès")
-            
-        except Exception as e:
-            logger.error(f"Erreur IA: {e}")
-            print(f"\n⚠️ Erreur avec l'IA: {e}")
-            print("\n📋 Résultats bruts de la recherche:")
-            print(format_results_with_metadata(docs))
+    # Utiliser l'IA si disponible (fournisseurs partagés, voir llm_providers)
+    logger.info("Génération de la réponse...")
+    result = llm_providers.generate(context, question, prompt_template=PROMPT_TEMPLATE)
+    
+    if result:
+        provider, answer = result
+        print("=" * 70)
+        print(f"💡 RÉPONSE GÉNÉRÉE PAR L'IA ({llm_providers.provider_label(provider)})")
+        print("=" * 70)
+        print(answer)
+        print("\n" + "=" * 70)
+        print("📚 SOURCES CONSULTÉES")
+        print("=" * 70)
+        print(format_results_with_metadata(docs))
+        
+        logger.info(f"✅ Réponse générée avec succès ({provider})")
     else:
-        logger.info("Mode recherche documentaire (pas de clé OpenAI)")
-        print("ℹ️ Mode Recherche Documentaire (clé OpenAI absente)\n")
+        logger.info("Mode recherche documentaire (aucun fournisseur LLM disponible)")
+        print("ℹ️ Mode Recherche Documentaire (IA indisponible)\n")
         print("=" * 70)
         print("📚 DOCUMENTS PERTINENTS TROUVÉS")
         print("=" * 70)
         print(format_results_with_metadata(docs))
 
-
 if __name__ == "__main__":
     if len(sys.argv) > 1:
         query = " ".join(sys.argv[1:])
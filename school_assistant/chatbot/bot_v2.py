@@ -7,18 +7,31 @@ from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
 
 from chatbot.setup_rag_v2 import load_retriever
-from utils.logger import setup_logger
+from chatbot import answer_gating
+from chatbot import engine_registry
+from chatbot import llm_providers
+from chatbot.context_packing import pack_context
+from chatbot.context_compression import compressor
 import config
+from utils.logger import setup_logger
 
 logger = setup_logger(__name__)
 
-# Imports optionnels pour l'IA
-try:
-    from langchain_openai import ChatOpenAI
-    OPENAI_AVAILABLE = True
-except ImportError:
-    OPENAI_AVAILABLE = False
-    logger.warning("langchain_openai non disponible, mode recherche documentaire uniquement")
+PROMPT_TEMPLATE = """Tu es un assistant scolaire expert qui aide les enseignants et le personnel à comprendre les règlements et procédures de l'école.
+
+CONTEXTE (extraits des règlements officiels) :
+{context}
+
+QUESTION : {question}
+
+INSTRUCTIONS :
+1. Réponds de manière précise et professionnelle en te basant UNIQUEMENT sur le contexte fourni
+2. Si la réponse n'est pas dans le contexte, dis-le clairement
+3. Structure ta réponse de manière claire avec des points si nécessaire
+4. Cite les sources quand c'est pertinent (nom du document, article)
+5. Si plusieurs procédures sont possibles, liste-les toutes
+
+RÉPONSE :"""
 
 
 def format_documents(docs, max_docs=3) -> str:
@@ -76,7 +89,7 @@ def ask_bot_v2(question: str, search_type="hybrid", verbose=False):
     logger.info(f"Mode de recherche: {search_type}")
     
     try:
-        # 1. Charger le retriever
+        # 1. Charger le retriever (mis en cache par le registre)
         retriever = load_retriever(search_type=search_type)
         
         # 2. Récupérer les documents pertinents
@@ -90,55 +103,59 @@ def ask_bot_v2(question: str, search_type="hybrid", verbose=False):
                       f"page {doc.metadata.get('page', '?')} - "
                       f"{len(doc.page_content)} caractères")
         
-        # 3. Préparer le contexte
-        context = "\n\n---\n\n".join([doc.page_content for doc in docs])
+        # Appel au LLM évité si aucun extrait n'est assez proche, ou si l'un
+        # d'eux répond presque mot pour mot (similarité cosinus `dense_score`)
+        scored = answer_gating.dense_scored(docs)
+        decision = answer_gating.get_policy().decide(scored)
+        if decision == answer_gating.NOT_FOUND:
+            print(f"\nℹ️  {config.LLM_GATING_NOT_FOUND_MESSAGE}")
+            return config.LLM_GATING_NOT_FOUND_MESSAGE
+        if decision == answer_gating.EXTRACTIVE:
+            answer = answer_gating.extractive_answer(scored)
+            print("=" * 80)
+            print(f"RÉPONSE DIRECTE (score {scored[0].metadata['score']:.2f})")
+            print("=" * 80)
+            print(answer)
+            print("=" * 80)
+            return answer
+        
+        # 3. Préparer le contexte (chunks fusionnés, phrases utiles, budget de tokens)
+        embeddings = engine_registry.get_cached_embeddings(config.EMBEDDING_MODEL)
+        packed = pack_context(
+            docs,
+            separator="\n\n---\n\n",
+            compress=compressor(embeddings.embed_query(question),
+                                engine_registry.get_sentence_embeddings(config.EMBEDDING_MODEL))
+        )
+        context = packed.text
+        if verbose:
+            print(f"🧮 Contexte : {packed.tokens} tokens ({packed.saved_tokens} économisés, "
+                  f"{len(packed.documents)} passages)")
         
-        # 4. Générer la réponse
-        if config.OPENAI_API_KEY and OPENAI_AVAILABLE:
-            print("\n🤖 Génération de la réponse avec GPT...\n")
+        # 4. Générer la réponse (fournisseurs partagés, voir llm_providers)
+        print("\n🤖 Génération de la réponse...\n")
+        stream = llm_providers.generate_stream(context, question, prompt_template=PROMPT_TEMPLATE)
+        if stream:
+            print("=" * 80)
+            print(f"RÉPONSE ({llm_providers.provider_label(stream.provider)})")
+            print("=" * 80)
+            for chunk in stream:
+                print(chunk, end="", flush=True)
+            print()
+            if not stream.complete:
+                print("⚠️  Réponse interrompue")
+            print("=" * 80)
+            answer = stream.text
+            logger.info(f"Réponse générée par {stream.provider}")
             
-            try:
-                llm = ChatOpenAI(
-                    temperature=config.LLM_TEMPERATURE,
-                    model_name=config.OPENAI_MODEL,
-                    openai_api_key=config.OPENAI_API_KEY
-                )
-                
-                prompt = f"""Tu es un assistant scolaire expert qui aide les enseignants et le personnel à comprendre les règlements et procédures de l'école.
-
-CONTEXTE (extraits des règlements officiels) :
-{context}
-
-QUESTION : {question}
-
-INSTRUCTIONS :
-1. Réponds de manière précise et professionnelle en te basant UNIQUEMENT sur le contexte fourni
-2. Si la réponse n'est pas dans le contexte, dis-le clairement
-3. Structure ta réponse de manière claire avec des points si nécessaire
-4. Cite les sources quand c'est pertinent (nom du document, article)
-5. Si plusieurs procédures sont possibles, liste-les toutes
-
-RÉPONSE :"""
-                
-                response = llm.invoke(prompt)
-                
-                print("=" * 80)
-                print("RÉPONSE")
-                print("=" * 80)
-                print(response.content)
-                print("=" * 80)
-                
-                # Afficher les sources
-                if verbose:
-                    print("\n📖 SOURCES CONSULTÉES:")
-                    print(format_documents(docs, max_docs=5))
-                
-                return response.content
-                
-            except Exception as e:
-                logger.error(f"Erreur lors de l'appel à OpenAI: {e}")
-                print(f"\n⚠️  L'IA n'est pas disponible (erreur: {e})")
-                print("Affichage des extraits pertinents à la place...\n")
+            # Afficher les sources
+            if verbose:
+                print("\n📖 SOURCES CONSULTÉES:")
+                print(format_documents(docs, max_docs=5))
+            
+            return answer
+        
+        print("⚠️  L'IA n'est pas disponible, affichage des extraits pertinents à la place...\n")
         
         # Mode sans IA: afficher les documents pertinents
         print("=" * 80)
@@ -170,6 +187,9 @@ def interactive_mode():
     search_mode = "hybrid"
     verbose = False
     
+    # Charger le modèle et l'index une seule fois pour toute la session
+    engine_registry.warm_up(lambda: load_retriever(search_type=search_mode))
+    
     while True:
         try:
             question = input("\n💬 Votre question: ").strip()
@@ -1,17 +1,101 @@
 """
 Stratégies de chunking intelligentes adaptées au type de document.
+
+Deux modes de mesure de la taille des chunks (config.CHUNKING_MODE) :
+- "chars" : tailles en caractères selon le type de document ;
+- "tokens" : tailles mesurées avec le tokenizer du modèle d'embeddings et
+  dérivées de sa longueur maximale de séquence (`max_seq_length`), pour que
+  le modèle ne tronque pas la fin des chunks.
 """
+import functools
+import sys
+from pathlib import Path
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from typing import List
+from typing import Dict, List, Optional
 from langchain_core.documents import Document
 
+# Ajouter le chemin pour les imports
+sys.path.append(str(Path(__file__).parents[1]))
+
+import config
 
-def create_smart_chunker(doc_type: str) -> RecursiveCharacterTextSplitter:
+
+class TokenBudget:
+    """Tokenizer et longueur maximale de séquence du modèle d'embeddings."""
+    
+    def __init__(self, tokenizer, max_seq_length: int, special_tokens: int = 2):
+        """
+        Args:
+            tokenizer: Tokenizer HuggingFace (méthode `encode`)
+            max_seq_length: Nombre de tokens au-delà duquel le modèle tronque
+            special_tokens: Tokens ajoutés par le modèle à chaque texte (<s>, </s>)
+        """
+        self.tokenizer = tokenizer
+        self.max_seq_length = max_seq_length
+        self.special_tokens = special_tokens
+    
+    @property
+    def chunk_size(self) -> int:
+        """Taille maximale d'un chunk, en tokens de contenu."""
+        return self.max_seq_length - self.special_tokens
+    
+    @property
+    def chunk_overlap(self) -> int:
+        """Chevauchement entre chunks, en tokens."""
+        return int(self.chunk_size * config.CHUNK_TOKEN_OVERLAP_RATIO)
+    
+    def count(self, text: str) -> int:
+        """Nombre de tokens de contenu de `text` (sans les tokens spéciaux)."""
+        return len(self.tokenizer.encode(text, add_special_tokens=False))
+    
+    def truncated(self, text: str) -> int:
+        """Nombre de tokens de `text` ignorés par le modèle."""
+        return max(0, self.count(text) - self.chunk_size)
+
+
+@functools.lru_cache(maxsize=None)
+def load_token_budget(model_name: str) -> Optional[TokenBudget]:
+    """
+    Charge le tokenizer et la longueur de séquence du modèle d'embeddings.
+    
+    Args:
+        model_name: Nom du modèle sentence-transformers
+        
+    Returns:
+        TokenBudget, ou None si le modèle ne peut pas être chargé
+    """
+    try:
+        from chatbot import engine_registry
+        model = engine_registry.get_embeddings(model_name).client
+        max_seq_length = config.EMBEDDING_MAX_SEQ_LENGTH or model.max_seq_length
+        return TokenBudget(model.tokenizer, max_seq_length)
+    except Exception as e:
+        print(f"  ⚠️  Tokenizer de {model_name} indisponible ({e}), découpage en caractères")
+        return None
+
+
+def resolve_token_budget(model_name: str = None) -> Optional[TokenBudget]:
+    """
+    Retourne le budget de tokens à utiliser selon config.CHUNKING_MODE.
+    
+    Args:
+        model_name: Modèle d'embeddings (défaut: config.EMBEDDING_MODEL)
+        
+    Returns:
+        TokenBudget en mode "tokens", None en mode "chars"
+    """
+    if config.CHUNKING_MODE != "tokens":
+        return None
+    return load_token_budget(model_name or config.EMBEDDING_MODEL)
+
+
+def create_smart_chunker(doc_type: str, budget: Optional[TokenBudget] = None) -> RecursiveCharacterTextSplitter:
     """
     Retourne un chunker adapté au type de document.
     
     Args:
         doc_type: Type de document (reglement, projet, etc.)
+        budget: Si fourni, tailles mesurées en tokens du modèle d'embeddings
         
     Returns:
         Chunker configuré
@@ -28,7 +112,15 @@ def create_smart_chunker(doc_type: str) -> RecursiveCharacterTextSplitter:
         ""
     ]
     
-    if "reglement" in doc_type:
+    if budget is not None:
+        # Tokens: un chunk tient entièrement dans la séquence du modèle
+        return RecursiveCharacterTextSplitter(
+            chunk_size=budget.chunk_size,
+            chunk_overlap=budget.chunk_overlap,
+            separators=french_admin_separators,
+            length_function=budget.count,
+        )
+    elif "reglement" in doc_type:
         # Règlements: chunks plus longs pour garder le contexte légal
         return RecursiveCharacterTextSplitter(
             chunk_size=1200,
@@ -54,12 +146,13 @@ def create_smart_chunker(doc_type: str) -> RecursiveCharacterTextSplitter:
         )
 
 
-def smart_chunk_documents(documents: List[Document]) -> List[Document]:
+def smart_chunk_documents(documents: List[Document], budget: Optional[TokenBudget] = None) -> List[Document]:
     """
     Découpe intelligemment les documents selon leur type.
     
     Args:
         documents: Liste de documents avec métadonnées
+        budget: Si fourni, tailles mesurées en tokens du modèle d'embeddings
         
     Returns:
         Liste de chunks avec métadonnées préservées
@@ -76,7 +169,7 @@ def smart_chunk_documents(documents: List[Document]) -> List[Document]:
     
     # Chunker chaque groupe avec la stratégie appropriée
     for doc_type, docs in docs_by_type.items():
-        chunker = create_smart_chunker(doc_type)
+        chunker = create_smart_chunker(doc_type, budget)
         chunks = chunker.split_documents(docs)
         
         # Ajouter l'ID du chunk aux métadonnées
@@ -88,3 +181,96 @@ def smart_chunk_documents(documents: List[Document]) -> List[Document]:
         print(f"  {doc_type}: {len(docs)} docs → {len(chunks)} chunks")
     
     return all_chunks
+
+
+def chunk_source_documents(documents: List[Document], budget: Optional[TokenBudget] = None) -> List[Document]:
+    """
+    Découpe les pages d'un même fichier source (utilisé par l'indexation en flux).
+    
+    Contrairement à `smart_chunk_documents`, la numérotation `chunk_id` /
+    `total_chunks` est relative au fichier : elle ne dépend pas du reste du
+    corpus, qui n'est pas encore lu.
+    
+    Args:
+        documents: Pages d'un même PDF
+        budget: Si fourni, tailles mesurées en tokens du modèle d'embeddings
+        
+    Returns:
+        Liste de chunks avec métadonnées préservées
+    """
+    if not documents:
+        return []
+    chunker = create_smart_chunker(documents[0].metadata.get('doc_type', 'autre'), budget)
+    chunks = chunker.split_documents(documents)
+    for i, chunk in enumerate(chunks):
+        chunk.metadata['chunk_id'] = i
+        chunk.metadata['total_chunks'] = len(chunks)
+    return chunks
+
+
+def chunk_documents_smart(
+    documents: List[Document],
+    preserve_metadata: bool = True,
+    budget: Optional[TokenBudget] = None
+) -> List[Document]:
+    """
+    Découpe les documents selon leur type (alias de `smart_chunk_documents`).
+    
+    Args:
+        documents: Liste de documents avec métadonnées
+        preserve_metadata: Conserver les métadonnées des documents sources
+        budget: Si fourni, tailles mesurées en tokens du modèle d'embeddings
+        
+    Returns:
+        Liste de chunks
+    """
+    chunks = smart_chunk_documents(documents, budget)
+    if not preserve_metadata:
+        for chunk in chunks:
+            chunk.metadata = {
+                'chunk_id': chunk.metadata.get('chunk_id'),
+                'total_chunks': chunk.metadata.get('total_chunks'),
+            }
+    return chunks
+
+
+def get_chunk_statistics(chunks: List[Document], budget: Optional[TokenBudget] = None) -> Dict[str, float]:
+    """
+    Calcule des statistiques sur les chunks produits.
+    
+    Args:
+        chunks: Liste de chunks
+        budget: Si fourni, les tokens sont comptés avec le tokenizer du modèle
+            et les tokens tronqués par le modèle sont rapportés
+        
+    Returns:
+        Dictionnaire de statistiques (nombre, tailles, tokens estimés ou
+        exacts, chunks et tokens tronqués)
+    """
+    sizes = [len(chunk.page_content) for chunk in chunks]
+    total_chars = sum(sizes)
+    stats = {
+        'total_chunks': len(chunks),
+        'avg_size_chars': total_chars / len(chunks) if chunks else 0,
+        'min_size_chars': min(sizes) if sizes else 0,
+        'max_size_chars': max(sizes) if sizes else 0,
+    }
+    
+    if budget is None:
+        # Estimation grossière : ~4 caractères par token
+        total_tokens_est = total_chars // 4
+        stats['total_tokens_est'] = total_tokens_est
+        stats['avg_tokens'] = total_tokens_est / len(chunks) if chunks else 0
+        return stats
+    
+    token_counts = [budget.count(chunk.page_content) for chunk in chunks]
+    truncated = [max(0, n - budget.chunk_size) for n in token_counts]
+    stats.update({
+        'total_tokens_est': sum(token_counts),
+        'avg_tokens': sum(token_counts) / len(chunks) if chunks else 0,
+        'max_tokens': max(token_counts) if token_counts else 0,
+        'max_seq_length': budget.max_seq_length,
+        'truncated_chunks': sum(1 for n in truncated if n),
+        'truncated_tokens': sum(truncated),
+    })
+    return stats
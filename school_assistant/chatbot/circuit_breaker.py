@@ -0,0 +1,132 @@
+"""
+Disjoncteur (circuit breaker) par fournisseur LLM.
+
+Fermé : les appels passent. Après config.LLM_BREAKER_FAILURE_THRESHOLD échecs
+consécutifs (ou immédiatement pour un quota épuisé ou une clé refusée), le
+disjoncteur s'ouvre : le fournisseur est ignoré pendant
+config.LLM_BREAKER_COOLDOWN_SECONDS, sans appel réseau. À la fin du délai,
+il passe en semi-ouvert et laisse passer une seule requête de test : un
+succès le referme, un échec le rouvre pour un nouveau délai.
+"""
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+# Ajouter le chemin pour les imports
+sys.path.append(str(Path(__file__).parents[1]))
+
+from utils.logger import setup_logger
+import config
+
+logger = setup_logger("circuit_breaker")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+def trips_immediately(error: BaseException) -> bool:
+    """True pour les erreurs qui ne se résoudront pas d'elles-mêmes (quota, clé refusée)."""
+    if "insufficient_quota" in str(error):
+        return True
+    return getattr(error, "status_code", None) in (401, 403)
+
+
+class CircuitBreaker:
+    """Disjoncteur d'un fournisseur : fermé, ouvert ou semi-ouvert."""
+
+    def __init__(self, name: str, failure_threshold: int = None, cooldown_seconds: float = None,
+                 clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold or config.LLM_BREAKER_FAILURE_THRESHOLD
+        self.cooldown_seconds = (config.LLM_BREAKER_COOLDOWN_SECONDS
+                                 if cooldown_seconds is None else cooldown_seconds)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+        self.last_error: Optional[str] = None
+        self.total_successes = 0
+        self.total_failures = 0
+        self.rejected = 0
+
+    def _update(self) -> None:
+        """Passe en semi-ouvert à la fin du délai de refroidissement."""
+        if self.state == OPEN and self._clock() - self.opened_at >= self.cooldown_seconds:
+            self.state = HALF_OPEN
+            self.probing = False
+            logger.info(f"🟡 {self.name}: semi-ouvert, requête de test autorisée")
+
+    def available(self) -> bool:
+        """True si un appel serait autorisé maintenant (sans réserver la requête de test)."""
+        with self._lock:
+            self._update()
+            return self.state == CLOSED or (self.state == HALF_OPEN and not self.probing)
+
+    def allow(self) -> bool:
+        """
+        Autorise un appel ; en semi-ouvert, réserve l'unique requête de test.
+
+        Returns:
+            False si le fournisseur doit être ignoré
+        """
+        with self._lock:
+            self._update()
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self.probing:
+                self.probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self) -> None:
+        """Un appel a réussi : le disjoncteur se referme."""
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info(f"🟢 {self.name}: rétabli, disjoncteur fermé")
+            self.state = CLOSED
+            self.consecutive_failures = 0
+            self.probing = False
+            self.total_successes += 1
+
+    def record_failure(self, error: BaseException) -> None:
+        """Un appel a échoué : ouvre le disjoncteur au-delà du seuil."""
+        with self._lock:
+            self.consecutive_failures += 1
+            self.total_failures += 1
+            self.last_error = f"{type(error).__name__}: {error}"[:200]
+            if (self.state == HALF_OPEN or trips_immediately(error)
+                    or self.consecutive_failures >= self.failure_threshold):
+                if self.state != OPEN:
+                    logger.warning(f"🔴 {self.name}: disjoncteur ouvert pour "
+                                   f"{self.cooldown_seconds:.0f}s ({self.last_error})")
+                self.state = OPEN
+                self.opened_at = self._clock()
+                self.probing = False
+
+    def release(self) -> None:
+        """Appel annulé (un autre fournisseur a répondu) : libère la requête de test."""
+        with self._lock:
+            self.probing = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        """État courant pour l'affichage (state, failures, retry_in, last_error, compteurs)."""
+        with self._lock:
+            self._update()
+            retry_in = 0.0
+            if self.state == OPEN:
+                retry_in = max(0.0, self.cooldown_seconds - (self._clock() - self.opened_at))
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "retry_in": retry_in,
+                "last_error": self.last_error,
+                "successes": self.total_successes,
+                "failures": self.total_failures,
+                "rejected": self.rejected,
+            }
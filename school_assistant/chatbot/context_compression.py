@@ -0,0 +1,115 @@
+"""
+Compression extractive du contexte avant l'appel au LLM.
+
+Les passages récupérés sont découpés en phrases
+(`utils.text_processing.split_into_sentences`). Toutes les phrases sont
+embeddées en un seul lot et comparées à la question par un produit
+matriciel. Seules les meilleures phrases (config.CONTEXT_COMPRESSION_TOP_SENTENCES)
+et leurs voisines dans le même passage (config.CONTEXT_COMPRESSION_NEIGHBOURS)
+sont conservées, dans l'ordre du texte. Les métadonnées (source, page) de
+chaque passage sont conservées : les citations restent exactes.
+"""
+import sys
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.documents import Document
+
+# Ajouter le chemin pour les imports
+sys.path.append(str(Path(__file__).parents[1]))
+
+from utils.logger import setup_logger
+from utils.text_processing import split_into_sentences
+import config
+
+logger = setup_logger("context_compression")
+
+GAP = " … "
+
+
+def _unit_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def compress_documents(
+    query_vector: Sequence[float],
+    docs: Sequence[Document],
+    embeddings,
+    top_sentences: int = None,
+    neighbours: int = None
+) -> List[Document]:
+    """
+    Ne garde que les phrases des passages les plus proches de la question.
+
+    Args:
+        query_vector: Embedding de la question (même modèle que `embeddings`)
+        docs: Passages récupérés, par ordre de pertinence
+        embeddings: Fonction d'embeddings (interface LangChain `embed_documents`)
+        top_sentences: Phrases retenues au total (défaut: config.CONTEXT_COMPRESSION_TOP_SENTENCES)
+        neighbours: Phrases voisines gardées de part et d'autre (défaut: config.CONTEXT_COMPRESSION_NEIGHBOURS)
+
+    Returns:
+        Passages compressés, dans le même ordre (ceux sans phrase retenue sont
+        retirés), avec `sentences_kept` dans les métadonnées
+    """
+    top_sentences = top_sentences or config.CONTEXT_COMPRESSION_TOP_SENTENCES
+    neighbours = config.CONTEXT_COMPRESSION_NEIGHBOURS if neighbours is None else neighbours
+    sentences = [split_into_sentences(doc.page_content) for doc in docs]
+    counts = np.array([len(doc_sentences) for doc_sentences in sentences])
+    total = int(counts.sum())
+    if total <= top_sentences:
+        return list(docs)
+
+    flat = [sentence for doc_sentences in sentences for sentence in doc_sentences]
+    vectors = _unit_rows(np.asarray(embeddings.embed_documents(flat), dtype=np.float32))
+    query = _unit_rows(np.asarray(query_vector, dtype=np.float32))
+    scores = vectors @ query
+
+    seeds = np.zeros(total, dtype=bool)
+    seeds[np.argpartition(-scores, top_sentences - 1)[:top_sentences]] = True
+    # Voisines : même passage, à au plus `neighbours` phrases d'une phrase retenue
+    doc_ids = np.repeat(np.arange(len(docs)), counts)
+    keep = seeds.copy()
+    for shift in range(1, neighbours + 1):
+        same_doc = doc_ids[:-shift] == doc_ids[shift:]
+        keep[shift:] |= seeds[:-shift] & same_doc
+        keep[:-shift] |= seeds[shift:] & same_doc
+
+    compressed = []
+    offsets = np.concatenate(([0], np.cumsum(counts)))
+    for i, doc in enumerate(docs):
+        kept = np.flatnonzero(keep[offsets[i]:offsets[i + 1]])
+        if not len(kept):
+            continue
+        text = sentences[i][kept[0]]
+        for previous, current in zip(kept, kept[1:]):
+            text += (" " if current == previous + 1 else GAP) + sentences[i][current]
+        metadata = dict(doc.metadata)
+        metadata['sentences_kept'] = f"{len(kept)}/{counts[i]}"
+        compressed.append(Document(page_content=text, metadata=metadata))
+
+    logger.info(f"✂️  Compression: {len(docs)} → {len(compressed)} passages, {total} → "
+                f"{int(keep.sum())} phrases, {sum(len(doc.page_content) for doc in docs)} → "
+                f"{sum(len(doc.page_content) for doc in compressed)} caractères")
+    return compressed
+
+
+def compressor(query_vector: Sequence[float], embeddings
+               ) -> Optional[Callable[[List[Document]], List[Document]]]:
+    """
+    Étape de compression pour `context_packing.pack_context`.
+
+    Args:
+        query_vector: Embedding de la question
+        embeddings: Fonction d'embeddings du même modèle (sur le chemin des
+            réponses : `engine_registry.get_sentence_embeddings`, en mémoire seulement)
+
+    Returns:
+        Fonction passages -> passages compressés, ou None si
+        config.CONTEXT_COMPRESSION_ENABLED est désactivé
+    """
+    if not config.CONTEXT_COMPRESSION_ENABLED:
+        return None
+    return lambda docs: compress_documents(query_vector, docs, embeddings)
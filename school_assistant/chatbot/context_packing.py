@@ -0,0 +1,233 @@
+"""
+Assemblage du contexte du prompt dans un budget de tokens.
+
+Les chunks récupérés se recouvrent (chevauchement du découpage) et les
+voisins d'un même passage reviennent souvent ensemble. Avant l'appel au
+LLM, les chunks d'une même source et d'une même page sont fusionnés :
+texte commun au bout de l'un et au début de l'autre (chevauchement), chunk
+entièrement contenu dans un autre (doublon), ou numéros `chunk_id`
+consécutifs (voisins). Les passages obtenus, éventuellement compressés
+(voir context_compression), remplissent ensuite le budget
+(config.LLM_CONTEXT_TOKEN_BUDGET) par ordre de pertinence.
+
+Les tokens sont comptés avec tiktoken (config.LLM_CONTEXT_TOKENIZER), ou
+estimés à 4 caractères par token si tiktoken n'est pas disponible.
+"""
+import sys
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence
+
+from langchain_core.documents import Document
+
+# Ajouter le chemin pour les imports
+sys.path.append(str(Path(__file__).parents[1]))
+
+from utils.logger import setup_logger
+import config
+
+logger = setup_logger("context_packing")
+
+TokenCounter = Callable[[str], int]
+
+
+def _approximate_tokens(text: str) -> int:
+    return (len(text) + 3) // 4
+
+
+@lru_cache(maxsize=None)
+def get_token_counter(tokenizer: str = None) -> TokenCounter:
+    """
+    Retourne une fonction de comptage des tokens.
+
+    Args:
+        tokenizer: Modèle ou encodage tiktoken (défaut: config.LLM_CONTEXT_TOKENIZER)
+
+    Returns:
+        Fonction texte -> nombre de tokens (estimation si tiktoken est indisponible)
+    """
+    name = tokenizer or config.LLM_CONTEXT_TOKENIZER
+    try:
+        import tiktoken
+        try:
+            encoding = tiktoken.encoding_for_model(name)
+        except KeyError:
+            encoding = tiktoken.get_encoding(name)
+    except Exception as e:
+        logger.warning(f"⚠️  Tokenizer {name} indisponible ({e}), estimation à 4 caractères/token")
+        return _approximate_tokens
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+
+def _overlap(left: str, right: str, min_chars: int) -> int:
+    """Longueur du plus long suffixe de `left` qui est aussi un préfixe de `right`."""
+    if len(left) < min_chars or len(right) < min_chars:
+        return 0
+    probe = right[:min_chars]
+    pos = left.find(probe, max(0, len(left) - len(right)))
+    while pos != -1:
+        if right.startswith(left[pos:]):
+            return len(left) - pos
+        pos = left.find(probe, pos + 1)
+    return 0
+
+
+class _Passage:
+    """Chunks fusionnés d'une même source et page."""
+
+    def __init__(self, doc: Document, rank: int):
+        self.key = (doc.metadata.get('source'), doc.metadata.get('page'))
+        self.metadata = dict(doc.metadata)
+        self.text = doc.page_content.strip()
+        self.rank = rank
+        self.chunks = 1
+        chunk_id = doc.metadata.get('chunk_id')
+        self.first_id = self.last_id = chunk_id if isinstance(chunk_id, int) else None
+
+    def absorb(self, other: "_Passage", min_chars: int) -> bool:
+        """Fusionne `other` dans ce passage s'ils se recouvrent ou se suivent."""
+        if other.key != self.key:
+            return False
+        if other.text in self.text:
+            merged = self.text
+        elif self.text in other.text:
+            merged = other.text
+        elif overlap := _overlap(self.text, other.text, min_chars):
+            merged = self.text + other.text[overlap:]
+        elif overlap := _overlap(other.text, self.text, min_chars):
+            merged = other.text + self.text[overlap:]
+        elif self.last_id is not None and other.first_id == self.last_id + 1:
+            merged = self.text + "\n" + other.text
+        elif self.first_id is not None and other.last_id == self.first_id - 1:
+            merged = other.text + "\n" + self.text
+        else:
+            return False
+        self.text = merged
+        self.rank = min(self.rank, other.rank)
+        self.chunks += other.chunks
+        if self.first_id is not None and other.first_id is not None:
+            self.first_id = min(self.first_id, other.first_id)
+            self.last_id = max(self.last_id, other.last_id)
+        return True
+
+    def to_document(self) -> Document:
+        metadata = dict(self.metadata)
+        metadata['merged_chunks'] = self.chunks
+        return Document(page_content=self.text, metadata=metadata)
+
+
+def merge_chunks(docs: Sequence[Document], min_overlap_chars: int = None) -> List[Document]:
+    """
+    Fusionne les chunks qui se recouvrent ou se suivent dans une même source et page.
+
+    Args:
+        docs: Chunks par ordre de pertinence
+        min_overlap_chars: Chevauchement minimal reconnu (défaut: config.LLM_CONTEXT_MIN_OVERLAP_CHARS)
+
+    Returns:
+        Passages par ordre de pertinence (rang du meilleur chunk fusionné),
+        avec `merged_chunks` dans les métadonnées
+    """
+    min_chars = min_overlap_chars or config.LLM_CONTEXT_MIN_OVERLAP_CHARS
+    passages: List[_Passage] = []
+    for rank, doc in enumerate(docs):
+        current = _Passage(doc, rank)
+        target = next((p for p in passages if p.absorb(current, min_chars)), None)
+        if target is None:
+            passages.append(current)
+            continue
+        # Le passage agrandi peut maintenant rejoindre un autre passage
+        for other in [p for p in passages if p is not target]:
+            if target.absorb(other, min_chars):
+                passages.remove(other)
+    passages.sort(key=lambda p: p.rank)
+    return [p.to_document() for p in passages]
+
+
+class PackedContext:
+    """Contexte assemblé et statistiques de tokens."""
+
+    def __init__(self, text: str, documents: List[Document], tokens: int, raw_tokens: int,
+                 chunks: int, dropped: int):
+        self.text = text
+        self.documents = documents
+        self.tokens = tokens
+        self.raw_tokens = raw_tokens
+        self.chunks = chunks
+        self.dropped = dropped
+
+    @property
+    def saved_tokens(self) -> int:
+        """Tokens économisés par rapport à la concaténation brute des chunks."""
+        return max(0, self.raw_tokens - self.tokens)
+
+
+def _truncate(text: str, max_tokens: int, count: TokenCounter) -> str:
+    """Coupe un texte entre deux mots pour qu'il tienne dans `max_tokens` (recherche dichotomique)."""
+    words = text.split(" ")
+    low, high = 0, len(words)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count(" ".join(words[:middle]) + " …") <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return " ".join(words[:low]) + " …"
+
+
+def pack_context(
+    docs: Sequence[Document],
+    token_budget: int = None,
+    separator: str = "\n\n",
+    format_document: Optional[Callable[[Document], str]] = None,
+    count_tokens: Optional[TokenCounter] = None,
+    compress: Optional[Callable[[List[Document]], List[Document]]] = None
+) -> PackedContext:
+    """
+    Assemble le contexte du prompt : fusion des chunks puis remplissage du budget.
+
+    Args:
+        docs: Chunks récupérés, par ordre de pertinence
+        token_budget: Nombre maximal de tokens du contexte (défaut: config.LLM_CONTEXT_TOKEN_BUDGET)
+        separator: Séparateur entre passages
+        format_document: Mise en forme d'un passage (défaut: son texte), ex: avec la source
+        count_tokens: Fonction de comptage (défaut: `get_token_counter()`)
+        compress: Étape appliquée aux passages fusionnés avant le remplissage
+            du budget (voir `context_compression.compressor`)
+
+    Returns:
+        PackedContext (text, documents, tokens, raw_tokens, saved_tokens, chunks, dropped)
+    """
+    budget = token_budget or config.LLM_CONTEXT_TOKEN_BUDGET
+    count = count_tokens or get_token_counter()
+    render = format_document or (lambda doc: doc.page_content)
+    raw_tokens = count(separator.join(render(doc) for doc in docs))
+
+    separator_tokens = count(separator)
+    packed: List[Document] = []
+    used = 0
+    dropped = 0
+    passages = merge_chunks(docs)
+    if compress is not None:
+        passages = compress(passages)
+    for passage in passages:
+        cost = count(render(passage)) + (separator_tokens if packed else 0)
+        if used + cost <= budget:
+            packed.append(passage)
+            used += cost
+        elif not packed:
+            # Le passage le plus pertinent est gardé, tronqué au budget
+            overhead = count(render(passage)) - count(passage.page_content)
+            passage.page_content = _truncate(passage.page_content, budget - overhead, count)
+            packed.append(passage)
+            used = count(render(passage))
+        else:
+            dropped += 1
+
+    text = separator.join(render(doc) for doc in packed)
+    context = PackedContext(text, packed, count(text), raw_tokens, len(docs), dropped)
+    if docs:
+        logger.info(f"🧮 Contexte: {context.raw_tokens} → {context.tokens} tokens "
+                    f"({context.saved_tokens} économisés), {len(docs)} chunks → "
+                    f"{len(packed)} passages ({dropped} hors budget)")
+    return context
@@ -0,0 +1,213 @@
+"""
+Réduction de dimension des embeddings stockés (PCA ou troncature Matryoshka).
+
+La taille de l'index et le coût de chaque produit scalaire croissent avec
+la dimension (768 pour mpnet). À la construction d'une base NumPy (voir
+numpy_store), une projection peut être apprise sur les embeddings du corpus
+et enregistrée avec l'index (`projection.npz`) :
+
+- "pca" : directions principales du corpus, sans centrage (la base classe
+  par produit scalaire, que le centrage modifierait) ;
+- "truncate" : premières dimensions, pour les modèles entraînés en
+  Matryoshka (sans intérêt pour un modèle qui ne l'est pas).
+
+Les vecteurs des documents sont stockés réduits ; ceux des questions sont
+réduits par la même projection (`ProjectedEmbeddings`). Les vecteurs
+réduits sont renormalisés : la similarité reste un cosinus.
+
+Réglage : config.EMBEDDING_REDUCTION_METHOD / EMBEDDING_REDUCTION_DIM.
+Rapport rappel@k / latence par dimension :
+    python chatbot/dimension_reduction.py [--store DOSSIER] [--dims 64 128 256 384]
+"""
+import sys
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# Ajouter le chemin pour les imports
+sys.path.append(str(Path(__file__).parents[1]))
+
+from utils.logger import setup_logger
+
+logger = setup_logger("dimension_reduction")
+
+METHODS = ("pca", "truncate")
+FIT_BLOCK_ROWS = 8192  # Lignes accumulées à la fois dans la matrice de covariance
+
+
+def _unit_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+class Projection:
+    """Projection linéaire `x @ components.T`, suivie d'une normalisation."""
+
+    def __init__(self, method: str, components: np.ndarray, explained_variance: Optional[float] = None):
+        self.method = method
+        self.components = np.ascontiguousarray(components, dtype=np.float32)
+        self.explained_variance = explained_variance
+
+    @property
+    def source_dim(self) -> int:
+        return self.components.shape[1]
+
+    @property
+    def dim(self) -> int:
+        return self.components.shape[0]
+
+    def transform(self, vectors) -> np.ndarray:
+        """
+        Réduit des vecteurs (un seul ou une matrice).
+
+        Returns:
+            Vecteurs float32 de dimension `dim`, normalisés
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        return _unit_rows(vectors @ self.components.T)
+
+    def save(self, path: Path) -> None:
+        np.savez(path, method=self.method, components=self.components,
+                 explained_variance=np.nan if self.explained_variance is None else self.explained_variance)
+
+    @classmethod
+    def load(cls, path: Path) -> "Projection":
+        # Archive fermée après lecture : les tableaux sont copiés en mémoire
+        with np.load(path) as data:
+            method = str(data["method"])
+            components = np.array(data["components"])
+            explained = float(data["explained_variance"])
+        return cls(method, components, None if np.isnan(explained) else explained)
+
+
+def fit_projection(vectors, dim: int, method: str = "pca") -> Projection:
+    """
+    Apprend une projection sur les embeddings du corpus.
+
+    Args:
+        vectors: Embeddings normalisés des documents (N x dimension d'origine)
+        dim: Dimension cible
+        method: "pca" ou "truncate"
+
+    Returns:
+        Projection (pour "pca", part de l'énergie conservée dans `explained_variance`)
+    """
+    if method not in METHODS:
+        raise ValueError(f"Méthode de réduction inconnue: {method}")
+    count, source_dim = vectors.shape
+    if not 0 < dim < source_dim:
+        raise ValueError(f"Dimension cible {dim} invalide (dimension d'origine {source_dim})")
+
+    if method == "truncate":
+        return Projection(method, np.eye(dim, source_dim))
+
+    # Moments d'ordre 2 accumulés par blocs (la matrice peut être en mémoire mappée)
+    covariance = np.zeros((source_dim, source_dim), dtype=np.float64)
+    for start in range(0, count, FIT_BLOCK_ROWS):
+        block = np.asarray(vectors[start:start + FIT_BLOCK_ROWS], dtype=np.float64)
+        covariance += block.T @ block
+    eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+    order = np.argsort(eigenvalues)[::-1][:dim]
+    explained = float(eigenvalues[order].sum() / max(eigenvalues.sum(), 1e-12))
+    logger.info(f"📉 PCA {source_dim} → {dim} dimensions ({explained:.1%} de la variance conservée)")
+    return Projection(method, eigenvectors[:, order].T, explained)
+
+
+class ProjectedEmbeddings(Embeddings):
+    """Embeddings d'origine suivis de la projection de l'index."""
+
+    def __init__(self, base: Embeddings, projection: Projection):
+        self.base = base
+        self.projection = projection
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.projection.transform(self.base.embed_documents(texts)).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.projection.transform(self.base.embed_query(text)).tolist()
+
+
+def evaluation_report(vectors: np.ndarray, queries: np.ndarray, dims: Sequence[int],
+                      ks: Sequence[int] = (5, 10), methods: Sequence[str] = METHODS,
+                      repeats: int = 5) -> None:
+    """
+    Rappel@k et latence de recherche par dimension cible, par rapport aux vecteurs complets.
+
+    Args:
+        vectors: Embeddings des documents (N x dimension d'origine)
+        queries: Embeddings des questions
+        dims: Dimensions cibles évaluées
+        ks: Valeurs de k évaluées
+        methods: Méthodes de réduction évaluées
+        repeats: Passages sur l'ensemble des questions pour mesurer la latence
+    """
+    import time
+
+    vectors = _unit_rows(np.asarray(vectors, dtype=np.float32))
+    queries = _unit_rows(np.asarray(queries, dtype=np.float32))
+    count, source_dim = vectors.shape
+    k_max = max(ks)
+
+    def top(matrix, query_matrix):
+        scores = query_matrix @ matrix.T
+        best = np.argpartition(-scores, k_max - 1, axis=1)[:, :k_max]
+        return np.take_along_axis(best, np.argsort(-np.take_along_axis(scores, best, axis=1), axis=1), axis=1)
+
+    def latency(matrix, query_matrix):
+        start = time.perf_counter()
+        for _ in range(repeats):
+            for query in query_matrix:
+                scores = matrix @ query
+                np.argpartition(-scores, k_max - 1)[:k_max]
+        return (time.perf_counter() - start) / (repeats * len(query_matrix)) * 1000
+
+    truth = top(vectors, queries)
+    print(f"{count} chunks, dimension d'origine {source_dim}, {len(queries)} questions")
+    print(f"  {'méthode':<9} {'dim':>5} " + " ".join(f"{f'rappel@{k}':>10}" for k in ks)
+          + f" {'variance':>9} {'index':>9} {'ms/question':>12}")
+    print(f"  {'complet':<9} {source_dim:>5} " + " ".join(f"{1.0:>10.3f}" for _ in ks)
+          + f" {'':>9} {vectors.nbytes / 1e6:>6.1f} Mo {latency(vectors, queries):>12.3f}")
+    for method in methods:
+        for dim in dims:
+            if dim >= source_dim:
+                continue
+            projection = fit_projection(vectors, dim, method)
+            reduced, reduced_queries = projection.transform(vectors), projection.transform(queries)
+            found = top(reduced, reduced_queries)
+            recalls = [np.mean([len(set(f[:k]) & set(t[:k])) / k for f, t in zip(found, truth)]) for k in ks]
+            variance = "" if projection.explained_variance is None else f"{projection.explained_variance:.1%}"
+            print(f"  {method:<9} {dim:>5} " + " ".join(f"{recall:>10.3f}" for recall in recalls)
+                  + f" {variance:>9} {reduced.nbytes / 1e6:>6.1f} Mo {latency(reduced, reduced_queries):>12.3f}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Rappel@k et latence par dimension réduite")
+    parser.add_argument("--store", type=Path,
+                        help="Base NumPy existante en dimension complète (ex: data/chroma_db_v2/numpy_store)")
+    parser.add_argument("--dims", type=int, nargs="+", default=[64, 128, 256, 384], help="Dimensions cibles")
+    parser.add_argument("--docs", type=int, default=5000, help="Chunks du corpus synthétique")
+    parser.add_argument("--dim", type=int, default=768, help="Dimension du corpus synthétique")
+    parser.add_argument("--queries", type=int, default=200, help="Nombre de questions")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.store:
+        # Questions simulées : chunks existants légèrement bruités
+        vectors = np.load(args.store / "vectors.npy", mmap_mode="r")
+        picked = np.asarray(vectors[rng.choice(len(vectors), args.queries, replace=False)], dtype=np.float32)
+        evaluation_report(np.asarray(vectors, dtype=np.float32),
+                          picked + 0.05 * rng.standard_normal(picked.shape).astype(np.float32), args.dims)
+    else:
+        # Corpus synthétique anisotrope : peu de directions portent l'essentiel
+        # de la variance, comme des embeddings de phrases
+        spectrum = (1.0 / np.arange(1, args.dim + 1) ** 0.8).astype(np.float32)
+        basis = np.linalg.qr(rng.standard_normal((args.dim, args.dim)))[0].astype(np.float32)
+
+        def sample(n):
+            return (rng.standard_normal((n, args.dim)).astype(np.float32) * spectrum) @ basis
+
+        evaluation_report(sample(args.docs), sample(args.queries), args.dims)
@@ -0,0 +1,390 @@
+"""
+Cache disque des embeddings, adressé par contenu.
+
+Les vecteurs sont indexés par (modèle, empreinte du texte normalisé) et
+stockés dans un fichier binaire par modèle (float32 ou float16), lu en
+mémoire mappée. Un petit index SQLite associe chaque empreinte à sa ligne.
+
+Tous les scripts d'indexation partagent ce cache : reconstruire un index
+dont le texte n'a pas changé ne demande presque aucune inférence.
+
+Les embeddings des questions passent par un cache LRU en mémoire (taille
+bornée, durée de vie) : une question déjà posée ne repasse pas par le modèle.
+Les phrases embeddées à chaque réponse (compression du contexte) ont leur
+propre cache LRU en mémoire (`SentenceEmbeddings`) : le chemin des réponses
+n'écrit jamais dans le cache disque des indexations.
+"""
+import hashlib
+import re
+import sqlite3
+import sys
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# Ajouter le chemin pour les imports
+sys.path.append(str(Path(__file__).parents[1]))
+
+from utils.logger import setup_logger
+import config
+
+logger = setup_logger("embedding_cache")
+
+
+def normalize_text(text: str) -> str:
+    """Normalise un texte avant hachage (Unicode NFC, espaces)."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def text_hash(text: str) -> str:
+    """Empreinte SHA-256 du texte normalisé."""
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def _slug(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", name)
+
+
+class EmbeddingCache:
+    """Cache persistant de vecteurs, partagé entre processus."""
+
+    def __init__(self, cache_dir: Path = None, dtype: str = None):
+        self.cache_dir = Path(cache_dir or config.EMBEDDING_CACHE_DIR)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.dtype = np.dtype(dtype or config.EMBEDDING_CACHE_DTYPE)
+        if self.dtype not in (np.float32, np.float16):
+            raise ValueError(f"Type de vecteur non supporté: {self.dtype}")
+        self._lock = threading.Lock()
+        self._maps: Dict[str, np.memmap] = {}
+        self._conn = sqlite3.connect(
+            str(self.cache_dir / f"index.{self.dtype.name}.sqlite3"), timeout=30, check_same_thread=False
+        )
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS shards (
+                model TEXT PRIMARY KEY,
+                file TEXT NOT NULL,
+                dim INTEGER NOT NULL,
+                rows INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS vectors (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                row INTEGER NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            );
+        """)
+
+    def _matrix(self, model: str) -> Optional[np.memmap]:
+        """Vue mémoire mappée des vecteurs d'un modèle (rechargée si le fichier a grandi)."""
+        shard = self._conn.execute(
+            "SELECT file, dim, rows FROM shards WHERE model = ?", (model,)
+        ).fetchone()
+        if shard is None or shard[2] == 0:
+            return None
+        file_name, dim, rows = shard
+        matrix = self._maps.get(model)
+        if matrix is None or matrix.shape[0] < rows:
+            matrix = np.memmap(self.cache_dir / file_name, dtype=self.dtype, mode="r", shape=(rows, dim))
+            self._maps[model] = matrix
+        return matrix
+
+    def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """
+        Cherche les vecteurs de `texts` dans le cache.
+
+        Args:
+            model: Nom du modèle d'embeddings
+            texts: Textes à chercher
+
+        Returns:
+            Vecteur float32 pour chaque texte, ou None s'il est absent
+        """
+        hashes = [text_hash(t) for t in texts]
+        with self._lock:
+            rows: Dict[str, int] = {}
+            unique = list(set(hashes))
+            for start in range(0, len(unique), 500):
+                batch = unique[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows.update(self._conn.execute(
+                    f"SELECT text_hash, row FROM vectors WHERE model = ? AND text_hash IN ({placeholders})",
+                    (model, *batch)
+                ).fetchall())
+            matrix = self._matrix(model) if rows else None
+        return [
+            np.asarray(matrix[rows[h]], dtype=np.float32) if h in rows else None
+            for h in hashes
+        ]
+
+    def put_many(self, model: str, texts: Sequence[str], vectors: Sequence[Sequence[float]]) -> None:
+        """
+        Ajoute des vecteurs au cache (les textes déjà présents sont ignorés).
+
+        Args:
+            model: Nom du modèle d'embeddings
+            texts: Textes embeddés
+            vectors: Vecteurs correspondants
+        """
+        if not texts:
+            return
+        array = np.asarray(vectors, dtype=self.dtype)
+        with self._lock, self._conn:
+            # Verrou d'écriture SQLite : sérialise les ajouts entre processus
+            self._conn.execute("BEGIN IMMEDIATE")
+            shard = self._conn.execute(
+                "SELECT file, dim, rows FROM shards WHERE model = ?", (model,)
+            ).fetchone()
+            if shard is None:
+                shard = (f"{_slug(model)}.{self.dtype.name}.bin", array.shape[1], 0)
+                self._conn.execute(
+                    "INSERT INTO shards (model, file, dim, rows) VALUES (?, ?, ?, 0)",
+                    (model, shard[0], shard[1])
+                )
+            file_name, dim, rows = shard
+            if array.shape[1] != dim:
+                raise ValueError(f"Dimension {array.shape[1]} incompatible avec le cache ({dim})")
+
+            new_rows, new_hashes = [], set()
+            for i, text in enumerate(texts):
+                h = text_hash(text)
+                if h in new_hashes:
+                    continue
+                exists = self._conn.execute(
+                    "SELECT 1 FROM vectors WHERE model = ? AND text_hash = ?", (model, h)
+                ).fetchone()
+                if not exists:
+                    new_hashes.add(h)
+                    new_rows.append((h, i))
+            if not new_rows:
+                return
+
+            with open(self.cache_dir / file_name, "ab") as f:
+                f.truncate(rows * dim * self.dtype.itemsize)
+                f.write(array[[i for _, i in new_rows]].tobytes())
+            self._conn.executemany(
+                "INSERT INTO vectors (model, text_hash, row) VALUES (?, ?, ?)",
+                [(model, h, rows + n) for n, (h, _) in enumerate(new_rows)]
+            )
+            self._conn.execute(
+                "UPDATE shards SET rows = ? WHERE model = ?", (rows + len(new_rows), model)
+            )
+
+    def count(self, model: str) -> int:
+        """Nombre de vecteurs en cache pour `model`."""
+        with self._lock:
+            row = self._conn.execute("SELECT rows FROM shards WHERE model = ?", (model,)).fetchone()
+        return row[0] if row else 0
+
+
+_shared_cache: Optional[EmbeddingCache] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_cache() -> EmbeddingCache:
+    """Retourne le cache d'embeddings partagé du processus."""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = EmbeddingCache()
+        return _shared_cache
+
+
+class QueryEmbeddingCache:
+    """Cache LRU en mémoire des embeddings de questions, avec durée de vie."""
+
+    def __init__(self, max_size: int = None, ttl_seconds: float = None):
+        self.max_size = max_size or config.QUERY_CACHE_SIZE
+        self.ttl_seconds = config.QUERY_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, List[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(model: str, text: str) -> Tuple[str, str]:
+        """Clé de cache : modèle et question normalisée."""
+        return model, normalize_text(text)
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        """Retourne le vecteur en cache (et le marque récent), ou None."""
+        key = self.key(model, text)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl_seconds and time.monotonic() - entry[0] > self.ttl_seconds:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return list(entry[1])
+
+    def put(self, model: str, text: str, vector: Sequence[float]) -> None:
+        """Ajoute un vecteur, en évinçant le moins récemment utilisé si plein."""
+        key = self.key(model, text)
+        with self._lock:
+            self._entries[key] = (time.monotonic(), list(vector))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """Taille, succès, échecs et taux de succès du cache."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+_query_cache: Optional[QueryEmbeddingCache] = None
+
+
+def get_query_cache() -> QueryEmbeddingCache:
+    """Retourne le cache des embeddings de questions partagé du processus."""
+    global _query_cache
+    with _shared_lock:
+        if _query_cache is None:
+            _query_cache = QueryEmbeddingCache()
+        return _query_cache
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings LangChain adossés au cache disque.
+
+    Le modèle sous-jacent n'est chargé qu'au premier texte absent du cache.
+    Les questions passent par le cache LRU en mémoire (`QueryEmbeddingCache`).
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        normalize: bool = True,
+        loader: Optional[Callable[[], Embeddings]] = None,
+        cache: Optional[EmbeddingCache] = None,
+        query_cache: Optional[QueryEmbeddingCache] = None
+    ):
+        self.model_name = model_name
+        self.normalize = normalize
+        # Clé de cache : les vecteurs normalisés et bruts ne sont pas interchangeables
+        self.cache_key = f"{model_name}#{'normalized' if normalize else 'raw'}"
+        self._loader = loader
+        self._model: Optional[Embeddings] = None
+        self.cache = cache or get_shared_cache()
+        self.query_cache = query_cache or get_query_cache()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def model(self) -> Embeddings:
+        if self._model is None:
+            if self._loader is not None:
+                self._model = self._loader()
+            else:
+                from chatbot import engine_registry
+                self._model = engine_registry.get_embeddings(self.model_name, normalize=self.normalize)
+        return self._model
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        cached = self.cache.get_many(self.cache_key, texts)
+        missing = [i for i, vector in enumerate(cached) if vector is None]
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            computed = self.model.embed_documents([texts[i] for i in missing])
+            self.cache.put_many(self.cache_key, [texts[i] for i in missing], computed)
+            for i, vector in zip(missing, computed):
+                cached[i] = np.asarray(vector, dtype=np.float32)
+
+        if texts:
+            logger.info(f"Embeddings: {len(texts) - len(missing)}/{len(texts)} servis par le cache")
+        return [vector.tolist() for vector in cached]
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self.query_cache.get(self.cache_key, text)
+        if vector is None:
+            vector = self.model.embed_query(text)
+            self.query_cache.put(self.cache_key, text, vector)
+        return vector
+
+
+class SentenceEmbeddings(Embeddings):
+    """
+    Embeddings des phrases embeddées à chaque réponse, en mémoire seulement.
+
+    Les vecteurs sont gardés dans un cache LRU (float32, taille bornée) :
+    aucune écriture dans le cache disque, dont le verrou SQLite est partagé
+    avec les indexations en cours dans d'autres processus.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        normalize: bool = True,
+        loader: Optional[Callable[[], Embeddings]] = None,
+        max_size: int = None
+    ):
+        self.model_name = model_name
+        self.normalize = normalize
+        self.max_size = max_size or config.SENTENCE_CACHE_SIZE
+        self._loader = loader
+        self._model: Optional[Embeddings] = None
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def model(self) -> Embeddings:
+        if self._model is None:
+            if self._loader is not None:
+                self._model = self._loader()
+            else:
+                from chatbot import engine_registry
+                self._model = engine_registry.get_embeddings(self.model_name, normalize=self.normalize)
+        return self._model
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [normalize_text(t) for t in texts]
+        with self._lock:
+            found = {}
+            for key in keys:
+                vector = self._entries.get(key)
+                if vector is not None:
+                    self._entries.move_to_end(key)
+                    found[key] = vector
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+        self.hits += sum(key in found for key in keys)
+        self.misses += len(missing)
+
+        if missing:
+            computed = self.model.embed_documents(list(missing.values()))
+            with self._lock:
+                for key, vector in zip(missing, computed):
+                    found[key] = self._entries[key] = np.asarray(vector, dtype=np.float32)
+                    self._entries.move_to_end(key)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return [found[key].tolist() for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.model.embed_query(text)
@@ -0,0 +1,361 @@
+"""
+Registre de moteurs RAG partagé au niveau du processus.
+
+Les modèles d'embeddings, bases vectorielles et retrievers sont chargés une
+seule fois par processus puis réutilisés d'une question à l'autre.
+Les entrées sont indexées par nom de modèle et chemin d'index.
+
+Avec config.VECTOR_BACKEND = "numpy" ou "quantized", les bases FAISS et
+Chroma sont remplacées à la requête par une recherche exacte en NumPy (voir
+numpy_store) ou par codes quantifiés (voir quantized_store).
+
+Un fichier `.index_version` écrit par les scripts d'indexation permet de
+détecter une reconstruction de l'index (même depuis un autre processus) :
+les bases et retrievers correspondants sont alors rechargés automatiquement.
+"""
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+# Ajouter le chemin pour les imports
+sys.path.append(str(Path(__file__).parents[1]))
+
+from utils.logger import setup_logger
+import config
+
+logger = setup_logger("engine_registry")
+
+INDEX_VERSION_FILE = ".index_version"
+
+_lock = threading.RLock()
+_embeddings: Dict[Tuple[str, bool], Any] = {}
+_cached_embeddings: Dict[Tuple[str, bool], Any] = {}
+_sentence_embeddings: Dict[Tuple[str, bool], Any] = {}
+_stores: Dict[Tuple, Tuple[Optional[str], Any]] = {}
+_retrievers: Dict[Tuple, Tuple[Optional[str], Any]] = {}
+
+
+def _path_key(index_path) -> str:
+    return str(Path(index_path).resolve())
+
+
+def read_index_version(index_path) -> Optional[str]:
+    """
+    Lit la version courante d'un index.
+
+    Args:
+        index_path: Dossier de l'index (FAISS ou Chroma)
+
+    Returns:
+        Identifiant de version, ou None si l'index n'a jamais été marqué
+    """
+    version_file = Path(index_path) / INDEX_VERSION_FILE
+    try:
+        return version_file.read_text(encoding="utf-8").strip() or None
+    except OSError:
+        return None
+
+
+def mark_index_updated(index_path, changed_sources: Optional[Iterable[str]] = None) -> str:
+    """
+    Signale qu'un index vient d'être (re)construit.
+
+    Écrit une nouvelle version dans le dossier de l'index et invalide les
+    entrées du registre du processus courant. Les autres processus verront
+    la nouvelle version au prochain accès. Les réponses en cache qui ne
+    citent aucune source modifiée sont rattachées à la nouvelle version.
+
+    Args:
+        index_path: Dossier de l'index reconstruit
+        changed_sources: Sources modifiées depuis la version précédente
+            (None = reconstruction complète, toutes les réponses sont oubliées)
+
+    Returns:
+        Nouvel identifiant de version
+    """
+    index_path = Path(index_path)
+    index_path.mkdir(parents=True, exist_ok=True)
+    old_version = read_index_version(index_path)
+    version = f"{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    (index_path / INDEX_VERSION_FILE).write_text(version, encoding="utf-8")
+    invalidate(index_path)
+    logger.info(f"Index marqué comme mis à jour: {index_path} (version {version})")
+
+    try:
+        from chatbot.answer_cache import get_shared_cache
+        get_shared_cache().on_index_updated(index_path, old_version, version, changed_sources)
+    except Exception as e:
+        logger.warning(f"Cache des réponses non mis à jour: {e}")
+    return version
+
+
+def get_embeddings(model_name: str, normalize: bool = True):
+    """
+    Retourne le modèle d'embeddings partagé pour `model_name`.
+
+    Args:
+        model_name: Nom du modèle sentence-transformers
+        normalize: Normaliser les vecteurs (cosinus)
+
+    Returns:
+        Instance HuggingFaceEmbeddings chargée une seule fois par processus
+    """
+    key = (model_name, normalize)
+    with _lock:
+        if key not in _embeddings:
+            from langchain_community.embeddings import HuggingFaceEmbeddings
+
+            start = time.perf_counter()
+            encode_kwargs = {'normalize_embeddings': True} if normalize else {}
+            _embeddings[key] = HuggingFaceEmbeddings(
+                model_name=model_name,
+                model_kwargs={'device': 'cpu'},
+                encode_kwargs=encode_kwargs
+            )
+            logger.info(f"Modèle d'embeddings chargé: {model_name} "
+                        f"({time.perf_counter() - start:.2f}s)")
+        return _embeddings[key]
+
+
+def get_cached_embeddings(model_name: str, normalize: bool = True):
+    """
+    Retourne les embeddings partagés de `model_name`, derrière les caches.
+
+    Les questions sont servies par le cache LRU en mémoire, les documents par
+    le cache disque ; le modèle n'est appelé que pour les textes inconnus.
+
+    Args:
+        model_name: Nom du modèle sentence-transformers
+        normalize: Normaliser les vecteurs (cosinus)
+
+    Returns:
+        Instance CachedEmbeddings partagée
+    """
+    from chatbot.embedding_cache import CachedEmbeddings
+
+    key = (model_name, normalize)
+    with _lock:
+        if key not in _cached_embeddings:
+            _cached_embeddings[key] = CachedEmbeddings(model_name, normalize=normalize)
+        embeddings = _cached_embeddings[key]
+    # Chargement immédiat du modèle (préchargement avant la première question)
+    embeddings.model
+    return embeddings
+
+
+def get_sentence_embeddings(model_name: str, normalize: bool = True):
+    """
+    Retourne les embeddings partagés des phrases de la compression du contexte.
+
+    Les vecteurs sont gardés en mémoire seulement (voir
+    `embedding_cache.SentenceEmbeddings`) : répondre à une question n'écrit
+    jamais dans le cache disque des indexations.
+
+    Args:
+        model_name: Nom du modèle sentence-transformers
+        normalize: Normaliser les vecteurs (cosinus)
+
+    Returns:
+        Instance SentenceEmbeddings partagée
+    """
+    from chatbot.embedding_cache import SentenceEmbeddings
+
+    key = (model_name, normalize)
+    with _lock:
+        if key not in _sentence_embeddings:
+            _sentence_embeddings[key] = SentenceEmbeddings(model_name, normalize=normalize)
+        return _sentence_embeddings[key]
+
+
+def _get_or_load(cache: Dict, key: Tuple, index_path, loader: Callable[[], Any]):
+    """Retourne l'entrée en cache si la version de l'index n'a pas changé."""
+    version = read_index_version(index_path)
+    with _lock:
+        cached = cache.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        if cached is not None:
+            logger.info(f"Nouvelle version d'index détectée pour {index_path}, rechargement")
+        start = time.perf_counter()
+        value = loader()
+        cache[key] = (version, value)
+        logger.info(f"Chargé: {key[0]} {key[1]} ({time.perf_counter() - start:.2f}s)")
+        return value
+
+
+def _open_numpy_store(index_path, embedding, model_name: str, load_native: Callable[[], Any],
+                      collection_name: Optional[str] = None):
+    """Base NumPy (exacte ou quantifiée) exportée depuis l'index FAISS / Chroma."""
+    from chatbot.numpy_store import STORE_DIRNAME, NumpyVectorStore, open_or_export
+
+    store_class = NumpyVectorStore
+    if config.VECTOR_BACKEND == "quantized":
+        from chatbot.quantized_store import QuantizedVectorStore as store_class
+
+    name = f"{STORE_DIRNAME}_{collection_name}" if collection_name else STORE_DIRNAME
+    return open_or_export(index_path, embedding, model_name, read_index_version(index_path),
+                          load_native, name=name, store_class=store_class)
+
+
+def get_faiss_store(index_path, model_name: str = "all-MiniLM-L6-v2"):
+    """
+    Retourne la base FAISS partagée pour `index_path`.
+
+    Args:
+        index_path: Dossier contenant index.faiss / index.pkl
+        model_name: Modèle d'embeddings utilisé à l'indexation
+
+    Returns:
+        Base FAISS chargée
+    """
+    key = ("faiss", _path_key(index_path), model_name)
+
+    def load_native():
+        from langchain_community.vectorstores import FAISS
+
+        return FAISS.load_local(
+            str(index_path),
+            get_cached_embeddings(model_name, normalize=False),
+            allow_dangerous_deserialization=True
+        )
+
+    def loader():
+        if config.VECTOR_BACKEND in ("numpy", "quantized"):
+            return _open_numpy_store(index_path, get_cached_embeddings(model_name, normalize=False),
+                                     model_name, load_native)
+        return load_native()
+
+    return _get_or_load(_stores, key, index_path, loader)
+
+
+def get_chroma_store(
+    persist_dir,
+    model_name: str,
+    collection_name: Optional[str] = None,
+    embedding_function=None
+):
+    """
+    Retourne la base Chroma partagée pour `persist_dir`.
+
+    Args:
+        persist_dir: Dossier de persistance Chroma
+        model_name: Modèle d'embeddings utilisé à l'indexation
+        collection_name: Nom de la collection (défaut LangChain si None)
+        embedding_function: Fonction d'embeddings à utiliser
+            (par défaut, le modèle partagé `model_name` derrière les caches)
+
+    Returns:
+        Base Chroma chargée
+    """
+    key = ("chroma", _path_key(persist_dir), model_name, collection_name)
+
+    def load_native():
+        from langchain_community.vectorstores import Chroma
+
+        kwargs = {}
+        if collection_name:
+            kwargs["collection_name"] = collection_name
+        return Chroma(
+            persist_directory=str(persist_dir),
+            embedding_function=embedding_function or get_cached_embeddings(model_name),
+            **kwargs
+        )
+
+    def loader():
+        if config.VECTOR_BACKEND in ("numpy", "quantized"):
+            return _open_numpy_store(persist_dir, embedding_function or get_cached_embeddings(model_name),
+                                     model_name, load_native, collection_name)
+        return load_native()
+
+    return _get_or_load(_stores, key, persist_dir, loader)
+
+
+def get_retriever(index_path, model_name: str, params: Hashable, factory: Callable[[], Any]):
+    """
+    Retourne un retriever partagé, construit une seule fois par configuration.
+
+    Args:
+        index_path: Dossier de l'index interrogé
+        model_name: Modèle d'embeddings associé
+        params: Paramètres distinguant le retriever (mode, k, ...)
+        factory: Fonction construisant le retriever au premier appel
+
+    Returns:
+        Retriever chargé
+    """
+    key = ("retriever", _path_key(index_path), model_name, params)
+    return _get_or_load(_retrievers, key, index_path, factory)
+
+
+def invalidate(index_path=None) -> int:
+    """
+    Oublie les bases et retrievers chargés pour un index.
+
+    Les modèles d'embeddings sont conservés : seul l'index a changé.
+
+    Args:
+        index_path: Dossier de l'index à oublier (tous les index si None)
+
+    Returns:
+        Nombre d'entrées supprimées
+    """
+    removed = 0
+    with _lock:
+        for cache in (_stores, _retrievers):
+            for key in list(cache):
+                if index_path is None or key[1] == _path_key(index_path):
+                    del cache[key]
+                    removed += 1
+    if removed:
+        logger.info(f"Registre invalidé: {removed} entrée(s) supprimée(s)")
+    return removed
+
+
+def clear() -> None:
+    """Vide complètement le registre (modèles compris)."""
+    with _lock:
+        _embeddings.clear()
+        _cached_embeddings.clear()
+        _sentence_embeddings.clear()
+        _stores.clear()
+        _retrievers.clear()
+
+
+def warm_up(*loaders: Callable[[], Any]) -> None:
+    """
+    Précharge les moteurs avant la première question.
+
+    Chaque loader est appelé une fois (ex: `lambda: get_faiss_store(path)`).
+    Une première requête d'embedding est ensuite faite sur chaque modèle
+    chargé pour initialiser le modèle.
+
+    Args:
+        loaders: Fonctions de chargement à exécuter
+    """
+    start = time.perf_counter()
+    for loader in loaders:
+        try:
+            loader()
+        except Exception as e:
+            logger.warning(f"Préchargement impossible: {e}")
+    with _lock:
+        models = list(_embeddings.values())
+    for model in models:
+        model.embed_query("préchauffage")
+    logger.info(f"Moteurs préchargés en {time.perf_counter() - start:.2f}s")
+
+
+def stats() -> Dict[str, Any]:
+    """Retourne le nombre d'entrées chargées par catégorie et l'état du cache des questions."""
+    from chatbot.embedding_cache import get_query_cache
+
+    with _lock:
+        return {
+            "embeddings": len(_embeddings),
+            "stores": len(_stores),
+            "retrievers": len(_retrievers),
+            "query_cache": get_query_cache().stats(),
+        }
@@ -0,0 +1,380 @@
+"""
+Recherche hybride (sémantique + BM25) vectorisée.
+
+Remplace `EnsembleRetriever`, qui interroge les deux retrievers l'un après
+l'autre puis fusionne les rangs en Python sur des objets `Document`, sans
+donner accès aux scores.
+
+Les vecteurs des chunks sont gardés dans une matrice NumPy alignée sur les
+identifiants de l'index BM25 (voir bm25_index). Pour une question :
+
+1. l'embedding de la question est calculé dans un thread pendant que les
+   scores BM25 de tous les documents sont calculés ;
+2. les scores cosinus de tous les documents sont obtenus par un seul
+   produit matrice-vecteur ;
+3. les `fetch_k` meilleurs de chaque côté forment un ensemble commun de
+   candidats, notés par les deux méthodes ;
+4. les scores sont fusionnés (config.HYBRID_FUSION) :
+   - "rrf" : reciprocal rank fusion pondérée, comme `EnsembleRetriever` ;
+   - "weighted" : somme pondérée des scores ramenés entre 0 et 1.
+
+Les poids viennent de config.HYBRID_DENSE_WEIGHT / HYBRID_LEXICAL_WEIGHT.
+Seuls les `k` documents retenus sont reconstruits, avec leurs scores dans
+les métadonnées (`score`, `dense_score`, `lexical_score`).
+
+Benchmark : python chatbot/hybrid_search.py [--docs 5000] [--embed-ms 8] [--real]
+"""
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+# Ajouter le chemin pour les imports
+sys.path.append(str(Path(__file__).parents[1]))
+
+from utils.logger import setup_logger
+import config
+
+logger = setup_logger("hybrid_search")
+
+FUSIONS = ("rrf", "weighted")
+EMBED_WORKERS = 2  # Embeddings de questions calculés pendant le score BM25, tous moteurs confondus
+
+# Pool partagé par tous les moteurs : un moteur reconstruit après une mise à
+# jour de l'index ne laisse pas de thread derrière lui
+_embed_executor: Optional[ThreadPoolExecutor] = None
+_embed_executor_lock = threading.Lock()
+
+
+def _get_embed_executor() -> ThreadPoolExecutor:
+    """Retourne le pool partagé des embeddings de questions."""
+    global _embed_executor
+    with _embed_executor_lock:
+        if _embed_executor is None:
+            _embed_executor = ThreadPoolExecutor(max_workers=EMBED_WORKERS, thread_name_prefix="hybrid-embed")
+        return _embed_executor
+
+
+def _unit_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def align_vectors(
+    metadatas: Sequence[Dict[str, Any]],
+    ids: Sequence[str],
+    embeddings: Sequence[Sequence[float]]
+) -> np.ndarray:
+    """
+    Range les vecteurs de la base vectorielle dans l'ordre des documents BM25.
+
+    Les identifiants des chunks sont leur empreinte (`metadata['chunk_hash']`),
+    suffixée par le numéro d'occurrence pour les doublons (voir
+    incremental_index.assign_chunk_ids).
+
+    Args:
+        metadatas: Métadonnées des documents BM25, dans l'ordre des identifiants
+        ids: Identifiants des chunks de la base vectorielle
+        embeddings: Vecteurs correspondants (même ordre que `ids`)
+
+    Returns:
+        Matrice float32 normalisée (N x dim) ; les documents introuvables ont
+        un vecteur nul (score sémantique 0)
+    """
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    rows = {chunk_id: i for i, chunk_id in enumerate(ids)}
+    matrix = np.zeros((len(metadatas), vectors.shape[1] if vectors.ndim == 2 else 0), dtype=np.float32)
+    occurrences: Counter = Counter()
+    missing = 0
+    for doc_id, metadata in enumerate(metadatas):
+        chunk_hash = (metadata or {}).get('chunk_hash')
+        occurrence = occurrences[chunk_hash]
+        occurrences[chunk_hash] += 1
+        row = rows.get(chunk_hash if occurrence == 0 else f"{chunk_hash}-{occurrence}")
+        if row is None:
+            missing += 1
+            continue
+        matrix[doc_id] = vectors[row]
+    if missing:
+        logger.warning(f"⚠️  {missing}/{len(metadatas)} documents BM25 sans vecteur (score sémantique nul)")
+    return _unit_rows(matrix)
+
+
+def _ranks(scores: np.ndarray) -> np.ndarray:
+    """Rang (à partir de 1) de chaque score, le plus grand en premier."""
+    ranks = np.empty(len(scores), dtype=np.float32)
+    ranks[np.argsort(-scores, kind="stable")] = np.arange(1, len(scores) + 1)
+    return ranks
+
+
+def _min_max(scores: np.ndarray) -> np.ndarray:
+    low, high = scores.min(), scores.max()
+    if high <= low:
+        return np.ones_like(scores) if high > 0 else np.zeros_like(scores)
+    return (scores - low) / (high - low)
+
+
+def _top(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices des `k` plus grands scores, triés par score décroissant."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    best = np.argpartition(-scores, k - 1)[:k]
+    return best[np.argsort(-scores[best], kind="stable")]
+
+
+class HybridSearchEngine:
+    """Index BM25 + matrice de vecteurs alignée, avec fusion vectorisée des scores."""
+
+    def __init__(
+        self,
+        index,
+        vectors: np.ndarray,
+        embed_query: Callable[[str], Sequence[float]],
+        fusion: str = None,
+        dense_weight: float = None,
+        lexical_weight: float = None,
+        fetch_k: int = None,
+        rrf_k: int = None
+    ):
+        """
+        Args:
+            index: `BM25Index` (identifiants de documents = lignes de `vectors`)
+            vectors: Matrice (N x dim) des embeddings des documents
+            embed_query: Embedding d'une question (même modèle que `vectors`)
+            fusion: "rrf" ou "weighted" (défaut: config.HYBRID_FUSION)
+            dense_weight: Poids sémantique (défaut: config.HYBRID_DENSE_WEIGHT)
+            lexical_weight: Poids lexical (défaut: config.HYBRID_LEXICAL_WEIGHT)
+            fetch_k: Candidats retenus de chaque côté (défaut: config.RETRIEVER_FETCH_K)
+            rrf_k: Constante de lissage RRF (défaut: config.HYBRID_RRF_K)
+        """
+        self.fusion = fusion or config.HYBRID_FUSION
+        if self.fusion not in FUSIONS:
+            raise ValueError(f"Fusion inconnue: {self.fusion}")
+        if len(vectors) != len(index):
+            raise ValueError(f"{len(vectors)} vecteurs pour {len(index)} documents BM25")
+        self.index = index
+        self.vectors = _unit_rows(np.ascontiguousarray(vectors, dtype=np.float32))
+        self.embed_query = embed_query
+        self.dense_weight = config.HYBRID_DENSE_WEIGHT if dense_weight is None else dense_weight
+        self.lexical_weight = config.HYBRID_LEXICAL_WEIGHT if lexical_weight is None else lexical_weight
+        self.fetch_k = fetch_k or config.RETRIEVER_FETCH_K
+        self.rrf_k = config.HYBRID_RRF_K if rrf_k is None else rrf_k
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def rank(
+        self,
+        query: str,
+        k: int,
+        query_vector: Optional[Sequence[float]] = None
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Classe les documents pour `query`.
+
+        Args:
+            query: Question en texte libre
+            k: Nombre de résultats
+            query_vector: Embedding déjà calculé de la question (sinon `embed_query`)
+
+        Returns:
+            Tuple (identifiants, scores fusionnés, scores cosinus, scores BM25),
+            triés par score fusionné décroissant
+        """
+        pending = None if query_vector is not None else _get_embed_executor().submit(self.embed_query, query)
+        lexical = self.index.get_scores(query)
+        if pending is not None:
+            query_vector = pending.result()
+        dense = self.vectors @ _unit_rows(np.asarray(query_vector, dtype=np.float32))
+
+        # Ensemble commun de candidats, notés par les deux méthodes
+        lexical_top = _top(lexical, self.fetch_k)
+        candidates = np.union1d(_top(dense, self.fetch_k), lexical_top[lexical[lexical_top] > 0])
+        dense_scores, lexical_scores = dense[candidates], lexical[candidates]
+
+        if self.fusion == "rrf":
+            fused = self.dense_weight / (self.rrf_k + _ranks(dense_scores))
+            # Un document sans terme commun avec la question n'a pas de rang lexical
+            fused += np.where(lexical_scores > 0,
+                              self.lexical_weight / (self.rrf_k + _ranks(lexical_scores)), 0.0)
+        else:
+            fused = (self.dense_weight * _min_max(dense_scores)
+                     + self.lexical_weight * _min_max(lexical_scores))
+
+        order = _top(fused, k)
+        return candidates[order], fused[order], dense_scores[order], lexical_scores[order]
+
+    def search(self, query: str, k: int = None,
+               query_vector: Optional[Sequence[float]] = None) -> List[Document]:
+        """
+        Recherche hybride.
+
+        Args:
+            query: Question en texte libre
+            k: Nombre de résultats (défaut: config.RETRIEVER_K)
+            query_vector: Embedding déjà calculé de la question
+
+        Returns:
+            Documents triés, avec `score` (fusionné), `dense_score` (cosinus)
+            et `lexical_score` (BM25) dans les métadonnées
+        """
+        doc_ids, fused, dense, lexical = self.rank(query, k or config.RETRIEVER_K, query_vector)
+        results = []
+        for doc_id, score, dense_score, lexical_score in zip(doc_ids, fused, dense, lexical):
+            doc = self.index.get_document(int(doc_id))
+            doc.metadata.update(score=float(score), dense_score=float(dense_score),
+                                lexical_score=float(lexical_score))
+            results.append(doc)
+        return results
+
+
+class HybridRetriever(BaseRetriever):
+    """Retriever LangChain adossé à un `HybridSearchEngine`."""
+
+    engine: Any
+    k: int = 4
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return self.engine.search(query, self.k)
+
+
+def _ensemble_reference(engine: HybridSearchEngine, query: str, k: int) -> List[Document]:
+    """
+    Ancien chemin, pour le benchmark : recherche MMR puis BM25 l'une après
+    l'autre, `Document` reconstruits pour chaque liste, fusion RRF en Python
+    (algorithme d'`EnsembleRetriever`). La recherche des `fetch_k` candidats
+    de Chroma est remplacée par un produit matriciel (avantage à l'ancien chemin).
+    """
+    from langchain_core.vectorstores.utils import maximal_marginal_relevance
+
+    query_vector = _unit_rows(np.asarray(engine.embed_query(query), dtype=np.float32))
+    fetched = _top(engine.vectors @ query_vector, engine.fetch_k)
+    selected = maximal_marginal_relevance(query_vector, engine.vectors[fetched], k=k)
+    semantic_docs = [engine.index.get_document(int(fetched[i])) for i in selected]
+    lexical_docs = [engine.index.get_document(doc_id) for doc_id, _ in engine.index.top_k(query, k)]
+
+    scores: Dict[str, float] = {}
+    documents: Dict[str, Document] = {}
+    for weight, docs in ((engine.dense_weight, semantic_docs), (engine.lexical_weight, lexical_docs)):
+        for rank, doc in enumerate(docs, start=1):
+            scores[doc.page_content] = scores.get(doc.page_content, 0.0) + weight / (rank + engine.rrf_k)
+            documents.setdefault(doc.page_content, doc)
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    return [documents[text] for text in ranked[:k]]
+
+
+def _timings(search: Callable[[str], Any], queries: Sequence[str]) -> Tuple[float, float]:
+    durations = []
+    for query in queries:
+        start = time.perf_counter()
+        search(query)
+        durations.append((time.perf_counter() - start) * 1000)
+    return float(np.mean(durations)), float(np.percentile(durations, 95))
+
+
+def benchmark(num_docs: int = 5000, dim: int = 768, num_queries: int = 200,
+              embed_ms: float = 8.0, k: int = None) -> None:
+    """
+    Compare la latence du moteur vectorisé et de l'ancien chemin sur un corpus synthétique.
+
+    Args:
+        num_docs: Nombre de chunks
+        dim: Dimension des embeddings
+        num_queries: Nombre de questions
+        embed_ms: Durée simulée de l'embedding d'une question (0 = question déjà en cache)
+        k: Nombre de résultats (défaut: config.RETRIEVER_K)
+    """
+    import tempfile
+    from chatbot.bm25_index import BM25Index, BM25IndexBuilder
+
+    k = k or config.RETRIEVER_K
+    rng = np.random.default_rng(0)
+    vocabulary = [f"mot{i}" for i in range(3000)]
+    texts = [" ".join(rng.choice(vocabulary, size=120)) for _ in range(num_docs)]
+    vectors = rng.standard_normal((num_docs, dim)).astype(np.float32)
+    queries = [" ".join(rng.choice(vocabulary, size=6)) for _ in range(num_queries)]
+
+    def embed_query(text: str) -> np.ndarray:
+        if embed_ms:
+            time.sleep(embed_ms / 1000)
+        return np.random.default_rng(abs(hash(text)) % 2**32).standard_normal(dim)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        builder = BM25IndexBuilder()
+        builder.add(texts, [{"source": f"doc{i // 50}.pdf", "page": i % 50} for i in range(num_docs)])
+        engine = HybridSearchEngine(BM25Index(builder.save(Path(tmp_dir) / "bm25")), vectors, embed_query)
+
+        print(f"Corpus synthétique : {num_docs} chunks, dimension {dim}, k={k}, "
+              f"fetch_k={engine.fetch_k}, embedding simulé {embed_ms:.1f} ms")
+        for label, search in (
+            ("Ancien chemin (séquentiel, RRF Python)", lambda q: _ensemble_reference(engine, q, k)),
+            (f"Moteur vectorisé ({engine.fusion})", lambda q: engine.search(q, k)),
+        ):
+            mean, p95 = _timings(search, queries)
+            print(f"  {label:<42} moyenne {mean:7.2f} ms   p95 {p95:7.2f} ms")
+
+
+def benchmark_real() -> None:
+    """Compare `EnsembleRetriever` et le retriever hybride sur la base v2 réelle."""
+    from langchain.retrievers import EnsembleRetriever
+    from chatbot import engine_registry
+    from chatbot.bm25_index import PrebuiltBM25Retriever
+    from chatbot.setup_rag_v2 import MultilingualEmbeddings, _load_bm25_index, load_retriever
+
+    db = engine_registry.get_chroma_store(config.DB_DIR, config.EMBEDDING_MODEL,
+                                          embedding_function=MultilingualEmbeddings())
+    ensemble = EnsembleRetriever(
+        retrievers=[
+            db.as_retriever(search_type="mmr", search_kwargs={"k": config.RETRIEVER_K,
+                                                              "fetch_k": config.RETRIEVER_FETCH_K}),
+            PrebuiltBM25Retriever(index=_load_bm25_index(db), k=config.RETRIEVER_K),
+        ],
+        weights=[config.HYBRID_DENSE_WEIGHT, config.HYBRID_LEXICAL_WEIGHT]
+    )
+    hybrid = load_retriever("hybrid")
+    questions = [
+        "Comment justifier une absence ?",
+        "Le GSM est-il autorisé en classe ?",
+        "Quels sont les horaires des cours ?",
+        "Que faire en cas de retard ?",
+        "Quelle est la procédure en cas d'accident ?",
+        "Quelles sont les sanctions disciplinaires ?",
+    ]
+
+    print(f"Base {config.DB_DIR} : {len(hybrid.engine)} chunks")
+    for label, retriever in (("EnsembleRetriever", ensemble), ("Moteur vectorisé", hybrid)):
+        # Questions déjà embeddées : seule la recherche est mesurée
+        for question in questions:
+            retriever.invoke(question)
+        mean, p95 = _timings(retriever.invoke, questions * 10)
+        print(f"  {label:<20} moyenne {mean:7.2f} ms   p95 {p95:7.2f} ms")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark de la recherche hybride")
+    parser.add_argument("--docs", type=int, default=5000, help="Chunks du corpus synthétique")
+    parser.add_argument("--dim", type=int, default=768, help="Dimension des embeddings")
+    parser.add_argument("--queries", type=int, default=200, help="Nombre de questions")
+    parser.add_argument("--embed-ms", type=float, default=8.0,
+                        help="Durée simulée de l'embedding d'une question (0 = en cache)")
+    parser.add_argument("--real", action="store_true",
+                        help="Comparer avec EnsembleRetriever sur la base v2 existante")
+    args = parser.parse_args()
+
+    if args.real:
+        benchmark_real()
+    else:
+        benchmark(args.docs, args.dim, args.queries, args.embed_ms)
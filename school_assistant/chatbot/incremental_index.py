@@ -0,0 +1,64 @@
+"""
+Identifiants stables des chunks, pour la réindexation incrémentale.
+
+Chaque chunk reçoit un identifiant déterministe dérivé de sa source, de sa
+page et de son contenu. À la réindexation (streaming_pipeline), seuls les
+chunks dont l'identifiant n'existe pas encore sont embeddés ; les chunks
+dont la source a disparu ou changé sont supprimés ; les autres ne sont pas
+touchés.
+"""
+import hashlib
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+from langchain_core.documents import Document
+
+# Ajouter le chemin pour les imports
+sys.path.append(str(Path(__file__).parents[1]))
+
+from utils.logger import setup_logger
+
+logger = setup_logger("incremental_index")
+
+
+def compute_chunk_hash(chunk: Document) -> str:
+    """
+    Calcule l'empreinte d'un chunk (source, page et contenu).
+
+    Args:
+        chunk: Chunk à identifier
+
+    Returns:
+        Empreinte hexadécimale (32 caractères)
+    """
+    key = "\x1f".join([
+        str(chunk.metadata.get('source', '')),
+        str(chunk.metadata.get('page', '')),
+        chunk.page_content,
+    ])
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+
+def assign_chunk_ids(chunks: List[Document]) -> List[str]:
+    """
+    Attribue un identifiant stable à chaque chunk.
+
+    L'empreinte est aussi stockée dans `metadata['chunk_hash']`. Les chunks
+    strictement identiques d'une même page reçoivent un suffixe d'occurrence.
+
+    Args:
+        chunks: Chunks à identifier
+
+    Returns:
+        Identifiants, dans l'ordre des chunks
+    """
+    ids = []
+    seen: Dict[str, int] = {}
+    for chunk in chunks:
+        chunk_hash = compute_chunk_hash(chunk)
+        chunk.metadata['chunk_hash'] = chunk_hash
+        occurrence = seen.get(chunk_hash, 0)
+        seen[chunk_hash] = occurrence + 1
+        ids.append(chunk_hash if occurrence == 0 else f"{chunk_hash}-{occurrence}")
+    return ids
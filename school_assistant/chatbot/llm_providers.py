@@ -0,0 +1,468 @@
+"""
+Couche fournisseurs LLM partagée par tous les points d'entrée.
+
+Chaque fournisseur déclaré dans config.LLM_PROVIDERS (Groq, OpenAI, DeepSeek,
+Ollama) construit son client LangChain une seule fois par processus. Les
+clients HTTP sous-jacents gardent leurs connexions ouvertes (keep-alive) :
+seule la première question paie la connexion et la négociation TLS. Chaque
+appel est borné par le délai du fournisseur et retenté sur erreur
+transitoire (délai dépassé, connexion, 429, 5xx), jamais sur quota épuisé.
+
+Un disjoncteur par fournisseur (voir circuit_breaker) écarte pendant un
+délai de refroidissement ceux qui échouent à répétition (quota épuisé,
+Ollama non démarré...), pour qu'ils ne ralentissent plus chaque question.
+
+`generate(context, question)` interroge les fournisseurs configurés par
+temps de réponse attendu (voir provider_router, ou l'ordre fixe de
+config.LLM_PROVIDER_ORDER si config.LLM_ROUTING = "static"), avec
+couverture (voir provider_dispatch). `generate_stream(context, question)`
+fait de même en streaming : la réponse s'affiche au fil de la génération.
+"""
+import asyncio
+import functools
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+# Ajouter le chemin pour les imports
+sys.path.append(str(Path(__file__).parents[1]))
+
+from chatbot.circuit_breaker import CircuitBreaker
+from chatbot.provider_dispatch import ProviderCall, StreamCall, generate_hedged, stream_hedged
+from chatbot import provider_router
+from chatbot.provider_router import get_router
+from utils.logger import setup_logger
+import config
+
+logger = setup_logger("llm_providers")
+
+DEFAULT_PROMPT = """Tu es un assistant scolaire spécialisé dans les règlements de l'Académie Provinciale des Métiers (APM).
+
+Utilise UNIQUEMENT les informations suivantes pour répondre à la question.
+Si la réponse n'est pas dans le contexte, dis-le clairement.
+
+CONTEXTE DES RÈGLEMENTS :
+{context}
+
+QUESTION : {question}
+
+RÉPONSE (en français, claire et concise) :"""
+
+
+def _http_clients() -> Dict[str, Any]:
+    """Clients httpx avec pool de connexions persistantes (si httpx est installé)."""
+    try:
+        import httpx
+    except ImportError:
+        return {}
+    limits = httpx.Limits(
+        max_connections=config.LLM_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=config.LLM_HTTP_MAX_CONNECTIONS,
+        keepalive_expiry=config.LLM_HTTP_KEEPALIVE_SECONDS,
+    )
+    return {
+        "http_client": httpx.Client(limits=limits),
+        "http_async_client": httpx.AsyncClient(limits=limits),
+    }
+
+
+def _build_client(settings: Dict[str, Any], api_key: Optional[str]):
+    """Construit le client LangChain d'un fournisseur (nouvelles tentatives gérées ici)."""
+    kind = settings["client"]
+    if kind == "groq":
+        from langchain_groq import ChatGroq
+        return ChatGroq(
+            model=settings["model"],
+            api_key=api_key,
+            temperature=config.LLM_TEMPERATURE,
+            timeout=settings["timeout"],
+            max_retries=0,
+            **_http_clients()
+        )
+    if kind == "openai":
+        from langchain_openai import ChatOpenAI
+        return ChatOpenAI(
+            model=settings["model"],
+            api_key=api_key,
+            base_url=settings.get("base_url"),
+            temperature=config.LLM_TEMPERATURE,
+            timeout=settings["timeout"],
+            max_retries=0,
+            **_http_clients()
+        )
+    if kind == "ollama":
+        try:
+            from langchain_ollama import ChatOllama
+            return ChatOllama(
+                model=settings["model"],
+                base_url=settings["base_url"],
+                temperature=config.LLM_TEMPERATURE,
+                client_kwargs={"timeout": settings["timeout"]},
+            )
+        except ImportError:
+            from langchain_community.llms import Ollama
+            return Ollama(
+                model=settings["model"],
+                base_url=settings["base_url"],
+                temperature=config.LLM_TEMPERATURE,
+                timeout=int(settings["timeout"]),
+            )
+    raise ValueError(f"Type de client LLM inconnu: {kind}")
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Indique si une erreur d'appel est transitoire.
+
+    Args:
+        error: Exception levée par le client
+
+    Returns:
+        True pour un délai dépassé, une erreur de connexion, un 429 ou un 5xx ;
+        False pour un quota épuisé, une clé invalide ou une requête refusée
+    """
+    if "insufficient_quota" in str(error):
+        return False
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status == 429 or status >= 500
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    name = type(error).__name__.lower()
+    return "timeout" in name or "connect" in name
+
+
+class LLMProvider:
+    """Fournisseur LLM : client construit à la première utilisation puis réutilisé."""
+
+    def __init__(self, name: str, settings: Dict[str, Any], client=None):
+        self.name = name
+        self.settings = settings
+        self.label = settings.get("label", name)
+        self.model = settings["model"]
+        self.timeout = settings.get("timeout", 30.0)
+        self.max_retries = settings.get("max_retries", 0)
+        self._client = client
+        self._lock = threading.Lock()
+        self.breaker = CircuitBreaker(self.label)
+
+    @property
+    def api_key(self) -> Optional[str]:
+        """Première clé API définie parmi config `api_key_env`."""
+        for variable in self.settings.get("api_key_env", []):
+            value = os.getenv(variable)
+            if value:
+                return value
+        return None
+
+    def configured(self) -> bool:
+        """True si le fournisseur n'exige pas de clé ou si sa clé est définie."""
+        return not self.settings.get("api_key_env") or self.api_key is not None
+
+    @property
+    def client(self):
+        """Client LangChain partagé (construit une seule fois)."""
+        with self._lock:
+            if self._client is None:
+                self._client = _build_client(self.settings, self.api_key)
+                logger.info(f"🔌 Client {self.label} prêt ({self.model})")
+            return self._client
+
+    async def agenerate(self, context: str, question: str,
+                        prompt_template: Optional[str] = None) -> Optional[str]:
+        """
+        Génère une réponse à partir du contexte documentaire.
+
+        Args:
+            context: Contexte documentaire
+            question: Question de l'utilisateur
+            prompt_template: Gabarit avec {context} et {question} (défaut: DEFAULT_PROMPT)
+
+        Returns:
+            Réponse du modèle, ou None si le fournisseur n'est pas configuré
+            ou si son disjoncteur est ouvert
+        """
+        if not self.configured() or not self.breaker.allow():
+            return None
+        prompt = (prompt_template or DEFAULT_PROMPT).format(context=context, question=question)
+        start = time.perf_counter()
+        try:
+            answer = await self._invoke(prompt)
+        except asyncio.CancelledError:
+            # Requête couverte annulée : ni succès ni échec
+            self.breaker.release()
+            self._observe(start, provider_router.CANCELLED)
+            raise
+        except Exception as e:
+            self.breaker.record_failure(e)
+            self._observe(start, provider_router.FAILURE)
+            raise
+        self.breaker.record_success()
+        self._observe(start, provider_router.SUCCESS)
+        return answer
+
+    async def astream(self, context: str, question: str,
+                      prompt_template: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        Génère une réponse fragment par fragment.
+
+        Args:
+            context: Contexte documentaire
+            question: Question de l'utilisateur
+            prompt_template: Gabarit avec {context} et {question} (défaut: DEFAULT_PROMPT)
+
+        Yields:
+            Fragments de texte non vides ; rien si le fournisseur n'est pas
+            configuré ou si son disjoncteur est ouvert
+        """
+        if not self.configured() or not self.breaker.allow():
+            return
+        prompt = (prompt_template or DEFAULT_PROMPT).format(context=context, question=question)
+        start = time.perf_counter()
+        # Lecture interrompue (requête couverte perdante, lecteur parti) : ni succès ni échec
+        outcome = provider_router.CANCELLED
+        try:
+            async for chunk in self._stream(prompt):
+                yield chunk
+            outcome = provider_router.SUCCESS
+        except Exception as e:
+            outcome = provider_router.FAILURE
+            self.breaker.record_failure(e)
+            raise
+        finally:
+            if outcome == provider_router.SUCCESS:
+                self.breaker.record_success()
+            elif outcome == provider_router.CANCELLED:
+                self.breaker.release()
+            self._observe(start, outcome)
+
+    async def _stream(self, prompt: str) -> AsyncIterator[str]:
+        """
+        Lit le flux du client ; chaque fragment doit arriver dans le délai du
+        fournisseur. Les nouvelles tentatives n'ont lieu qu'avant le premier fragment.
+        """
+        attempt = 0
+        while True:
+            stream = self.client.astream(prompt)
+            emitted = False
+            try:
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(stream.__anext__(), timeout=self.timeout)
+                    except StopAsyncIteration:
+                        return
+                    text = getattr(chunk, "content", chunk)
+                    if text:
+                        emitted = True
+                        yield text
+            except Exception as e:
+                if emitted or attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                delay = config.LLM_RETRY_BACKOFF_SECONDS * (2 ** attempt)
+                attempt += 1
+                logger.info(f"🔁 {self.label}: nouvelle tentative {attempt}/{self.max_retries} "
+                            f"dans {delay:.1f}s ({type(e).__name__})")
+                await asyncio.sleep(delay)
+            finally:
+                await stream.aclose()
+
+    def _observe(self, start: float, outcome: str) -> None:
+        """Transmet la durée et le résultat de l'appel au routeur."""
+        get_router().record(self.name, self.model, time.perf_counter() - start, outcome)
+
+    async def _invoke(self, prompt: str) -> str:
+        """Appelle le client, avec nouvelles tentatives sur erreur transitoire."""
+        attempt = 0
+        while True:
+            try:
+                response = await asyncio.wait_for(self.client.ainvoke(prompt), timeout=self.timeout)
+                # Modèles de chat : AIMessage ; LLM texte (Ollama) : str
+                return getattr(response, "content", response)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                delay = config.LLM_RETRY_BACKOFF_SECONDS * (2 ** attempt)
+                attempt += 1
+                logger.info(f"🔁 {self.label}: nouvelle tentative {attempt}/{self.max_retries} "
+                            f"dans {delay:.1f}s ({type(e).__name__})")
+                await asyncio.sleep(delay)
+
+
+_providers: Dict[str, LLMProvider] = {}
+_providers_lock = threading.Lock()
+
+
+def get_provider(name: str) -> Optional[LLMProvider]:
+    """
+    Retourne le fournisseur partagé du processus.
+
+    Args:
+        name: Nom du fournisseur (clé de config.LLM_PROVIDERS)
+
+    Returns:
+        Fournisseur, ou None s'il n'est pas déclaré
+    """
+    with _providers_lock:
+        if name not in _providers:
+            settings = config.LLM_PROVIDERS.get(name)
+            if settings is None:
+                return None
+            _providers[name] = LLMProvider(name, settings)
+        return _providers[name]
+
+
+def _routed_providers(names: Optional[List[str]]) -> List[LLMProvider]:
+    """Fournisseurs utilisables (clé présente, disjoncteur fermé), dans l'ordre de routage."""
+    providers = []
+    for name in (config.LLM_PROVIDER_ORDER if names is None else names):
+        provider = get_provider(name)
+        if provider is None or not provider.configured():
+            continue
+        if not provider.breaker.available():
+            logger.info(f"⏭️  {provider.label} ignoré (disjoncteur ouvert)")
+            continue
+        providers.append(provider)
+    if names is None and config.LLM_ROUTING == "latency":
+        providers = get_router().order(providers)
+    return providers
+
+
+def provider_calls(names: Optional[List[str]] = None,
+                   prompt_template: Optional[str] = None) -> List[Tuple[str, ProviderCall]]:
+    """
+    Fournisseurs configurés, prêts pour le répartiteur.
+
+    Args:
+        names: Fournisseurs dans l'ordre voulu (défaut: tous, ordonnés par le routeur)
+        prompt_template: Gabarit du prompt (défaut: DEFAULT_PROMPT)
+
+    Returns:
+        Liste de (nom, appel) ; les fournisseurs sans clé API ou dont le
+        disjoncteur est ouvert sont ignorés
+    """
+    return [
+        (provider.name, functools.partial(provider.agenerate, prompt_template=prompt_template))
+        for provider in _routed_providers(names)
+    ]
+
+
+def generate(context: str, question: str, prompt_template: Optional[str] = None,
+             names: Optional[List[str]] = None) -> Optional[Tuple[str, str]]:
+    """
+    Génère une réponse avec le premier fournisseur qui répond.
+
+    Args:
+        context: Contexte documentaire
+        question: Question de l'utilisateur
+        prompt_template: Gabarit avec {context} et {question} (défaut: DEFAULT_PROMPT)
+        names: Fournisseurs dans l'ordre voulu (défaut: tous, ordonnés par le routeur)
+
+    Returns:
+        Tuple (fournisseur, réponse), ou None (aucun fournisseur disponible
+        ou délai global dépassé) : l'appelant passe en recherche documentaire
+    """
+    calls = provider_calls(names, prompt_template)
+    if not calls:
+        logger.info("Aucun fournisseur LLM configuré")
+        return None
+    return generate_hedged(calls, context, question)
+
+
+class AnswerStream:
+    """
+    Réponse en cours de génération.
+
+    Itérer sur l'objet produit les fragments au fil de l'eau (utilisable
+    directement avec `st.write_stream`). Une interruption en cours de
+    réponse est journalisée et termine l'itération : `complete` reste False
+    et la réponse partielle ne doit pas être mise en cache.
+    """
+
+    def __init__(self, provider: str, chunks: Iterator[str]):
+        self.provider = provider
+        self._chunks = chunks
+        self.parts: List[str] = []
+        self.complete = False
+        self.error: Optional[BaseException] = None
+
+    def __iter__(self) -> Iterator[str]:
+        try:
+            for chunk in self._chunks:
+                self.parts.append(chunk)
+                yield chunk
+            self.complete = True
+        except Exception as e:
+            self.error = e
+            logger.warning(f"⚠️  Réponse de {self.provider} interrompue: {e}")
+
+    @property
+    def text(self) -> str:
+        """Texte reçu jusqu'ici."""
+        return "".join(self.parts)
+
+
+def generate_stream(context: str, question: str, prompt_template: Optional[str] = None,
+                    names: Optional[List[str]] = None) -> Optional[AnswerStream]:
+    """
+    Génère une réponse en streaming avec le premier fournisseur qui commence à répondre.
+
+    Args:
+        context: Contexte documentaire
+        question: Question de l'utilisateur
+        prompt_template: Gabarit avec {context} et {question} (défaut: DEFAULT_PROMPT)
+        names: Fournisseurs dans l'ordre voulu (défaut: tous, ordonnés par le routeur)
+
+    Returns:
+        Réponse à itérer, ou None (aucun fournisseur disponible ou délai
+        global dépassé avant le premier fragment)
+    """
+    calls: List[Tuple[str, StreamCall]] = [
+        (provider.name, functools.partial(provider.astream, prompt_template=prompt_template))
+        for provider in _routed_providers(names)
+    ]
+    if not calls:
+        logger.info("Aucun fournisseur LLM configuré")
+        return None
+    result = stream_hedged(calls, context, question)
+    if result is None:
+        return None
+    provider, chunks = result
+    return AnswerStream(provider, chunks)
+
+
+def provider_label(name: str) -> str:
+    """Nom d'affichage d'un fournisseur."""
+    provider = get_provider(name)
+    return provider.label if provider else name
+
+
+def health() -> List[Dict[str, Any]]:
+    """
+    État des fournisseurs, dans l'ordre de routage.
+
+    Returns:
+        Un dictionnaire par fournisseur : name, label, configured, l'état
+        du disjoncteur (voir CircuitBreaker.snapshot) et les statistiques
+        du routeur (latency, error_rate, samples ; None si jamais observé)
+    """
+    router = get_router()
+    providers = [get_provider(name) for name in config.LLM_PROVIDER_ORDER]
+    providers = [provider for provider in providers if provider is not None]
+    if config.LLM_ROUTING == "latency":
+        providers = router.order(providers)
+    report = []
+    for provider in providers:
+        observed = router.snapshot(provider.name, provider.model) or {}
+        report.append({
+            "name": provider.name,
+            "label": provider.label,
+            "configured": provider.configured(),
+            **provider.breaker.snapshot(),
+            "latency": observed.get("latency"),
+            "error_rate": observed.get("error_rate"),
+            "samples": observed.get("samples", 0),
+        })
+    return report
@@ -0,0 +1,226 @@
+"""
+Maximum Marginal Relevance (MMR) vectorisé.
+
+Le MMR de LangChain recalcule, à chaque document choisi, les similarités
+entre candidats dans des boucles Python : le coût explose quand le pool
+de candidats (`fetch_k`) grandit. Ici :
+
+- la matrice des similarités entre candidats est calculée en un seul
+  produit matriciel, puis gardée dans un cache LRU indexé par l'ensemble de
+  candidats (les questions fréquentes retombent sur les mêmes candidats) ;
+- la sélection gloutonne met à jour la similarité maximale de chaque
+  candidat aux documents choisis avec un `np.maximum` sur une ligne de la
+  matrice, les documents choisis étant masqués.
+
+Un pool de 200 candidats ou plus reste donc peu coûteux : la diversité se
+règle (config.RETRIEVER_FETCH_K, config.RETRIEVER_LAMBDA_MULT) sans pénalité
+de latence.
+
+Benchmark : python chatbot/mmr.py [--dim 768] [--k 5]
+"""
+import sys
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Hashable, List, Sequence, Tuple
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+# Ajouter le chemin pour les imports
+sys.path.append(str(Path(__file__).parents[1]))
+
+from utils.logger import setup_logger
+import config
+
+logger = setup_logger("mmr")
+
+
+def _unit_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def mmr_select(relevance: np.ndarray, similarity: np.ndarray, k: int, lambda_mult: float) -> List[int]:
+    """
+    Sélection MMR gloutonne.
+
+    Args:
+        relevance: Similarité de chaque candidat avec la question
+        similarity: Matrice des similarités entre candidats
+        k: Nombre de documents à choisir
+        lambda_mult: 1 = pertinence seule, 0 = diversité seule
+
+    Returns:
+        Positions des candidats choisis, dans l'ordre de sélection
+    """
+    k = min(k, len(relevance))
+    if k <= 0:
+        return []
+    first = int(np.argmax(relevance))
+    selected = [first]
+    max_similarity = similarity[first].copy()
+    weighted_relevance = lambda_mult * relevance
+    chosen = np.zeros(len(relevance), dtype=bool)
+    chosen[first] = True
+    while len(selected) < k:
+        scores = weighted_relevance - (1 - lambda_mult) * max_similarity
+        scores[chosen] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        chosen[best] = True
+        np.maximum(max_similarity, similarity[best], out=max_similarity)
+    return selected
+
+
+class MMRReranker:
+    """MMR avec cache LRU des matrices de similarité entre candidats."""
+
+    def __init__(self, cache_size: int = None):
+        self.cache_size = config.MMR_SIMILARITY_CACHE_SIZE if cache_size is None else cache_size
+        self._cache: "OrderedDict[Hashable, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def similarity(self, key: Hashable, vectors: np.ndarray) -> np.ndarray:
+        """
+        Matrice des similarités entre candidats, calculée une fois par ensemble de candidats.
+
+        Args:
+            key: Identifiants des candidats, dans l'ordre des lignes de `vectors`
+            vectors: Vecteurs normalisés des candidats
+
+        Returns:
+            Matrice (n x n) float32
+        """
+        with self._lock:
+            matrix = self._cache.get(key)
+            if matrix is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return matrix
+            self.misses += 1
+        matrix = vectors @ vectors.T
+        if self.cache_size:
+            with self._lock:
+                self._cache[key] = matrix
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return matrix
+
+    def select(
+        self,
+        query_vector: Sequence[float],
+        ids: Sequence[Hashable],
+        vectors,
+        k: int,
+        lambda_mult: float
+    ) -> List[int]:
+        """
+        Choisit `k` candidats pertinents et variés.
+
+        Args:
+            query_vector: Embedding de la question
+            ids: Identifiants des candidats (clé du cache)
+            vectors: Embeddings des candidats (même ordre que `ids`)
+            k: Nombre de documents à choisir
+            lambda_mult: 1 = pertinence seule, 0 = diversité seule
+
+        Returns:
+            Positions des candidats choisis, dans l'ordre de sélection
+        """
+        if not len(ids):
+            return []
+        vectors = _unit_rows(np.asarray(vectors, dtype=np.float32))
+        relevance = vectors @ _unit_rows(np.asarray(query_vector, dtype=np.float32))
+        return mmr_select(relevance, self.similarity(tuple(ids), vectors), k, lambda_mult)
+
+    def stats(self) -> Dict[str, int]:
+        """Taille du cache, succès et échecs."""
+        with self._lock:
+            return {"entries": len(self._cache), "hits": self.hits, "misses": self.misses}
+
+
+def _chroma_candidates(store, query_vector: Sequence[float], fetch_k: int
+                       ) -> Tuple[List[str], np.ndarray, List[Document]]:
+    """Les `fetch_k` plus proches voisins d'une base Chroma, avec leurs vecteurs."""
+    result = store._collection.query(
+        query_embeddings=[list(map(float, query_vector))],
+        n_results=fetch_k,
+        include=["embeddings", "documents", "metadatas"]
+    )
+    docs = [Document(page_content=text, metadata=metadata or {})
+            for text, metadata in zip(result["documents"][0], result["metadatas"][0])]
+    return result["ids"][0], np.asarray(result["embeddings"][0], dtype=np.float32), docs
+
+
+class MMRRetriever(BaseRetriever):
+    """
+    Retriever MMR vectorisé sur une base Chroma ou une `NumpyVectorStore`.
+
+    La similarité cosinus de chaque document avec la question est ajoutée à
+    ses métadonnées (`dense_score`), comme pour la recherche hybride.
+    """
+
+    store: Any
+    reranker: Any
+    k: int = 4
+    fetch_k: int = 20
+    lambda_mult: float = 0.5
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        query_vector = self.store.embeddings.embed_query(query)
+        if not hasattr(self.store, "_collection"):
+            # NumpyVectorStore : même MMR, avec son propre cache
+            return self.store.max_marginal_relevance_search_by_vector(
+                query_vector, self.k, self.fetch_k, self.lambda_mult
+            )
+        ids, vectors, docs = _chroma_candidates(self.store, query_vector, self.fetch_k)
+        selected = self.reranker.select(query_vector, ids, vectors, self.k, self.lambda_mult)
+        if not selected:
+            return []
+        relevance = _unit_rows(vectors[selected]) @ _unit_rows(np.asarray(query_vector, dtype=np.float32))
+        return [
+            Document(page_content=docs[i].page_content, metadata={**docs[i].metadata, 'dense_score': float(score)})
+            for i, score in zip(selected, relevance)
+        ]
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    from langchain_core.vectorstores.utils import maximal_marginal_relevance
+
+    parser = argparse.ArgumentParser(description="Benchmark du MMR vectorisé")
+    parser.add_argument("--dim", type=int, default=768, help="Dimension des embeddings")
+    parser.add_argument("--k", type=int, default=config.RETRIEVER_K, help="Documents choisis")
+    parser.add_argument("--repeats", type=int, default=20, help="Questions par taille de pool")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"k={args.k}, dimension {args.dim}, lambda_mult={config.RETRIEVER_LAMBDA_MULT}")
+    print(f"  {'fetch_k':>7}  {'LangChain':>10}  {'vectorisé':>10}  {'en cache':>10}")
+    for fetch_k in (20, 50, 100, 200, 400, 800):
+        vectors = rng.standard_normal((fetch_k, args.dim)).astype(np.float32)
+        queries = rng.standard_normal((args.repeats, args.dim)).astype(np.float32)
+        ids = list(range(fetch_k))
+        timings = []
+        reranker = MMRReranker(cache_size=0)
+        cached = MMRReranker(cache_size=1)
+        cached.select(queries[0], ids, vectors, args.k, config.RETRIEVER_LAMBDA_MULT)
+        for select in (
+            lambda q: maximal_marginal_relevance(q, vectors, config.RETRIEVER_LAMBDA_MULT, args.k),
+            lambda q: reranker.select(q, ids, vectors, args.k, config.RETRIEVER_LAMBDA_MULT),
+            lambda q: cached.select(q, ids, vectors, args.k, config.RETRIEVER_LAMBDA_MULT),
+        ):
+            start = time.perf_counter()
+            for query in queries:
+                select(query)
+            timings.append((time.perf_counter() - start) / args.repeats * 1000)
+        print(f"  {fetch_k:>7}  " + "  ".join(f"{t:>7.2f} ms" for t in timings))
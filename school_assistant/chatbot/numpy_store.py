@@ -0,0 +1,463 @@
+"""
+Base vectorielle exacte en NumPy, pour les corpus de petite et moyenne taille.
+
+Le corpus des règlements compte quelques milliers de chunks : une recherche
+exhaustive (produit matrice-vecteur sur des embeddings normalisés) répond en
+moins d'une milliseconde, sans SQLite (Chroma) ni index FAISS sérialisé.
+
+Avec config.VECTOR_BACKEND = "numpy", `engine_registry.get_faiss_store` et
+`get_chroma_store` renvoient une `NumpyVectorStore`. Elle est exportée une
+fois depuis la base d'origine, dans un sous-dossier de l'index, puis
+réexportée quand l'index change de version. Avec
+config.EMBEDDING_REDUCTION_DIM, les vecteurs sont réduits à l'export par
+une projection apprise sur le corpus (voir dimension_reduction), appliquée
+aussi aux questions.
+
+Format du dossier :
+    manifest.json        modèle, dimension, type, version de l'index d'origine,
+                         réduction de dimension éventuelle
+    vectors.npy          float32 ou float16 [N, dim], lignes normalisées (mémoire mappée)
+    texts.bin            textes UTF-8 concaténés
+    text_ptr.npy         int64[N+1] position de chaque texte dans texts.bin
+    ids.json             identifiants des chunks dans la base d'origine
+    metadata.json        clés et valeurs distinctes de chaque métadonnée
+    metadata_codes.npy   int32[N, clés] indice de la valeur (-1 = absente)
+    projection.npz       projection vers la dimension réduite (si réduction)
+"""
+import json
+import shutil
+import sys
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+# Ajouter le chemin pour les imports
+sys.path.append(str(Path(__file__).parents[1]))
+
+from utils.logger import setup_logger
+from chatbot.dimension_reduction import ProjectedEmbeddings, Projection, fit_projection
+from chatbot.mmr import MMRReranker
+import config
+
+logger = setup_logger("numpy_store")
+
+FORMAT_VERSION = 1
+STORE_DIRNAME = "numpy_store"
+SCORE_BLOCK_ROWS = 1024  # Lignes float16 converties en float32 à la fois pendant le score
+PROJECTION_FILENAME = "projection.npz"
+
+
+def _unit_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def _top(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices des `k` plus grands scores, triés par score décroissant."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    best = np.argpartition(-scores, k - 1)[:k]
+    return best[np.argsort(-scores[best], kind="stable")]
+
+
+def _encode_metadata(metadatas: Sequence[Dict[str, Any]]) -> Tuple[Dict[str, Any], np.ndarray]:
+    """Table de métadonnées compacte : une colonne de codes par clé, valeurs distinctes à part."""
+    keys = sorted({key for metadata in metadatas for key in (metadata or {})})
+    values: Dict[str, List[Any]] = {key: [] for key in keys}
+    positions: Dict[str, Dict[str, int]] = {key: {} for key in keys}
+    codes = np.full((len(metadatas), len(keys)), -1, dtype=np.int32)
+    for row, metadata in enumerate(metadatas):
+        for column, key in enumerate(keys):
+            if key not in (metadata or {}):
+                continue
+            token = json.dumps(metadata[key], ensure_ascii=False, sort_keys=True, default=str)
+            if token not in positions[key]:
+                positions[key][token] = len(values[key])
+                values[key].append(json.loads(token))
+            codes[row, column] = positions[key][token]
+    return {"keys": keys, "values": values}, codes
+
+
+def save_numpy_store(
+    store_dir: Path,
+    ids: Sequence[str],
+    texts: Sequence[str],
+    metadatas: Sequence[Dict[str, Any]],
+    vectors,
+    model_name: str,
+    source_version: Optional[str] = None,
+    dtype: str = None,
+    reduce_dim: Optional[int] = None,
+    reduction_method: str = "pca"
+) -> Path:
+    """
+    Écrit une base NumPy (remplace une éventuelle base existante).
+
+    Args:
+        store_dir: Dossier de destination
+        ids: Identifiants des chunks
+        texts: Contenus des chunks
+        metadatas: Métadonnées des chunks
+        vectors: Embeddings des chunks (N x dim), normalisés à l'écriture
+        model_name: Modèle d'embeddings
+        source_version: Version de l'index d'origine (détection des exports périmés)
+        dtype: "float32" ou "float16" (défaut: config.NUMPY_STORE_DTYPE)
+        reduce_dim: Dimension réduite (None = vecteurs complets)
+        reduction_method: "pca" ou "truncate" (voir dimension_reduction)
+
+    Returns:
+        Chemin du dossier écrit
+    """
+    store_dir = Path(store_dir)
+    dtype = dtype or config.NUMPY_STORE_DTYPE
+    tmp_dir = store_dir.with_name(store_dir.name + ".tmp")
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir)
+    tmp_dir.mkdir(parents=True)
+
+    matrix = _unit_rows(np.asarray(vectors, dtype=np.float32).reshape(len(texts), -1))
+    reduction = None
+    if reduce_dim and reduce_dim < matrix.shape[1]:
+        projection = fit_projection(matrix, reduce_dim, reduction_method)
+        projection.save(tmp_dir / PROJECTION_FILENAME)
+        reduction = {"method": reduction_method, "dim": projection.dim, "source_dim": projection.source_dim}
+        matrix = projection.transform(matrix)
+    matrix = matrix.astype(dtype)
+    encoded = [text.encode("utf-8") for text in texts]
+    text_ptr = np.zeros(len(encoded) + 1, dtype=np.int64)
+    text_ptr[1:] = np.cumsum([len(e) for e in encoded])
+    table, codes = _encode_metadata(metadatas)
+
+    np.save(tmp_dir / "vectors.npy", matrix)
+    np.save(tmp_dir / "text_ptr.npy", text_ptr)
+    np.save(tmp_dir / "metadata_codes.npy", codes)
+    (tmp_dir / "texts.bin").write_bytes(b"".join(encoded))
+    (tmp_dir / "ids.json").write_text(json.dumps(list(ids), ensure_ascii=False), encoding="utf-8")
+    (tmp_dir / "metadata.json").write_text(json.dumps(table, ensure_ascii=False), encoding="utf-8")
+    manifest = {
+        "format": FORMAT_VERSION,
+        "model": model_name,
+        "count": len(texts),
+        "dim": int(matrix.shape[1]),
+        "dtype": dtype,
+        "source_version": source_version,
+        "reduction": reduction,
+    }
+    (tmp_dir / "manifest.json").write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+
+    if store_dir.exists():
+        shutil.rmtree(store_dir)
+    tmp_dir.rename(store_dir)
+
+    logger.info(f"Base NumPy sauvegardée: {store_dir} ({len(texts)} chunks, "
+                f"dimension {matrix.shape[1]}, {dtype}, {matrix.nbytes / 1e6:.1f} Mo)")
+    return store_dir
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    Base vectorielle LangChain en lecture seule : recherche exacte sur une matrice en mémoire mappée.
+
+    La base est un export de l'index FAISS ou Chroma : elle ne prend pas
+    d'écriture (`add_texts` / `add_documents` lèvent NotImplementedError).
+    Les ajouts se font dans l'index d'origine, réexporté à sa version suivante.
+    """
+
+    def __init__(self, store_dir: Path, embedding: Embeddings):
+        self.store_dir = Path(store_dir)
+        self.manifest = json.loads((self.store_dir / "manifest.json").read_text(encoding="utf-8"))
+        if self.manifest.get("format") != FORMAT_VERSION:
+            raise ValueError(f"Format de base NumPy non supporté: {self.manifest.get('format')}")
+        self._embedding = embedding
+        self.vectors = self._open_vectors()
+        projection_path = self.store_dir / PROJECTION_FILENAME
+        self.projection = Projection.load(projection_path) if projection_path.exists() else None
+        self.text_ptr = np.load(self.store_dir / "text_ptr.npy", mmap_mode="r")
+        self.metadata_codes = np.load(self.store_dir / "metadata_codes.npy", mmap_mode="r")
+        texts_path = self.store_dir / "texts.bin"
+        self._texts = (
+            np.memmap(texts_path, dtype=np.uint8, mode="r")
+            if texts_path.stat().st_size else np.zeros(0, dtype=np.uint8)
+        )
+        table = json.loads((self.store_dir / "metadata.json").read_text(encoding="utf-8"))
+        self._metadata_keys: List[str] = table["keys"]
+        self._metadata_values: Dict[str, List[Any]] = table["values"]
+        self._ids: Optional[List[str]] = None
+        self.reranker = MMRReranker()
+
+    def _open_vectors(self) -> np.ndarray:
+        return np.load(self.store_dir / "vectors.npy", mmap_mode="r")
+
+    @property
+    def embeddings(self) -> Embeddings:
+        """Embeddings des questions, réduits à la dimension de la base si besoin."""
+        if self.projection is not None and self._embedding is not None:
+            return ProjectedEmbeddings(self._embedding, self.projection)
+        return self._embedding
+
+    @property
+    def source_version(self) -> Optional[str]:
+        return self.manifest.get("source_version")
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    def get_ids(self) -> List[str]:
+        """Identifiants des chunks dans la base d'origine (chargés à la demande)."""
+        if self._ids is None:
+            self._ids = json.loads((self.store_dir / "ids.json").read_text(encoding="utf-8"))
+        return self._ids
+
+    def get_metadata(self, doc_id: int) -> Dict[str, Any]:
+        """Métadonnées du chunk `doc_id`, reconstruites depuis la table de codes."""
+        return {
+            key: self._metadata_values[key][code]
+            for key, code in zip(self._metadata_keys, self.metadata_codes[doc_id].tolist())
+            if code >= 0
+        }
+
+    def get_document(self, doc_id: int) -> Document:
+        """Reconstruit le `Document` d'identifiant `doc_id`."""
+        start, end = self.text_ptr[doc_id], self.text_ptr[doc_id + 1]
+        text = bytes(self._texts[start:end]).decode("utf-8")
+        return Document(page_content=text, metadata=self.get_metadata(doc_id))
+
+    def query_vector(self, embedding: Sequence[float]) -> np.ndarray:
+        """
+        Vecteur de question normalisé, dans l'espace de la base.
+
+        Args:
+            embedding: Embedding du modèle, ou déjà réduit (via `embeddings`)
+
+        Returns:
+            Vecteur float32 de la dimension de la base
+        """
+        query = np.asarray(embedding, dtype=np.float32)
+        if self.projection is not None and query.shape[-1] == self.projection.source_dim:
+            return self.projection.transform(query)
+        return _unit_rows(query)
+
+    def scores(self, embedding: Sequence[float]) -> np.ndarray:
+        """
+        Similarité cosinus de chaque chunk avec `embedding`.
+
+        Args:
+            embedding: Vecteur de la question (normalisé, et réduit si besoin, ici)
+
+        Returns:
+            Tableau float32 de taille N
+        """
+        query = self.query_vector(embedding)
+        if self.vectors.dtype == np.float32:
+            return self.vectors @ query
+        # float16 : pas de produit BLAS, conversion par blocs (la matrice reste mappée)
+        scores = np.empty(len(self.vectors), dtype=np.float32)
+        for start in range(0, len(self.vectors), SCORE_BLOCK_ROWS):
+            block = self.vectors[start:start + SCORE_BLOCK_ROWS]
+            scores[start:start + len(block)] = block.astype(np.float32) @ query
+        return scores
+
+    def search_vectors(self, embedding: Sequence[float], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Les `k` chunks les plus proches de `embedding`.
+
+        Returns:
+            Tuple (identifiants, similarités cosinus), par similarité décroissante
+        """
+        scores = self.scores(embedding)
+        best = _top(scores, k)
+        return best, scores[best]
+
+    # --- Interface VectorStore --------------------------------------------
+
+    def similarity_search_with_score_by_vector(
+        self, embedding: Sequence[float], k: int = 4, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        """Chunks les plus proches, avec la distance L2 au carré (2 - 2 cos), comme FAISS."""
+        doc_ids, scores = self.search_vectors(embedding, k)
+        return [(self.get_document(int(i)), float(2.0 - 2.0 * score)) for i, score in zip(doc_ids, scores)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self._embedding.embed_query(query), k)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k)]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return self.similarity_search_by_vector(self._embedding.embed_query(query), k)
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        return lambda distance: 1.0 - distance / 2.0
+
+    def max_marginal_relevance_search_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        **kwargs: Any
+    ) -> List[Document]:
+        query = self.query_vector(embedding)
+        candidates, scores = self.search_vectors(query, max(fetch_k, k))
+        selected = self.reranker.select(query, candidates.tolist(), self.vectors[candidates], k, lambda_mult)
+        docs = []
+        for i in selected:
+            doc = self.get_document(int(candidates[i]))
+            # Similarité cosinus avec la question, comme MMRRetriever sur Chroma
+            doc.metadata['dense_score'] = float(scores[i])
+            docs.append(doc)
+        return docs
+
+    def max_marginal_relevance_search(
+        self,
+        query: str,
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        **kwargs: Any
+    ) -> List[Document]:
+        return self.max_marginal_relevance_search_by_vector(
+            self._embedding.embed_query(query), k, fetch_k, lambda_mult
+        )
+
+    def get(self, include: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """
+        Contenu complet de la base, au format de `Chroma.get`.
+
+        Utilisé par la recherche hybride et la reconstruction de l'index BM25.
+        """
+        include = set(include or ("documents", "metadatas"))
+        result: Dict[str, Any] = {"ids": self.get_ids()}
+        if "documents" in include:
+            result["documents"] = [self.get_document(i).page_content for i in range(len(self))]
+        if "metadatas" in include:
+            result["metadatas"] = [self.get_metadata(i) for i in range(len(self))]
+        if "embeddings" in include:
+            result["embeddings"] = np.asarray(self.vectors, dtype=np.float32)
+        return result
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        store_dir: Path = None,
+        **kwargs: Any
+    ) -> "NumpyVectorStore":
+        """Embedde `texts` et écrit une base NumPy dans `store_dir`."""
+        if store_dir is None:
+            raise ValueError("store_dir est requis pour une base NumPy")
+        metadatas = metadatas or [{} for _ in texts]
+        ids = kwargs.get("ids") or [str(i) for i in range(len(texts))]
+        save_numpy_store(store_dir, ids, texts, metadatas, embedding.embed_documents(list(texts)),
+                         getattr(embedding, "model_name", ""))
+        return cls(store_dir, embedding)
+
+
+def _export_contents(store) -> Tuple[List[str], List[str], List[Dict[str, Any]], np.ndarray]:
+    """Identifiants, textes, métadonnées et vecteurs d'une base FAISS ou Chroma LangChain."""
+    if hasattr(store, "index_to_docstore_id"):
+        ids = [store.index_to_docstore_id[i] for i in range(store.index.ntotal)]
+        docs = [store.docstore.search(doc_id) for doc_id in ids]
+        vectors = store.index.reconstruct_n(0, store.index.ntotal)
+        return ids, [d.page_content for d in docs], [dict(d.metadata) for d in docs], vectors
+    stored = store.get(include=["embeddings", "documents", "metadatas"])
+    return (stored["ids"], stored["documents"], [dict(m or {}) for m in stored["metadatas"]],
+            np.asarray(stored["embeddings"], dtype=np.float32))
+
+
+def _reduction_matches(manifest: Dict[str, Any]) -> bool:
+    """Indique si la réduction de dimension d'une base correspond à la configuration."""
+    reduction = manifest.get("reduction")
+    source_dim = reduction["source_dim"] if reduction else manifest.get("dim")
+    wanted = config.EMBEDDING_REDUCTION_DIM
+    if not wanted or (source_dim and wanted >= source_dim):
+        # Pas de réduction effective (dimension cible absente ou trop grande)
+        return reduction is None
+    return (reduction is not None and reduction["dim"] == wanted
+            and reduction["method"] == config.EMBEDDING_REDUCTION_METHOD)
+
+
+def open_or_export(
+    index_path: Path,
+    embedding: Embeddings,
+    model_name: str,
+    index_version: Optional[str],
+    load_native: Callable[[], Any],
+    name: str = STORE_DIRNAME,
+    store_class: type = NumpyVectorStore
+) -> NumpyVectorStore:
+    """
+    Ouvre la base NumPy d'un index, en l'exportant d'abord si elle est absente ou périmée.
+
+    Args:
+        index_path: Dossier de l'index d'origine (FAISS ou Chroma)
+        embedding: Embeddings utilisés pour les questions
+        model_name: Modèle d'embeddings de l'index
+        index_version: Version courante de l'index d'origine
+        load_native: Chargement de la base d'origine (appelé seulement pour l'export)
+        name: Nom du sous-dossier de la base NumPy
+        store_class: `NumpyVectorStore` ou sous-classe (ex: QuantizedVectorStore)
+
+    Returns:
+        Base NumPy à jour
+    """
+    store_dir = Path(index_path) / name
+    try:
+        manifest = json.loads((store_dir / "manifest.json").read_text(encoding="utf-8"))
+        if (manifest.get("format") == FORMAT_VERSION and manifest.get("source_version") == index_version
+                and manifest.get("model") == model_name and _reduction_matches(manifest)):
+            return store_class(store_dir, embedding)
+        logger.info(f"Base NumPy périmée ({store_dir}), nouvel export")
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning(f"Base NumPy illisible ({store_dir}), nouvel export: {e}")
+
+    ids, texts, metadatas, vectors = _export_contents(load_native())
+    save_numpy_store(store_dir, ids, texts, metadatas, vectors, model_name, source_version=index_version,
+                     reduce_dim=config.EMBEDDING_REDUCTION_DIM,
+                     reduction_method=config.EMBEDDING_REDUCTION_METHOD)
+    return store_class(store_dir, embedding)
+
+
+if __name__ == "__main__":
+    import argparse
+    import tempfile
+    import time
+
+    parser = argparse.ArgumentParser(description="Latence de la recherche exacte NumPy")
+    parser.add_argument("--docs", type=int, default=5000, help="Chunks du corpus synthétique")
+    parser.add_argument("--dim", type=int, default=768, help="Dimension des embeddings")
+    parser.add_argument("--queries", type=int, default=500, help="Nombre de questions")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((args.docs, args.dim)).astype(np.float32)
+    queries = rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        print(f"{args.docs} chunks, dimension {args.dim}, k={config.RETRIEVER_K}")
+        for dtype in ("float32", "float16"):
+            store_dir = save_numpy_store(
+                Path(tmp_dir) / dtype, [str(i) for i in range(args.docs)], ["texte"] * args.docs,
+                [{"source": f"doc{i // 100}.pdf", "page": i % 100} for i in range(args.docs)],
+                vectors, "synthétique", dtype=dtype
+            )
+            store = NumpyVectorStore(store_dir, embedding=None)
+            for label, search in (
+                ("top-k", lambda q: store.similarity_search_by_vector(q, config.RETRIEVER_K)),
+                ("MMR", lambda q: store.max_marginal_relevance_search_by_vector(
+                    q, config.RETRIEVER_K, config.RETRIEVER_FETCH_K, 0.7)),
+            ):
+                start = time.perf_counter()
+                for query in queries:
+                    search(query)
+                elapsed = (time.perf_counter() - start) / len(queries) * 1000
+                print(f"  {dtype:<8} {label:<6} {elapsed:.3f} ms/question "
+                      f"({(store_dir / 'vectors.npy').stat().st_size / 1e6:.1f} Mo sur disque)")
@@ -0,0 +1,242 @@
+"""
+Répartiteur des fournisseurs LLM avec requêtes couvertes (hedging).
+
+Le fournisseur préféré est interrogé en premier. S'il n'a pas répondu dans
+le budget de latence (config.LLM_HEDGE_DELAY_SECONDS), ou dès qu'il échoue,
+le suivant est lancé en parallèle sans annuler le premier. La première
+réponse valide est retenue et les autres requêtes sont annulées. Au-delà du
+délai global (config.LLM_DEADLINE_SECONDS), aucune réponse n'est renvoyée
+et l'appelant passe en mode recherche documentaire.
+
+En streaming, la course porte sur le premier fragment : le premier
+fournisseur qui commence à répondre est retenu et la suite de sa réponse
+est lue au fil de l'eau (`stream_hedged`).
+"""
+import asyncio
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Ajouter le chemin pour les imports
+sys.path.append(str(Path(__file__).parents[1]))
+
+from utils.logger import setup_logger
+import config
+
+logger = setup_logger("provider_dispatch")
+
+# Appel d'un fournisseur : (contexte, question) -> réponse, ou None si indisponible
+ProviderCall = Callable[[str, str], Awaitable[Optional[str]]]
+# Fournisseur en streaming : (contexte, question) -> fragments de la réponse
+StreamCall = Callable[[str, str], AsyncIterator[str]]
+
+# Pool dédié aux fournisseurs synchrones : une requête abandonnée n'occupe
+# pas le pool par défaut de la boucle.
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="llm")
+
+# Boucle asyncio permanente : les clients asynchrones des fournisseurs y
+# gardent leurs connexions HTTP ouvertes d'une question à l'autre
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    """Retourne la boucle asyncio du processus, démarrée dans un thread dédié."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="llm-loop", daemon=True).start()
+        return _loop
+
+
+def from_sync(func: Callable[[str, str], Optional[str]]) -> ProviderCall:
+    """
+    Adapte un fournisseur synchrone au répartiteur.
+
+    Args:
+        func: Fonction (contexte, question) -> réponse ou None
+
+    Returns:
+        Coroutine équivalente, exécutée dans un thread
+    """
+    async def call(context: str, question: str) -> Optional[str]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, func, context, question)
+    return call
+
+
+async def dispatch(
+    providers: Sequence[Tuple[str, ProviderCall]],
+    context: str,
+    question: str,
+    hedge_delay: float = None,
+    deadline: float = None,
+    release: Optional[Callable[[object], Awaitable[None]]] = None
+) -> Optional[Tuple[str, str]]:
+    """
+    Interroge les fournisseurs par ordre de préférence, avec couverture.
+
+    Args:
+        providers: Fournisseurs (nom, appel) par ordre de préférence
+        context: Contexte documentaire
+        question: Question de l'utilisateur
+        hedge_delay: Attente avant de lancer le fournisseur suivant
+            (défaut: config.LLM_HEDGE_DELAY_SECONDS)
+        deadline: Délai global en secondes (défaut: config.LLM_DEADLINE_SECONDS)
+        release: Libération d'une réponse non retenue (ex: fermeture d'un flux
+            arrivé en même temps que celui du gagnant)
+
+    Returns:
+        Tuple (fournisseur, réponse), ou None si aucune réponse dans le délai
+    """
+    hedge_delay = config.LLM_HEDGE_DELAY_SECONDS if hedge_delay is None else hedge_delay
+    deadline = config.LLM_DEADLINE_SECONDS if deadline is None else deadline
+    loop = asyncio.get_running_loop()
+    end = loop.time() + deadline
+    waiting: List[Tuple[str, ProviderCall]] = list(providers)
+    running: Dict[asyncio.Future, Tuple[str, float]] = {}
+
+    def launch() -> None:
+        name, call = waiting.pop(0)
+        running[asyncio.ensure_future(call(context, question))] = (name, time.perf_counter())
+        logger.info(f"🚀 Requête envoyée à {name}")
+
+    try:
+        while waiting or running:
+            if not running:
+                launch()
+            remaining = end - loop.time()
+            if remaining <= 0:
+                break
+            timeout = min(hedge_delay, remaining) if waiting else remaining
+            done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+            if not done:
+                if waiting:
+                    logger.info(f"⏳ Pas de réponse après {hedge_delay:.1f}s, requête couverte")
+                    launch()
+                continue
+
+            for task in done:
+                name, started = running.pop(task)
+                elapsed = time.perf_counter() - started
+                try:
+                    answer = task.result()
+                except Exception as e:
+                    logger.warning(f"⚠️  {name} en échec après {elapsed:.2f}s: {e}")
+                    continue
+                if answer:
+                    logger.info(f"✅ Réponse de {name} en {elapsed:.2f}s")
+                    return name, answer
+                logger.info(f"ℹ️  {name} indisponible ({elapsed:.2f}s)")
+            # Un échec n'attend pas le budget de latence
+            if waiting:
+                launch()
+
+        if running:
+            logger.warning(f"⏱️  Aucune réponse LLM dans le délai de {deadline:.1f}s")
+        else:
+            logger.warning("Aucun fournisseur LLM n'a répondu")
+        return None
+    finally:
+        # Les tâches terminées dans le même lot que le gagnant sont encore dans
+        # `running` : leurs réponses sont libérées, les autres tâches annulées
+        for task, (name, _) in running.items():
+            if not task.done():
+                task.cancel()
+            elif release is not None and not task.cancelled() and task.exception() is None and task.result():
+                try:
+                    await release(task.result())
+                except Exception as e:
+                    logger.warning(f"⚠️  Libération de la réponse de {name} en échec: {e}")
+
+
+def generate_hedged(
+    providers: Sequence[Tuple[str, ProviderCall]],
+    context: str,
+    question: str,
+    hedge_delay: float = None,
+    deadline: float = None,
+    release: Optional[Callable[[object], Awaitable[None]]] = None
+) -> Optional[Tuple[str, str]]:
+    """
+    Version synchrone de `dispatch` (CLI, Streamlit), exécutée dans la boucle
+    permanente du processus.
+
+    Returns:
+        Tuple (fournisseur, réponse), ou None si aucune réponse dans le délai
+    """
+    coroutine = dispatch(providers, context, question, hedge_delay, deadline, release)
+    return asyncio.run_coroutine_threadsafe(coroutine, _background_loop()).result()
+
+
+def opening(stream_call: StreamCall) -> ProviderCall:
+    """
+    Adapte un fournisseur en streaming au répartiteur.
+
+    L'appel se termine au premier fragment : la couverture et le délai
+    global portent donc sur le temps avant le début de la réponse.
+
+    Args:
+        stream_call: Fonction (contexte, question) -> générateur asynchrone de fragments
+
+    Returns:
+        Appel renvoyant (premier fragment, générateur), ou None si le
+        fournisseur n'a rien produit
+    """
+    async def call(context: str, question: str):
+        stream = stream_call(context, question)
+        try:
+            first = await stream.__anext__()
+        except StopAsyncIteration:
+            return None
+        return first, stream
+    return call
+
+
+async def _close_stream(opened) -> None:
+    """Ferme le flux d'un fournisseur ouvert par `opening` mais non retenu."""
+    _, stream = opened
+    await stream.aclose()
+
+
+def stream_hedged(
+    providers: Sequence[Tuple[str, StreamCall]],
+    context: str,
+    question: str,
+    hedge_delay: float = None,
+    deadline: float = None
+) -> Optional[Tuple[str, Iterator[str]]]:
+    """
+    Version streaming de `generate_hedged` : course au premier fragment.
+
+    Returns:
+        Tuple (fournisseur, itérateur synchrone des fragments), ou None si
+        aucun fournisseur n'a commencé à répondre dans le délai
+    """
+    result = generate_hedged(
+        [(name, opening(call)) for name, call in providers], context, question, hedge_delay, deadline,
+        release=_close_stream
+    )
+    if result is None:
+        return None
+    name, (first, stream) = result
+    loop = _background_loop()
+
+    def chunks() -> Iterator[str]:
+        try:
+            yield first
+            while True:
+                try:
+                    yield asyncio.run_coroutine_threadsafe(stream.__anext__(), loop).result()
+                except StopAsyncIteration:
+                    return
+        finally:
+            # Lecture abandonnée ou terminée : libère la connexion du fournisseur
+            asyncio.run_coroutine_threadsafe(stream.aclose(), loop).result()
+
+    return name, chunks()
@@ -0,0 +1,196 @@
+"""
+Routage des fournisseurs LLM selon les temps de réponse observés.
+
+Pour chaque couple (fournisseur, modèle), le routeur tient une moyenne
+mobile exponentielle (EWMA) de la latence des réponses et du taux d'erreur.
+Le temps attendu pour obtenir une bonne réponse est estimé par
+
+    latence / (1 - taux d'erreur)
+
+puis multiplié par config.LLM_ROUTER_FREE_FACTOR pour les fournisseurs
+gratuits ou locaux (préférence réglable). Les fournisseurs sont interrogés
+par coût croissant ; un fournisseur jamais observé reçoit la latence a
+priori config.LLM_ROUTER_PRIOR_LATENCY_SECONDS, ce qui le fait essayer.
+
+Une requête couverte annulée (un autre fournisseur a répondu avant) est une
+observation censurée : la latence réelle est au moins le temps écoulé, la
+moyenne ne peut donc qu'augmenter. Le taux d'erreur s'atténue avec le temps
+(demi-vie configurable) pour qu'un fournisseur rétabli soit de nouveau
+préféré. Les statistiques sont enregistrées dans un fichier JSON et
+survivent aux redémarrages ; l'écriture est regroupée (toutes les
+config.LLM_ROUTER_FLUSH_EVERY observations ou LLM_ROUTER_FLUSH_INTERVAL_SECONDS
+secondes, et à l'arrêt du processus) pour ne pas ajouter d'E/S à chaque appel.
+"""
+import atexit
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+# Ajouter le chemin pour les imports
+sys.path.append(str(Path(__file__).parents[1]))
+
+from utils.logger import setup_logger
+import config
+
+logger = setup_logger("provider_router")
+
+SUCCESS = "success"
+FAILURE = "failure"
+CANCELLED = "cancelled"
+
+
+class ProviderRouter:
+    """Statistiques EWMA par fournisseur et modèle, et ordre de routage."""
+
+    def __init__(self, stats_path: Path = None, alpha: float = None, clock=time.time,
+                 flush_every: int = None, flush_interval: float = None):
+        self.stats_path = Path(stats_path or config.LLM_ROUTER_STATS_PATH)
+        self.alpha = config.LLM_ROUTER_ALPHA if alpha is None else alpha
+        self.flush_every = config.LLM_ROUTER_FLUSH_EVERY if flush_every is None else flush_every
+        self.flush_interval = config.LLM_ROUTER_FLUSH_INTERVAL_SECONDS if flush_interval is None else flush_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = self._load()
+        self._pending = 0  # Observations pas encore écrites sur disque
+        self._last_flush = clock()
+
+    def _load(self) -> Dict[str, Dict[str, float]]:
+        try:
+            return json.loads(self.stats_path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️  Statistiques de routage illisibles, réinitialisées: {e}")
+            return {}
+
+    def _save(self) -> None:
+        self.stats_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.stats_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(self._stats, indent=2), encoding="utf-8")
+        tmp_path.replace(self.stats_path)
+
+    def record(self, name: str, model: str, latency: float, outcome: str) -> None:
+        """
+        Enregistre le résultat d'un appel.
+
+        Args:
+            name: Nom du fournisseur
+            model: Modèle interrogé
+            latency: Durée de l'appel en secondes (nouvelles tentatives incluses)
+            outcome: SUCCESS, FAILURE ou CANCELLED (requête couverte annulée)
+        """
+        key = f"{name}:{model}"
+        with self._lock:
+            entry = self._stats.setdefault(key, {
+                "latency": latency, "error_rate": 0.0, "samples": 0, "updated_at": self._clock()
+            })
+            entry["error_rate"] = self._decayed_error(entry)
+            if outcome == SUCCESS:
+                entry["latency"] += self.alpha * (latency - entry["latency"])
+                entry["error_rate"] -= self.alpha * entry["error_rate"]
+            elif outcome == FAILURE:
+                entry["error_rate"] += self.alpha * (1.0 - entry["error_rate"])
+            else:
+                # Observation censurée : la latence réelle est au moins `latency`
+                entry["latency"] += self.alpha * max(0.0, latency - entry["latency"])
+            entry["samples"] += 1
+            entry["updated_at"] = self._clock()
+            self._pending += 1
+            if self._pending >= self.flush_every or self._clock() - self._last_flush >= self.flush_interval:
+                self._flush_locked()
+
+    def flush(self) -> None:
+        """Écrit les observations en attente sur disque (appelé aussi à l'arrêt du processus)."""
+        with self._lock:
+            if self._pending:
+                self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        try:
+            self._save()
+        except OSError as e:
+            logger.warning(f"⚠️  Impossible d'enregistrer les statistiques de routage: {e}")
+            return
+        self._pending = 0
+        self._last_flush = self._clock()
+
+    def _decayed_error(self, entry: Dict[str, float]) -> float:
+        """Taux d'erreur atténué selon l'ancienneté de la dernière observation."""
+        half_life = config.LLM_ROUTER_ERROR_HALF_LIFE_SECONDS
+        if not half_life:
+            return entry["error_rate"]
+        age = max(0.0, self._clock() - entry["updated_at"])
+        return entry["error_rate"] * 0.5 ** (age / half_life)
+
+    def expected_seconds(self, name: str, model: str, preferred: bool = False) -> float:
+        """
+        Temps attendu pour obtenir une bonne réponse de ce fournisseur.
+
+        Args:
+            name: Nom du fournisseur
+            model: Modèle interrogé
+            preferred: Fournisseur gratuit ou local (facteur config.LLM_ROUTER_FREE_FACTOR)
+
+        Returns:
+            Coût de routage en secondes (plus petit = interrogé en premier)
+        """
+        with self._lock:
+            entry = self._stats.get(f"{name}:{model}")
+            if entry is None:
+                latency, error_rate = config.LLM_ROUTER_PRIOR_LATENCY_SECONDS, 0.0
+            else:
+                latency, error_rate = entry["latency"], self._decayed_error(entry)
+        cost = latency / max(1.0 - error_rate, 0.05)
+        return cost * config.LLM_ROUTER_FREE_FACTOR if preferred else cost
+
+    def order(self, providers: Sequence[Any]) -> List[Any]:
+        """
+        Trie des fournisseurs par temps attendu croissant.
+
+        Args:
+            providers: Objets avec `name`, `model` et `settings` (voir LLMProvider),
+                dans l'ordre de préférence par défaut (départage des égalités)
+
+        Returns:
+            Fournisseurs dans l'ordre de routage
+        """
+        return sorted(providers, key=lambda provider: self.expected_seconds(
+            provider.name, provider.model,
+            preferred=bool(provider.settings.get("free") or provider.settings.get("local"))
+        ))
+
+    def snapshot(self, name: str, model: str) -> Optional[Dict[str, float]]:
+        """Latence moyenne, taux d'erreur courant et nombre d'observations, ou None."""
+        with self._lock:
+            entry = self._stats.get(f"{name}:{model}")
+            if entry is None:
+                return None
+            return {
+                "latency": entry["latency"],
+                "error_rate": self._decayed_error(entry),
+                "samples": entry["samples"],
+            }
+
+    def reset(self) -> None:
+        """Oublie toutes les statistiques."""
+        with self._lock:
+            self._stats.clear()
+            self._pending = 0
+            self.stats_path.unlink(missing_ok=True)
+
+
+_shared_router: Optional[ProviderRouter] = None
+_shared_lock = threading.Lock()
+
+
+def get_router() -> ProviderRouter:
+    """Retourne le routeur partagé du processus."""
+    global _shared_router
+    with _shared_lock:
+        if _shared_router is None:
+            _shared_router = ProviderRouter()
+            atexit.register(_shared_router.flush)
+        return _shared_router
@@ -0,0 +1,256 @@
+"""
+Base vectorielle quantifiée (int8 + binaire) avec rescoring en précision complète.
+
+Un embedding mpnet (768 dimensions float32) occupe environ 3 Ko par chunk.
+Pour héberger les règlements de nombreuses écoles sur une petite machine,
+seuls des codes compacts restent en mémoire :
+
+- codes binaires (1 bit par dimension, 96 octets) : signe de chaque
+  dimension par rapport à sa moyenne sur le corpus ;
+- codes int8 (1 octet par dimension) : quantification scalaire symétrique,
+  avec une échelle par dimension.
+
+Une recherche enchaîne trois étapes :
+
+1. distance de Hamming sur toute la base → config.QUANTIZED_BINARY_CANDIDATES candidats ;
+2. produit scalaire int8 sur ces candidats → config.QUANTIZED_RESCORE_CANDIDATES candidats ;
+3. similarité cosinus exacte sur les vecteurs float, lus à la demande dans
+   le fichier `vectors.npy` en mémoire mappée (seules ces lignes sont lues).
+
+La base reprend le format de `NumpyVectorStore` (voir numpy_store) ; les
+codes sont calculés à la première ouverture et enregistrés à côté :
+    codes_int8.npy          int8[N, dim]
+    int8_scales.npy         float32[dim]
+    codes_binary.npy        uint8[N, dim / 8]
+    binary_thresholds.npy   float32[dim]
+
+Activation : config.VECTOR_BACKEND = "quantized".
+Rapport rappel@k / mémoire : python chatbot/quantized_store.py [--store DOSSIER]
+"""
+import sys
+from pathlib import Path
+from typing import Sequence, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# Ajouter le chemin pour les imports
+sys.path.append(str(Path(__file__).parents[1]))
+
+from utils.logger import setup_logger
+from chatbot.numpy_store import NumpyVectorStore, _top
+import config
+
+logger = setup_logger("quantized_store")
+
+QUANTIZE_BLOCK_ROWS = 8192  # Lignes float lues à la fois pendant la quantification
+CODE_FILES = ("codes_int8.npy", "int8_scales.npy", "codes_binary.npy", "binary_thresholds.npy")
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _hamming(codes: np.ndarray, query_bits: np.ndarray) -> np.ndarray:
+    """Distance de Hamming entre chaque ligne de `codes` et `query_bits` (octets packés)."""
+    xor = np.bitwise_xor(codes, query_bits)
+    if hasattr(np, "bitwise_count"):
+        if xor.shape[1] % 8 == 0:
+            xor = xor.view(np.uint64)
+        return np.bitwise_count(xor).sum(axis=1, dtype=np.int32)
+    # NumPy < 2.0 : table de comptage des bits par octet
+    return _POPCOUNT[xor].sum(axis=1, dtype=np.int32)
+
+
+def _save(path: Path, array: np.ndarray) -> None:
+    tmp_path = path.with_name(path.stem + ".tmp.npy")
+    np.save(tmp_path, array)
+    tmp_path.replace(path)
+
+
+def quantize_store(store_dir: Path) -> None:
+    """
+    Calcule les codes int8 et binaires d'une base NumPy, bloc par bloc.
+
+    Args:
+        store_dir: Dossier d'une base écrite par `numpy_store.save_numpy_store`
+    """
+    store_dir = Path(store_dir)
+    vectors = np.load(store_dir / "vectors.npy", mmap_mode="r")
+    count, dim = vectors.shape
+    blocks = range(0, count, QUANTIZE_BLOCK_ROWS)
+
+    absmax = np.zeros(dim, dtype=np.float32)
+    total = np.zeros(dim, dtype=np.float64)
+    for start in blocks:
+        block = np.asarray(vectors[start:start + QUANTIZE_BLOCK_ROWS], dtype=np.float32)
+        np.maximum(absmax, np.abs(block).max(axis=0), out=absmax)
+        total += block.sum(axis=0)
+    scales = np.where(absmax > 0, absmax / 127.0, 1.0).astype(np.float32)
+    thresholds = (total / max(count, 1)).astype(np.float32)
+
+    int8_codes = np.empty((count, dim), dtype=np.int8)
+    binary_codes = np.empty((count, (dim + 7) // 8), dtype=np.uint8)
+    for start in blocks:
+        block = np.asarray(vectors[start:start + QUANTIZE_BLOCK_ROWS], dtype=np.float32)
+        int8_codes[start:start + len(block)] = np.clip(np.rint(block / scales), -127, 127)
+        binary_codes[start:start + len(block)] = np.packbits(block > thresholds, axis=1)
+
+    _save(store_dir / "int8_scales.npy", scales)
+    _save(store_dir / "binary_thresholds.npy", thresholds)
+    _save(store_dir / "codes_binary.npy", binary_codes)
+    _save(store_dir / "codes_int8.npy", int8_codes)
+    logger.info(f"🗜️  Base quantifiée: {store_dir} ({count} chunks, "
+                f"int8 {int8_codes.nbytes / 1e6:.1f} Mo + binaire {binary_codes.nbytes / 1e6:.1f} Mo, "
+                f"float {vectors.nbytes / 1e6:.1f} Mo sur disque)")
+
+
+class QuantizedVectorStore(NumpyVectorStore):
+    """`NumpyVectorStore` interrogée par codes binaires et int8, rescorée en float depuis le disque."""
+
+    def __init__(
+        self,
+        store_dir: Path,
+        embedding: Embeddings,
+        binary_candidates: int = None,
+        rescore_candidates: int = None
+    ):
+        """
+        Args:
+            store_dir: Dossier de la base NumPy
+            embedding: Embeddings utilisés pour les questions
+            binary_candidates: Candidats retenus par Hamming
+                (défaut: config.QUANTIZED_BINARY_CANDIDATES ; 0 = int8 sur toute la base)
+            rescore_candidates: Candidats int8 rescorés en float
+                (défaut: config.QUANTIZED_RESCORE_CANDIDATES ; 0 = scores int8 conservés)
+        """
+        super().__init__(store_dir, embedding)
+        self.binary_candidates = (config.QUANTIZED_BINARY_CANDIDATES
+                                  if binary_candidates is None else binary_candidates)
+        self.rescore_candidates = (config.QUANTIZED_RESCORE_CANDIDATES
+                                   if rescore_candidates is None else rescore_candidates)
+        if not all((self.store_dir / name).exists() for name in CODE_FILES):
+            quantize_store(self.store_dir)
+        self.int8_codes = np.load(self.store_dir / "codes_int8.npy")
+        self.int8_scales = np.load(self.store_dir / "int8_scales.npy")
+        self.binary_codes = np.load(self.store_dir / "codes_binary.npy")
+        self.binary_thresholds = np.load(self.store_dir / "binary_thresholds.npy")
+
+    def _open_vectors(self) -> np.ndarray:
+        # Vecteurs float laissés sur disque : seules les lignes rescorées sont lues
+        return np.load(self.store_dir / "vectors.npy", mmap_mode="r")
+
+    @property
+    def resident_bytes(self) -> int:
+        """Octets gardés en mémoire pour la recherche (codes et paramètres)."""
+        return sum(array.nbytes for array in (self.int8_codes, self.int8_scales,
+                                              self.binary_codes, self.binary_thresholds))
+
+    def search_vectors(self, embedding: Sequence[float], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Les `k` chunks les plus proches : Hamming, puis int8, puis float.
+
+        Returns:
+            Tuple (identifiants, similarités cosinus), par similarité décroissante
+            (estimées en int8 si le rescoring est désactivé)
+        """
+        query = self.query_vector(embedding)
+
+        if self.binary_candidates:
+            query_bits = np.packbits(query > self.binary_thresholds)
+            candidates = _top(-_hamming(self.binary_codes, query_bits), max(self.binary_candidates, k))
+            scores = self.int8_codes[candidates].astype(np.float32) @ (query * self.int8_scales)
+        else:
+            candidates = np.arange(len(self.int8_codes))
+            scores = self.int8_codes.astype(np.float32) @ (query * self.int8_scales)
+
+        if not self.rescore_candidates:
+            best = _top(scores, k)
+            return candidates[best], scores[best]
+
+        # Lignes lues dans l'ordre du fichier
+        shortlist = np.sort(candidates[_top(scores, max(self.rescore_candidates, k))])
+        exact = np.asarray(self.vectors[shortlist], dtype=np.float32) @ query
+        best = _top(exact, k)
+        return shortlist[best], exact[best]
+
+
+def recall_report(store_dir: Path, queries: np.ndarray, ks: Sequence[int] = (5, 10)) -> None:
+    """
+    Rappel@k et mémoire de chaque configuration, par rapport à l'index float exact.
+
+    Args:
+        store_dir: Dossier d'une base NumPy (codes calculés au besoin)
+        queries: Embeddings des questions (Q x dim)
+        ks: Valeurs de k évaluées
+    """
+    import time
+
+    exact = NumpyVectorStore(store_dir, embedding=None)
+    count, dim = exact.vectors.shape
+    k_max = max(ks)
+    truth = {k: [set(exact.search_vectors(query, k)[0].tolist()) for query in queries] for k in ks}
+
+    binary = config.QUANTIZED_BINARY_CANDIDATES
+    rescore = config.QUANTIZED_RESCORE_CANDIDATES
+    setups = [
+        ("float32 exact", None, None),
+        ("binaire seul", k_max, 0),
+        ("int8 seul", 0, 0),
+        (f"binaire {binary} → int8", binary, 0),
+        (f"int8 → float {rescore}", 0, rescore),
+        (f"binaire {binary} → int8 → float {rescore}", binary, rescore),
+    ]
+    float_bytes = dim * 4
+    print(f"{count} chunks, dimension {dim}, {len(queries)} questions")
+    print(f"  {'configuration':<34} " + " ".join(f"{f'rappel@{k}':>10}" for k in ks)
+          + f" {'RAM/chunk':>10} {'ms/question':>12}")
+    for label, binary_candidates, rescore_candidates in setups:
+        if binary_candidates is None:
+            store, memory = exact, float_bytes
+        else:
+            store = QuantizedVectorStore(store_dir, embedding=None, binary_candidates=binary_candidates,
+                                         rescore_candidates=rescore_candidates)
+            memory = store.resident_bytes / count
+        recalls = []
+        for k in ks:
+            found = [set(store.search_vectors(query, k)[0].tolist()) for query in queries]
+            recalls.append(np.mean([len(f & t) / k for f, t in zip(found, truth[k])]))
+        start = time.perf_counter()
+        for query in queries:
+            store.search_vectors(query, k_max)
+        elapsed = (time.perf_counter() - start) / len(queries) * 1000
+        print(f"  {label:<34} " + " ".join(f"{recall:>10.3f}" for recall in recalls)
+              + f" {memory:>8.0f} o {elapsed:>12.3f}")
+    print(f"  (vecteurs float laissés sur disque : {float_bytes} o/chunk, "
+          f"{rescore} lignes lues par question avec rescoring)")
+
+
+if __name__ == "__main__":
+    import argparse
+    import tempfile
+
+    from chatbot.numpy_store import save_numpy_store
+
+    parser = argparse.ArgumentParser(description="Rappel@k et mémoire de la base quantifiée")
+    parser.add_argument("--store", type=Path,
+                        help="Base NumPy existante (ex: data/chroma_db_enhanced/numpy_store_reglements_ecole)")
+    parser.add_argument("--docs", type=int, default=5000, help="Chunks du corpus synthétique")
+    parser.add_argument("--dim", type=int, default=768, help="Dimension des embeddings")
+    parser.add_argument("--queries", type=int, default=200, help="Nombre de questions")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.store:
+        # Questions simulées : chunks existants légèrement bruités
+        vectors = np.load(args.store / "vectors.npy", mmap_mode="r")
+        picked = np.asarray(vectors[rng.choice(len(vectors), args.queries, replace=False)], dtype=np.float32)
+        recall_report(args.store, picked + 0.05 * rng.standard_normal(picked.shape).astype(np.float32))
+    else:
+        # Corpus synthétique regroupé en thèmes, comme des embeddings de phrases
+        centers = rng.standard_normal((args.docs // 50, args.dim)).astype(np.float32)
+
+        def sample(n):
+            return centers[rng.integers(len(centers), size=n)] + rng.standard_normal((n, args.dim)).astype(np.float32)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store_dir = save_numpy_store(Path(tmp_dir) / "store", [str(i) for i in range(args.docs)],
+                                         [""] * args.docs, [{}] * args.docs, sample(args.docs), "synthétique")
+            recall_report(store_dir, sample(args.queries))
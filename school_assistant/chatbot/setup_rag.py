@@ -3,16 +3,21 @@
 Script d'indexation RAG amélioré - Utilise tous les PDFs locaux
 """
 import os
+import sys
 import glob
 import re
 from pathlib import Path
 from langchain_community.document_loaders import TextLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import SentenceTransformerEmbeddings
 from langchain_core.documents import Document
 from datetime import datetime
 
+sys.path.append(str(Path(__file__).parents[1]))
+
+from chatbot import engine_registry
+from chatbot.embedding_cache import CachedEmbeddings
+
 def preprocess_text(text: str) -> str:
     """Nettoie le texte extrait."""
     # Suppression des métadonnées web
@@ -141,7 +146,8 @@ def build_index():
     print(f"\n🧠 Calcul des embeddings avec all-MiniLM-L6-v2...")
     print(f"   ⚠️  Note: Pour le français, considérez 'sentence-camembert-large'")
     
-    embedding_function = SentenceTransformerEmbeddings(model_name="all-MiniLM-L6-v2")
+    # Embeddings servis par le cache disque quand le texte n'a pas changé
+    embedding_function = CachedEmbeddings("all-MiniLM-L6-v2", normalize=False)
     
     # 4. Construction de l'index FAISS
     print(f"\n💾 Construction de l'index FAISS...")
@@ -151,6 +157,9 @@ def build_index():
     db = FAISS.from_documents(chunks, embedding_function)
     db.save_local(str(db_dir))
     
+    # Signaler la nouvelle version aux processus qui utilisent l'index
+    engine_registry.mark_index_updated(db_dir)
+    
     print(f"   ✅ Index sauvegardé dans : {db_dir}")
     
     # 5. Test rapide
@@ -9,21 +9,26 @@ from pathlib import Path
 sys.path.append(str(Path(__file__).parents[1]))
 
 from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from scraper.enhanced_ingest import ingest_all_pdfs
-from chatbot.chunking_strategy import smart_chunk_documents
+from chatbot import engine_registry
+from chatbot.embedding_cache import CachedEmbeddings
+from chatbot.chunking_strategy import resolve_token_budget
+from chatbot.streaming_pipeline import stream_index_chroma
 from utils.logger import setup_logger
 
 logger = setup_logger("setup_rag")
 
 
-def build_enhanced_index():
+def build_enhanced_index(incremental: bool = False):
     """
     Construit un index RAG amélioré avec:
     - Embeddings multilingues de qualité
     - Chunking intelligent selon le type de document
     - Métadonnées enrichies
     - Persistence avec ChromaDB
+    
+    Args:
+        incremental: Si True et que la base existe, n'embedde que les chunks
+            nouveaux ou modifiés et supprime ceux dont la source a disparu
     """
     base_dir = Path(__file__).resolve().parents[1]
     pdf_dir = base_dir.parent / "Réglements"
@@ -33,60 +38,64 @@ def build_enhanced_index():
     logger.info("CONSTRUCTION DE L'INDEX RAG AMÉLIORÉ")
     logger.info("=" * 60)
     
-    # 1. Ingestion des PDFs avec métadonnées
-    logger.info("\n📥 Étape 1: Ingestion des PDFs...")
     if not pdf_dir.exists():
         logger.error(f"❌ Dossier PDFs introuvable: {pdf_dir}")
         return
     
-    documents = ingest_all_pdfs(pdf_dir)
-    logger.info(f"✅ {len(documents)} pages extraites")
-    
-    if not documents:
-        logger.error("❌ Aucun document extrait. Arrêt.")
-        return
-    
-    # 2. Chunking intelligent
-    logger.info("\n✂️  Étape 2: Découpage intelligent des documents...")
-    chunks = smart_chunk_documents(documents)
-    logger.info(f"✅ {len(chunks)} chunks créés")
-    
-    # 3. Configuration des embeddings multilingues
-    logger.info("\n🧠 Étape 3: Chargement du modèle d'embeddings multilingue...")
+    # Configuration des embeddings multilingues
+    logger.info("\n🧠 Étape 1: Chargement du modèle d'embeddings multilingue...")
     logger.info("   Modèle: paraphrase-multilingual-mpnet-base-v2")
     logger.info("   (Optimisé pour le français, 768 dimensions)")
     
-    embedding_function = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/paraphrase-multilingual-mpnet-base-v2",
-        model_kwargs={'device': 'cpu'},
-        encode_kwargs={'normalize_embeddings': True}
+    # Embeddings servis par le cache disque quand le texte n'a pas changé
+    embedding_function = CachedEmbeddings(
+        "sentence-transformers/paraphrase-multilingual-mpnet-base-v2"
     )
     
-    logger.info("✅ Modèle chargé")
+    logger.info("✅ Embeddings prêts (cache disque activé)")
     
-    # 4. Création de la base vectorielle ChromaDB
-    logger.info(f"\n💾 Étape 4: Création de la base ChromaDB...")
+    # Ouverture de la base vectorielle ChromaDB
+    logger.info(f"\n💾 Étape 2: Ouverture de la base ChromaDB...")
     logger.info(f"   Destination: {chroma_dir}")
     
-    # Supprimer l'ancienne DB si elle existe
-    if chroma_dir.exists():
+    if not incremental and chroma_dir.exists():
+        # Supprimer l'ancienne DB si elle existe
         import shutil
         shutil.rmtree(chroma_dir)
         logger.info("   🗑️  Ancienne DB supprimée")
     
-    # Créer la nouvelle DB avec les chunks
-    db = Chroma.from_documents(
-        documents=chunks,
-        embedding=embedding_function,
+    db = Chroma(
         persist_directory=str(chroma_dir),
+        embedding_function=embedding_function,
         collection_name="reglements_ecole",
         collection_metadata={"hnsw:space": "cosine"}
     )
     
-    logger.info(f"✅ Base créée avec {len(chunks)} chunks indexés")
+    # Ingestion → découpage → embeddings → ChromaDB, lot par lot
+    # (incrémental : seuls les chunks nouveaux ou modifiés sont embeddés)
+    logger.info("\n📥 Étape 3: Ingestion, découpage et indexation en flux...")
+    stats = stream_index_chroma(
+        pdf_dir, db, embedding_function,
+        incremental=incremental,
+        token_budget=resolve_token_budget(embedding_function.model_name)
+    )
+    
+    if not stats['chunks']:
+        logger.error("❌ Aucun document extrait. Arrêt.")
+        return
+    
+    if stats['changed_sources']:
+        logger.info(f"   Sources modifiées: {', '.join(stats['changed_sources'])}")
+    logger.info(f"✅ Base à jour avec {stats['chunks']} chunks indexés")
     
-    # 5. Validation
-    logger.info("\n🔍 Étape 5: Validation de l'index...")
+    # Signaler la nouvelle version aux processus qui utilisent l'index
+    if stats['added'] or stats['deleted']:
+        engine_registry.mark_index_updated(chroma_dir, changed_sources=stats['changed_sources'])
+    else:
+        logger.info("   Aucun changement détecté, version de l'index conservée")
+    
+    # 4. Validation
+    logger.info("\n🔍 Étape 4: Validation de l'index...")
     test_query = "absence professeur"
     results = db.similarity_search(test_query, k=3)
     
@@ -100,12 +109,22 @@ def build_enhanced_index():
     logger.info("✅ INDEX RAG AMÉLIORÉ CRÉÉ AVEC SUCCÈS!")
     logger.info("=" * 60)
     logger.info(f"\nStatistiques finales:")
-    logger.info(f"  - PDFs traités: {len(list(pdf_dir.glob('*.pdf')))}")
-    logger.info(f"  - Pages extraites: {len(documents)}")
-    logger.info(f"  - Chunks indexés: {len(chunks)}")
-    logger.info(f"  - Taille moyenne chunk: {sum(len(c.page_content) for c in chunks) // len(chunks)} caractères")
+    logger.info(f"  - PDFs traités: {stats['files']}")
+    logger.info(f"  - Pages extraites: {stats['pages']}")
+    logger.info(f"  - Chunks indexés: {stats['chunks']}")
+    logger.info(f"  - Taille moyenne chunk: {stats['total_chars'] // stats['chunks']} caractères")
+    if 'truncated_tokens' in stats:
+        logger.info(f"  - Tokens tronqués par le modèle: {stats['truncated_tokens']} "
+                    f"({stats['truncated_chunks']} chunks)")
     logger.info(f"\n📍 Base de données: {chroma_dir}")
 
 
 if __name__ == "__main__":
-    build_enhanced_index()
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Construction de l'index RAG amélioré")
+    parser.add_argument("--incremental", action="store_true",
+                        help="N'embedder que les chunks nouveaux ou modifiés")
+    args = parser.parse_args()
+    
+    build_enhanced_index(incremental=args.incremental)
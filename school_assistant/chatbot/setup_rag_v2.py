@@ -8,11 +8,14 @@ from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
 
 from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain.retrievers import BM25Retriever, EnsembleRetriever
 
-from scraper.enhanced_ingest import ingest_pdfs_enhanced
-from chatbot.chunking_strategy import chunk_documents_smart, get_chunk_statistics
+from chatbot import engine_registry
+from chatbot.embedding_cache import CachedEmbeddings
+from chatbot.chunking_strategy import resolve_token_budget
+from chatbot.streaming_pipeline import stream_index_chroma
+from chatbot.bm25_index import BM25Index, BM25IndexBuilder, PrebuiltBM25Retriever, load_bm25_index
+from chatbot.hybrid_search import HybridRetriever, HybridSearchEngine, align_vectors
+from chatbot.mmr import MMRReranker, MMRRetriever
 from utils.logger import setup_logger
 import config
 
@@ -23,13 +26,11 @@ class MultilingualEmbeddings:
     """Wrapper pour utiliser HuggingFace embeddings avec LangChain."""
     
     def __init__(self, model_name: str = config.EMBEDDING_MODEL):
-        logger.info(f"Chargement du modèle d'embeddings: {model_name}")
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name=model_name,
-            model_kwargs={'device': 'cpu'},
-            encode_kwargs={'normalize_embeddings': True}
-        )
-        logger.info("Modèle chargé avec succès")
+        # Le modèle est partagé par le registre (chargé une seule fois par
+        # processus, et seulement si un texte n'est pas dans le cache disque ;
+        # les questions déjà posées sont servies par le cache LRU en mémoire)
+        self.model_name = model_name
+        self.embeddings = CachedEmbeddings(model_name)
     
     def embed_documents(self, texts):
         return self.embeddings.embed_documents(texts)
@@ -38,75 +39,96 @@ class MultilingualEmbeddings:
         return self.embeddings.embed_query(text)
 
 
-def build_enhanced_index():
+def build_enhanced_index(incremental: bool = False):
     """
     Construit un index RAG amélioré avec:
     - Ingestion avec métadonnées enrichies
     - Chunking intelligent adapté aux types de documents
     - Embeddings multilingues optimisés pour le français
     - Base de données vectorielle ChromaDB
+    
+    Les étapes s'enchaînent en flux (voir `streaming_pipeline`) : la mémoire
+    utilisée ne dépend pas de la taille du corpus.
+    
+    Args:
+        incremental: Si True et que la base existe, n'embedde que les chunks
+            nouveaux ou modifiés et supprime ceux dont la source a disparu
     """
     logger.info("=" * 60)
     logger.info("DÉBUT DE LA CONSTRUCTION DE L'INDEX RAG AMÉLIORÉ")
     logger.info("=" * 60)
     
-    # Étape 1: Ingestion des PDF
-    logger.info("\n[1/4] Ingestion des PDF...")
-    documents = ingest_pdfs_enhanced(
-        pdf_folder=config.REGLEMENTS_DIR,
-        output_folder=config.DATA_DIR,
-        save_txt=True
-    )
-    
-    if not documents:
-        logger.error("Aucun document n'a été ingéré. Vérifiez le dossier PDF.")
+    if not config.REGLEMENTS_DIR.is_dir():
+        logger.error(f"Dossier PDF introuvable: {config.REGLEMENTS_DIR}")
         return False
     
-    logger.info(f"✅ {len(documents)} documents ingérés")
-    
-    # Étape 2: Chunking intelligent
-    logger.info("\n[2/4] Découpage intelligent des documents...")
-    chunks = chunk_documents_smart(documents, preserve_metadata=True)
-    
-    # Statistiques
-    stats = get_chunk_statistics(chunks)
-    logger.info(f"Statistiques des chunks:")
-    logger.info(f"  - Nombre total: {stats['total_chunks']}")
-    logger.info(f"  - Taille moyenne: {stats['avg_size_chars']:.0f} caractères")
-    logger.info(f"  - Tokens estimés (total): {stats['total_tokens_est']}")
-    logger.info(f"  - Tokens moyens par chunk: {stats['avg_tokens']:.0f}")
-    
-    # Étape 3: Création des embeddings
-    logger.info("\n[3/4] Création des embeddings multilingues...")
     embedding_function = MultilingualEmbeddings()
     
-    # Étape 4: Indexation dans ChromaDB
-    logger.info("\n[4/4] Indexation dans ChromaDB...")
-    
-    # Supprimer l'ancienne base si elle existe
-    if config.DB_DIR.exists():
+    if not incremental and config.DB_DIR.exists():
+        # Supprimer l'ancienne base si elle existe
         import shutil
         shutil.rmtree(config.DB_DIR)
         logger.info("Ancienne base de données supprimée")
     
-    # Créer la nouvelle base
-    db = Chroma.from_documents(
-        documents=chunks,
-        embedding=embedding_function,
+    db = Chroma(
         persist_directory=str(config.DB_DIR),
+        embedding_function=embedding_function,
         collection_metadata={"hnsw:space": "cosine"}
     )
     
-    logger.info(f"✅ Base de données créée dans {config.DB_DIR}")
+    # Ingestion → découpage → embeddings → ChromaDB, lot par lot
+    logger.info("\nIngestion, découpage et indexation en flux...")
+    bm25_builder = BM25IndexBuilder()
+    stats = stream_index_chroma(
+        config.REGLEMENTS_DIR,
+        db,
+        embedding_function,
+        incremental=incremental,
+        bm25_builder=bm25_builder,
+        save_txt_dir=config.DATA_DIR,
+        token_budget=resolve_token_budget(embedding_function.model_name)
+    )
+    
+    if not stats['chunks']:
+        logger.error("Aucun document n'a été ingéré. Vérifiez le dossier PDF.")
+        return False
+    
+    # Statistiques (tokens exacts en mode "tokens", sinon ~4 caractères par token)
+    tokens_est = stats.get('total_tokens', stats['total_chars'] // 4)
+    logger.info(f"Statistiques des chunks:")
+    logger.info(f"  - Nombre total: {stats['chunks']}")
+    logger.info(f"  - Taille moyenne: {stats['total_chars'] / stats['chunks']:.0f} caractères")
+    logger.info(f"  - Tokens estimés (total): {tokens_est}")
+    logger.info(f"  - Tokens moyens par chunk: {tokens_est / stats['chunks']:.0f}")
+    if 'truncated_tokens' in stats:
+        logger.info(f"  - Tokens tronqués par le modèle: {stats['truncated_tokens']} "
+                    f"({stats['truncated_chunks']} chunks)")
+    
+    logger.info(f"✅ Base de données à jour dans {config.DB_DIR}")
+    
+    index_changed = bool(stats['added'] or stats['deleted'])
+    if index_changed or engine_registry.read_index_version(config.DB_DIR) is None:
+        # Signaler la nouvelle version aux processus qui utilisent l'index
+        index_version = engine_registry.mark_index_updated(
+            config.DB_DIR, changed_sources=stats['changed_sources']
+        )
+        
+        # Statistiques BM25 calculées une seule fois, liées à cette version
+        bm25_builder.save(config.BM25_DIR, index_version=index_version)
+    else:
+        logger.info("Aucun changement détecté, version de l'index conservée")
     
     # Sauvegarder des métadonnées sur l'index
     metadata_file = config.DB_DIR / "index_metadata.txt"
     with open(metadata_file, 'w', encoding='utf-8') as f:
         f.write(f"Date de création: {Path(__file__).stat().st_mtime}\n")
-        f.write(f"Nombre de chunks: {stats['total_chunks']}\n")
+        f.write(f"Nombre de chunks: {stats['chunks']}\n")
         f.write(f"Modèle d'embeddings: {config.EMBEDDING_MODEL}\n")
-        f.write(f"Documents sources: {len(documents)}\n")
-        f.write(f"Tokens estimés: {stats['total_tokens_est']}\n")
+        f.write(f"Documents sources: {stats['pages']}\n")
+        f.write(f"Tokens estimés: {tokens_est}\n")
+        f.write(f"Découpage: {config.CHUNKING_MODE}\n")
+        if 'truncated_tokens' in stats:
+            f.write(f"Tokens tronqués: {stats['truncated_tokens']}\n")
     
     logger.info("=" * 60)
     logger.info("✅ INDEXATION TERMINÉE AVEC SUCCÈS")
@@ -125,85 +147,101 @@ def load_retriever(search_type="hybrid"):
     Returns:
         Retriever configuré
     """
-    logger.info(f"Chargement du retriever (mode: {search_type})")
+    if search_type not in ("semantic", "lexical", "hybrid"):
+        raise ValueError(f"Type de search inconnu: {search_type}")
     
-    # Charger les embeddings
-    embedding_function = MultilingualEmbeddings()
+    # Le retriever est construit une seule fois par processus et par mode
+    return engine_registry.get_retriever(
+        config.DB_DIR, config.EMBEDDING_MODEL, search_type,
+        lambda: _build_retriever(search_type)
+    )
+
+
+def _build_retriever(search_type: str):
+    """Construit le retriever pour `search_type` (appelé par le registre)."""
+    logger.info(f"Chargement du retriever (mode: {search_type})")
     
-    # Charger la base vectorielle
-    db = Chroma(
-        persist_directory=str(config.DB_DIR),
-        embedding_function=embedding_function
+    # Charger la base vectorielle partagée
+    db = engine_registry.get_chroma_store(
+        config.DB_DIR,
+        config.EMBEDDING_MODEL,
+        embedding_function=MultilingualEmbeddings()
     )
     
     if search_type == "semantic":
         # Retrieval sémantique pur (FAISS/Chroma)
-        retriever = db.as_retriever(
-            search_type="mmr",  # Maximum Marginal Relevance
-            search_kwargs={
-                "k": config.RETRIEVER_K,
-                "fetch_k": config.RETRIEVER_FETCH_K,
-                "lambda_mult": 0.7  # Balance diversité/pertinence
-            }
+        # Maximum Marginal Relevance vectorisé (voir mmr)
+        retriever = MMRRetriever(
+            store=db,
+            reranker=MMRReranker(),
+            k=config.RETRIEVER_K,
+            fetch_k=config.RETRIEVER_FETCH_K,
+            lambda_mult=config.RETRIEVER_LAMBDA_MULT  # Balance diversité/pertinence
         )
-        logger.info("Retriever sémantique (MMR) chargé")
+        logger.info(f"Retriever sémantique (MMR, {config.RETRIEVER_FETCH_K} candidats) chargé")
         return retriever
     
     elif search_type == "lexical":
-        # Retrieval lexical (BM25)
-        # Récupérer tous les documents pour BM25
-        all_docs = db.get()
-        documents = [
-            {"page_content": text, "metadata": meta}
-            for text, meta in zip(all_docs['documents'], all_docs['metadatas'])
-        ]
-        
-        retriever = BM25Retriever.from_texts(
-            [doc["page_content"] for doc in documents],
-            metadatas=[doc["metadata"] for doc in documents]
-        )
-        retriever.k = config.RETRIEVER_K
+        # Retrieval lexical (BM25 précalculé)
+        retriever = _load_bm25_retriever(db)
         logger.info("Retriever lexical (BM25) chargé")
         return retriever
     
     elif search_type == "hybrid":
-        # Retrieval hybride (combine sémantique + lexical)
-        semantic_retriever = db.as_retriever(
-            search_type="mmr",
-            search_kwargs={
-                "k": config.RETRIEVER_K,
-                "fetch_k": config.RETRIEVER_FETCH_K,
-            }
-        )
-        
-        # BM25
-        all_docs = db.get()
-        documents = [
-            {"page_content": text, "metadata": meta}
-            for text, meta in zip(all_docs['documents'], all_docs['metadatas'])
-        ]
-        
-        bm25_retriever = BM25Retriever.from_texts(
-            [doc["page_content"] for doc in documents],
-            metadatas=[doc["metadata"] for doc in documents]
-        )
-        bm25_retriever.k = config.RETRIEVER_K
-        
-        # Ensemble avec pondération
-        ensemble_retriever = EnsembleRetriever(
-            retrievers=[semantic_retriever, bm25_retriever],
-            weights=[0.7, 0.3]  # 70% sémantique, 30% lexical
+        # Retrieval hybride : scores sémantiques et BM25 sur un ensemble commun
+        # de candidats, fusionnés avec NumPy (voir hybrid_search)
+        index = _load_bm25_index(db)
+        stored = db.get(include=["embeddings"])
+        engine = HybridSearchEngine(
+            index,
+            align_vectors(index.get_metadatas(), stored['ids'], stored['embeddings']),
+            db.embeddings.embed_query
         )
+        retriever = HybridRetriever(engine=engine, k=config.RETRIEVER_K)
         
-        logger.info("Retriever hybride (70% sémantique + 30% lexical) chargé")
-        return ensemble_retriever
+        logger.info(f"Retriever hybride ({config.HYBRID_DENSE_WEIGHT:.0%} sémantique + "
+                    f"{config.HYBRID_LEXICAL_WEIGHT:.0%} lexical, fusion {engine.fusion}) chargé")
+        return retriever
     
     else:
         raise ValueError(f"Type de search inconnu: {search_type}")
 
 
+def _load_bm25_index(db) -> BM25Index:
+    """
+    Ouvre l'index BM25 précalculé associé à la version courante de la base.
+    
+    Si l'index est absent ou périmé (base reconstruite), il est reconstruit
+    une fois depuis la base vectorielle puis sauvegardé pour les appels suivants.
+    """
+    index_version = engine_registry.read_index_version(config.DB_DIR)
+    index = load_bm25_index(config.BM25_DIR, expected_version=index_version)
+    
+    if index is None:
+        logger.warning("Index BM25 absent ou périmé, reconstruction depuis la base vectorielle")
+        all_docs = db.get()
+        builder = BM25IndexBuilder()
+        builder.add(all_docs['documents'], all_docs['metadatas'])
+        builder.save(config.BM25_DIR, index_version=index_version)
+        index = BM25Index(config.BM25_DIR)
+    
+    return index
+
+
+def _load_bm25_retriever(db) -> PrebuiltBM25Retriever:
+    """Retriever lexical sur l'index BM25 précalculé (voir `_load_bm25_index`)."""
+    return PrebuiltBM25Retriever(index=_load_bm25_index(db), k=config.RETRIEVER_K)
+
+
 if __name__ == "__main__":
-    success = build_enhanced_index()
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Construction de l'index RAG v2")
+    parser.add_argument("--incremental", action="store_true",
+                        help="N'embedder que les chunks nouveaux ou modifiés")
+    args = parser.parse_args()
+    
+    success = build_enhanced_index(incremental=args.incremental)
     if success:
         print("\n✅ Index construit avec succès!")
         print(f"Base de données: {config.DB_DIR}")
@@ -0,0 +1,301 @@
+"""
+Indexation en flux : ingestion → découpage → embeddings → base vectorielle.
+
+Les pages sortent des lecteurs PDF fichier par fichier, sont découpées puis
+regroupées en lots de taille fixe. Trois étapes tournent en parallèle,
+reliées par des files bornées :
+
+    [extraction + découpage] --file--> [embeddings] --file--> [écriture]
+
+L'extraction du fichier suivant se fait pendant l'embedding du lot courant,
+et la mémoire utilisée ne dépend que de la taille des lots et des files,
+pas de la taille du corpus. Les chunks déjà présents dans la base (même
+identifiant stable) ne sont pas réembeddés ; ceux qui n'apparaissent plus
+sont supprimés à la fin.
+"""
+import queue
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from langchain_core.documents import Document
+
+# Ajouter le chemin pour les imports
+sys.path.append(str(Path(__file__).parents[1]))
+
+from scraper.enhanced_ingest import iter_pdf_documents
+from chatbot.chunking_strategy import TokenBudget, chunk_source_documents, get_chunk_statistics
+from chatbot.incremental_index import assign_chunk_ids
+from utils.logger import setup_logger
+import config
+
+logger = setup_logger("streaming_pipeline")
+
+_DONE = object()
+
+# Écrit un lot déjà embeddé : (identifiants, chunks, vecteurs)
+BatchWriter = Callable[[List[str], List[Document], List[List[float]]], None]
+
+
+def chroma_writer(db) -> BatchWriter:
+    """
+    Écrit les lots dans une base Chroma (LangChain) sans réembedder les textes.
+
+    Args:
+        db: Base Chroma ouverte
+
+    Returns:
+        Fonction d'écriture d'un lot
+    """
+    def write(ids: List[str], chunks: List[Document], vectors: List[List[float]]) -> None:
+        db._collection.upsert(
+            ids=ids,
+            embeddings=vectors,
+            documents=[chunk.page_content for chunk in chunks],
+            metadatas=[chunk.metadata for chunk in chunks],
+        )
+    return write
+
+
+class _Stages:
+    """État partagé des étapes : arrêt coordonné et première erreur rencontrée."""
+
+    def __init__(self):
+        self.stop = threading.Event()
+        self.error: Optional[BaseException] = None
+
+    def fail(self, error: BaseException) -> None:
+        if self.error is None:
+            self.error = error
+        self.stop.set()
+
+    def put(self, q: queue.Queue, item) -> bool:
+        """Dépose `item` dans une file bornée ; False si le pipeline s'arrête."""
+        while not self.stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(self, q: queue.Queue):
+        """Retire un élément d'une file ; `_DONE` si le pipeline s'arrête."""
+        while not self.stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+
+def stream_index(
+    pdf_folder: Path,
+    embeddings,
+    writer: BatchWriter,
+    existing: Optional[Dict[str, Optional[str]]] = None,
+    delete: Optional[Callable[[List[str]], None]] = None,
+    bm25_builder=None,
+    batch_size: int = None,
+    queue_size: int = None,
+    save_txt_dir: Optional[Path] = None,
+    documents_source: Optional[Callable[[], object]] = None,
+    token_budget: Optional[TokenBudget] = None
+) -> Dict[str, object]:
+    """
+    Indexe un dossier de PDFs en flux, lot par lot.
+
+    Args:
+        pdf_folder: Dossier contenant les PDFs
+        embeddings: Fonction d'embeddings (interface LangChain `embed_documents`)
+        writer: Écriture d'un lot embeddé dans la base (voir `chroma_writer`)
+        existing: Identifiants déjà présents dans la base → source (incrémental)
+        delete: Suppression d'identifiants obsolètes (requis si `existing`)
+        bm25_builder: `BM25IndexBuilder` optionnel alimenté avec tous les chunks
+        batch_size: Nombre de chunks par lot d'embeddings (défaut: config.EMBED_BATCH_SIZE)
+        queue_size: Nombre de lots en attente entre deux étapes (défaut: config.PIPELINE_QUEUE_SIZE)
+        save_txt_dir: Si fourni, écrit le texte de chaque PDF dans <nom>.txt
+        documents_source: Générateur de (chemin, documents) à utiliser à la
+            place de `iter_pdf_documents(pdf_folder)`
+        token_budget: Si fourni, chunks dimensionnés en tokens du modèle
+            d'embeddings (voir `chunking_strategy.resolve_token_budget`)
+
+    Returns:
+        Statistiques: files, pages, chunks, total_chars, added, deleted,
+        unchanged, changed_sources, batches, durées par étape et, avec un
+        budget de tokens, total_tokens, truncated_chunks et truncated_tokens
+    """
+    batch_size = batch_size or config.EMBED_BATCH_SIZE
+    queue_size = queue_size or config.PIPELINE_QUEUE_SIZE
+    existing = existing or {}
+    if save_txt_dir is not None:
+        save_txt_dir = Path(save_txt_dir)
+        save_txt_dir.mkdir(parents=True, exist_ok=True)
+
+    stages = _Stages()
+    to_embed: queue.Queue = queue.Queue(maxsize=queue_size)
+    to_write: queue.Queue = queue.Queue(maxsize=queue_size)
+    seen = set()
+    changed_sources = set()
+    stats: Dict[str, object] = {
+        "files": 0, "pages": 0, "chunks": 0, "total_chars": 0,
+        "added": 0, "deleted": 0, "unchanged": 0, "batches": 0,
+        "extract_s": 0.0, "embed_s": 0.0, "write_s": 0.0,
+    }
+    if token_budget is not None:
+        stats.update({"total_tokens": 0, "truncated_chunks": 0, "truncated_tokens": 0})
+
+    def produce():
+        """Étape 1 : extraction des PDFs, découpage, constitution des lots."""
+        source = None
+        try:
+            source = documents_source() if documents_source else iter_pdf_documents(Path(pdf_folder))
+            batch: List[tuple] = []
+            busy_start = time.perf_counter()
+            for pdf_path, documents in source:
+                stats["files"] += 1
+                stats["pages"] += len(documents)
+                if save_txt_dir is not None:
+                    (save_txt_dir / (Path(pdf_path).stem + ".txt")).write_text(
+                        "\n\n".join(doc.page_content for doc in documents), encoding="utf-8"
+                    )
+
+                chunks = chunk_source_documents(documents, token_budget)
+                ids = assign_chunk_ids(chunks)
+                if token_budget is not None:
+                    chunk_stats = get_chunk_statistics(chunks, token_budget)
+                    stats["total_tokens"] += chunk_stats['total_tokens_est']
+                    stats["truncated_chunks"] += chunk_stats['truncated_chunks']
+                    stats["truncated_tokens"] += chunk_stats['truncated_tokens']
+                if bm25_builder is not None:
+                    bm25_builder.add_documents(chunks)
+                for chunk_id, chunk in zip(ids, chunks):
+                    seen.add(chunk_id)
+                    stats["chunks"] += 1
+                    stats["total_chars"] += len(chunk.page_content)
+                    if chunk_id in existing:
+                        stats["unchanged"] += 1
+                        continue
+                    changed_sources.add(chunk.metadata.get('source'))
+                    batch.append((chunk_id, chunk))
+                    if len(batch) >= batch_size:
+                        stats["extract_s"] += time.perf_counter() - busy_start
+                        if not stages.put(to_embed, batch):
+                            return
+                        busy_start = time.perf_counter()
+                        batch = []
+            stats["extract_s"] += time.perf_counter() - busy_start
+            if batch:
+                stages.put(to_embed, batch)
+        except BaseException as e:
+            stages.fail(e)
+        finally:
+            # Arrête l'extraction en cours (pool de processus) si le pipeline s'interrompt
+            if hasattr(source, "close"):
+                source.close()
+            stages.put(to_embed, _DONE)
+
+    def embed():
+        """Étape 2 : embeddings des lots."""
+        try:
+            while True:
+                batch = stages.get(to_embed)
+                if batch is _DONE:
+                    break
+                start = time.perf_counter()
+                vectors = embeddings.embed_documents([chunk.page_content for _, chunk in batch])
+                stats["embed_s"] += time.perf_counter() - start
+                if not stages.put(to_write, (batch, vectors)):
+                    return
+        except BaseException as e:
+            stages.fail(e)
+        finally:
+            stages.put(to_write, _DONE)
+
+    wall_start = time.perf_counter()
+    threads = [
+        threading.Thread(target=produce, name="pipeline-extract", daemon=True),
+        threading.Thread(target=embed, name="pipeline-embed", daemon=True),
+    ]
+    for thread in threads:
+        thread.start()
+
+    # Étape 3 (thread courant) : écriture des lots dans la base
+    try:
+        while True:
+            item = stages.get(to_write)
+            if item is _DONE:
+                break
+            batch, vectors = item
+            start = time.perf_counter()
+            writer([chunk_id for chunk_id, _ in batch], [chunk for _, chunk in batch], vectors)
+            stats["write_s"] += time.perf_counter() - start
+            stats["added"] += len(batch)
+            stats["batches"] += 1
+            logger.info(f"💾 Lot {stats['batches']} écrit ({stats['added']} chunks embeddés, "
+                        f"{stats['files']} PDFs lus)")
+    except BaseException as e:
+        stages.fail(e)
+    finally:
+        for thread in threads:
+            thread.join()
+
+    if stages.error is not None:
+        raise stages.error
+
+    stale_ids = [chunk_id for chunk_id in existing if chunk_id not in seen]
+    if stale_ids:
+        if delete is None:
+            raise ValueError("`delete` est requis pour supprimer les chunks obsolètes")
+        changed_sources.update(existing[chunk_id] for chunk_id in stale_ids)
+        delete(stale_ids)
+        logger.info(f"🗑️  {len(stale_ids)} chunks obsolètes supprimés")
+
+    changed_sources.discard(None)
+    stats["deleted"] = len(stale_ids)
+    stats["changed_sources"] = sorted(changed_sources)
+    stats["elapsed_s"] = time.perf_counter() - wall_start
+    logger.info(f"✅ Indexation en flux: {stats['files']} PDFs, {stats['pages']} pages, "
+                f"{stats['chunks']} chunks ({stats['added']} embeddés, {stats['unchanged']} inchangés, "
+                f"{stats['deleted']} supprimés) en {stats['elapsed_s']:.2f}s")
+    if token_budget is not None:
+        logger.info(f"   Tokens: {stats['total_tokens']} (max {token_budget.max_seq_length} par séquence), "
+                    f"{stats['truncated_tokens']} tronqués dans {stats['truncated_chunks']} chunks")
+    logger.info(f"   Temps par étape: extraction {stats['extract_s']:.2f}s, "
+                f"embeddings {stats['embed_s']:.2f}s, écriture {stats['write_s']:.2f}s")
+    return stats
+
+
+def stream_index_chroma(
+    pdf_folder: Path,
+    db,
+    embeddings,
+    incremental: bool = True,
+    **kwargs
+) -> Dict[str, object]:
+    """
+    Indexe un dossier de PDFs en flux dans une base Chroma (LangChain).
+
+    Args:
+        pdf_folder: Dossier contenant les PDFs
+        db: Base Chroma ouverte (vide pour une reconstruction complète)
+        embeddings: Fonction d'embeddings utilisée pour les lots
+        incremental: Ne pas réembedder les chunks déjà présents dans la base
+        **kwargs: Options de `stream_index`
+
+    Returns:
+        Statistiques de `stream_index`
+    """
+    existing: Dict[str, Optional[str]] = {}
+    if incremental:
+        stored = db.get(include=["metadatas"])
+        existing = {
+            chunk_id: (meta or {}).get('source')
+            for chunk_id, meta in zip(stored['ids'], stored['metadatas'])
+        }
+    return stream_index(
+        pdf_folder, embeddings, chroma_writer(db),
+        existing=existing, delete=lambda ids: db.delete(ids=ids), **kwargs
+    )
@@ -14,6 +14,7 @@ DATA_DIR = PROJECT_ROOT / "data"
 REGLEMENTS_DIR = PROJECT_ROOT / "Réglements"
 LOGS_DIR = PROJECT_ROOT / "logs"
 DB_DIR = DATA_DIR / "chroma_db_v2"
+BM25_DIR = DATA_DIR / "chroma_db_v2_bm25"  # Index BM25 précalculé (à côté de la base Chroma)
 
 # Assurez-vous que les dossiers existent
 DATA_DIR.mkdir(exist_ok=True)
@@ -26,16 +27,157 @@ LOGS_DIR.mkdir(exist_ok=True)
 # - "dangvantuan/sentence-camembert-large" (français spécialisé)
 EMBEDDING_MODEL = "sentence-transformers/paraphrase-multilingual-mpnet-base-v2"
 
+# Ingestion des PDFs
+INGEST_WORKERS = None  # Nombre de processus d'extraction (None = nombre de cœurs)
+INGEST_PAGES_PER_TASK = 16  # Les gros PDFs sont découpés en tranches de pages
+# Démarrage des processus d'extraction et d'OCR : les pools sont créés depuis des
+# threads (pipeline d'indexation), où un fork pourrait hériter d'un verrou tenu
+WORKER_START_METHOD = "spawn"
+EXTRACTION_CACHE_PATH = DATA_DIR / "extraction_cache.sqlite3"  # Pages déjà extraites, par empreinte de PDF
+
+# OCR des PDFs scannés (pytesseract + pdf2image)
+OCR_WORKERS = None  # Nombre de processus OCR (None = nombre de cœurs)
+OCR_LANG = "fra"
+OCR_DPI = 200
+OCR_MAX_INFLIGHT_PER_WORKER = 2  # Pages en cours par processus (borne la mémoire)
+OCR_CACHE_DIR = DATA_DIR / "ocr_cache"  # Texte OCR par empreinte d'image de page
+OCR_FALLBACK_ENABLED = True  # OCR automatique des pages image pendant l'ingestion
+OCR_MIN_PAGE_CHARS = 50  # En dessous, une page est considérée sans texte
+
+# Cache disque des embeddings (partagé par tous les scripts d'indexation)
+EMBEDDING_CACHE_DIR = DATA_DIR / "embedding_cache"
+EMBEDDING_CACHE_DTYPE = "float32"  # "float16" divise la taille du cache par 2
+QUERY_CACHE_SIZE = 1024  # Embeddings de questions gardés en mémoire (LRU)
+QUERY_CACHE_TTL_SECONDS = 3600  # 0 = pas d'expiration
+SENTENCE_CACHE_SIZE = 4096  # Embeddings de phrases (compression du contexte) gardés en mémoire, jamais sur disque
+
+# Indexation en flux (ingestion → découpage → embeddings → base vectorielle)
+EMBED_BATCH_SIZE = 64  # Chunks par lot d'embeddings / d'écriture
+PIPELINE_QUEUE_SIZE = 4  # Lots en attente entre deux étapes (borne la mémoire)
+
 # Configuration RAG
 CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 200
+CHUNKING_MODE = "tokens"  # "tokens" (tokenizer du modèle d'embeddings) ou "chars"
+CHUNK_TOKEN_OVERLAP_RATIO = 0.15  # Chevauchement en mode "tokens" (part de la taille du chunk)
+EMBEDDING_MAX_SEQ_LENGTH = None  # None = max_seq_length du modèle (128 pour mpnet multilingue)
 RETRIEVER_K = 5  # Nombre de documents à récupérer
-RETRIEVER_FETCH_K = 20  # Pool initial pour MMR
+RETRIEVER_FETCH_K = 20  # Pool initial pour MMR (200+ sans pénalité de latence, voir chatbot/mmr.py)
+RETRIEVER_LAMBDA_MULT = 0.7  # MMR : 1 = pertinence seule, 0 = diversité seule
+MMR_SIMILARITY_CACHE_SIZE = 64  # Matrices de similarité entre candidats gardées en mémoire (LRU)
+# Base vectorielle à la requête : "native" (FAISS / Chroma), "numpy" (recherche exacte,
+# voir chatbot/numpy_store.py) ou "quantized" (codes int8 + binaires, voir chatbot/quantized_store.py)
+VECTOR_BACKEND = "native"
+# "float16" divise par 2 la taille sur disque et en mémoire (matrice mappée), mais le score
+# converti par blocs est ~10x plus lent (≈10 ms contre 1 ms pour 5000 x 768 : python chatbot/numpy_store.py)
+NUMPY_STORE_DTYPE = "float32"
+QUANTIZED_BINARY_CANDIDATES = 200  # Candidats retenus par distance de Hamming (0 = int8 sur toute la base)
+QUANTIZED_RESCORE_CANDIDATES = 50  # Candidats int8 rescorés en float depuis le disque (0 = scores int8)
+# Réduction de dimension des bases "numpy" / "quantized" (voir chatbot/dimension_reduction.py)
+EMBEDDING_REDUCTION_DIM = None  # None = dimension du modèle (rappel@k par dimension : python chatbot/dimension_reduction.py)
+EMBEDDING_REDUCTION_METHOD = "pca"  # "pca" (appris sur le corpus) ou "truncate" (modèles Matryoshka)
+
+# Recherche hybride (sémantique + BM25, voir chatbot/hybrid_search.py)
+HYBRID_FUSION = "rrf"  # "rrf" (reciprocal rank fusion) ou "weighted" (scores normalisés entre 0 et 1)
+HYBRID_DENSE_WEIGHT = 0.7  # Poids de la recherche sémantique
+HYBRID_LEXICAL_WEIGHT = 0.3  # Poids de BM25
+HYBRID_RRF_K = 60  # Constante de lissage des rangs (fusion "rrf")
+
+# Contexte du prompt (fusion des chunks qui se recouvrent, budget en tokens)
+LLM_CONTEXT_TOKEN_BUDGET = 1500  # Tokens maximum du contexte envoyé au LLM
+LLM_CONTEXT_TOKENIZER = "cl100k_base"  # Modèle ou encodage tiktoken utilisé pour compter
+LLM_CONTEXT_MIN_OVERLAP_CHARS = 20  # Chevauchement minimal pour fusionner deux chunks
+CONTEXT_COMPRESSION_ENABLED = True  # Ne garder que les phrases proches de la question
+CONTEXT_COMPRESSION_TOP_SENTENCES = 8  # Phrases retenues au total
+CONTEXT_COMPRESSION_NEIGHBOURS = 1  # Phrases voisines gardées autour de chaque phrase retenue
+
+# Appel au LLM selon la similarité cosinus du meilleur chunk, par type de document
+# (sous min_score : « pas dans les règlements » ; au-dessus de direct_score : extrait direct)
+LLM_GATING_ENABLED = True
+LLM_GATING_THRESHOLDS = {
+    "default": {"min_score": 0.25, "direct_score": 0.90},
+    "protocole": {"direct_score": 0.85},  # Procédures courtes, souvent citées telles quelles
+    "projet_educatif": {"min_score": 0.30},  # Texte général, proche de beaucoup de questions
+}
+LLM_GATING_NOT_FOUND_MESSAGE = (
+    "Je n'ai pas trouvé cette information dans les règlements. "
+    "Reformulez la question ou contactez le secrétariat."
+)
+
+# Cache sémantique des réponses du LLM
+ANSWER_CACHE_ENABLED = True
+ANSWER_CACHE_PATH = DATA_DIR / "answer_cache.sqlite3"
+ANSWER_CACHE_THRESHOLD = 0.95  # Similarité cosinus minimale entre deux questions
+ANSWER_CACHE_MAX_ENTRIES = 2000  # Au-delà, les moins récemment utilisées sont évincées
+ANSWER_CACHE_TTL_SECONDS = 7 * 24 * 3600  # 0 = pas d'expiration
 
 # LLM Configuration
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_MODEL = "gpt-3.5-turbo"
 LLM_TEMPERATURE = 0
+LLM_PROVIDER_ORDER = ["groq", "openai", "deepseek", "ollama"]  # Ordre de préférence
+LLM_ROUTING = "latency"  # "latency" (temps de réponse observés) ou "static" (LLM_PROVIDER_ORDER)
+LLM_HEDGE_DELAY_SECONDS = 2.5  # Sans réponse après ce délai, le fournisseur suivant est lancé
+LLM_DEADLINE_SECONDS = 20.0  # Au-delà, mode recherche documentaire
+
+# Fournisseurs LLM (clients construits une fois par processus, connexions HTTP persistantes)
+# client: "groq", "openai" (API compatible OpenAI) ou "ollama"
+# api_key_env: variables d'environnement essayées dans l'ordre (aucune = pas de clé requise)
+# timeout: délai par tentative (s) ; max_retries: nouvelles tentatives sur erreur transitoire
+# free / local: fournisseur gratuit ou local, préféré par le routeur (LLM_ROUTER_FREE_FACTOR)
+LLM_PROVIDERS = {
+    "groq": {
+        "label": "Groq (Llama 3.3)",
+        "client": "groq",
+        "model": "llama-3.3-70b-versatile",
+        "api_key_env": ["GROQ_API_KEY"],
+        "timeout": 15.0,
+        "max_retries": 1,
+        "free": True,
+    },
+    "openai": {
+        "label": "OpenAI",
+        "client": "openai",
+        "model": OPENAI_MODEL,
+        "api_key_env": ["OPENAI_API_KEY"],
+        "timeout": 20.0,
+        "max_retries": 1,
+    },
+    "deepseek": {
+        "label": "DeepSeek",
+        "client": "openai",
+        "model": "deepseek-chat",
+        "base_url": "https://api.deepseek.com/v1",
+        "api_key_env": ["DEEPSEEK_API_KEY", "OPENAI_API_KEY"],
+        "timeout": 30.0,
+        "max_retries": 1,
+    },
+    "ollama": {
+        "label": "Ollama (local)",
+        "client": "ollama",
+        "model": os.getenv("OLLAMA_MODEL", "mistral"),
+        "base_url": os.getenv("OLLAMA_BASE_URL", "http://localhost:11434"),
+        "api_key_env": [],
+        "timeout": 60.0,
+        "max_retries": 0,
+        "free": True,
+        "local": True,
+    },
+}
+LLM_RETRY_BACKOFF_SECONDS = 0.5  # Attente avant la 1re nouvelle tentative (doublée ensuite)
+LLM_HTTP_MAX_CONNECTIONS = 10  # Connexions HTTP simultanées par fournisseur
+LLM_HTTP_KEEPALIVE_SECONDS = 60.0  # Durée de vie d'une connexion inactive
+LLM_BREAKER_FAILURE_THRESHOLD = 3  # Échecs consécutifs avant d'écarter un fournisseur
+LLM_BREAKER_COOLDOWN_SECONDS = 60.0  # Durée d'éviction avant une requête de test
+
+# Routage selon la latence observée (moyennes mobiles par fournisseur et modèle)
+LLM_ROUTER_STATS_PATH = DATA_DIR / "llm_router_stats.json"
+LLM_ROUTER_ALPHA = 0.2  # Poids d'une nouvelle observation dans les moyennes mobiles
+LLM_ROUTER_PRIOR_LATENCY_SECONDS = 3.0  # Latence supposée d'un fournisseur jamais observé
+LLM_ROUTER_FREE_FACTOR = 0.7  # Coût des fournisseurs gratuits/locaux multiplié par ce facteur (1 = neutre)
+LLM_ROUTER_ERROR_HALF_LIFE_SECONDS = 3600  # Atténuation du taux d'erreur sans nouvelle observation
+LLM_ROUTER_FLUSH_EVERY = 20  # Statistiques écrites sur disque toutes les N observations...
+LLM_ROUTER_FLUSH_INTERVAL_SECONDS = 60  # ... ou après ce délai (et à l'arrêt du processus)
 
 # Email Configuration
 SENDER_EMAIL = os.getenv("SENDER_EMAIL")
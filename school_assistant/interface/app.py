@@ -18,31 +18,24 @@ st.set_page_config(
     layout="wide"
 )
 
-# Fonction pour charger le bot (similaire à bot.py)
-@st.cache_resource
+# Fonction pour charger le bot (partagée avec bot.py via le registre de moteurs)
+# Le registre garde le modèle et l'index en mémoire pour tout le processus
+# Streamlit et recharge l'index automatiquement après une reconstruction.
 def load_rag_engine():
     try:
-        from langchain_community.vectorstores import FAISS
-        from langchain_community.embeddings import SentenceTransformerEmbeddings
+        from chatbot.bot import FAISS_DIR, load_faiss_retriever
         from dotenv import load_dotenv
         
         load_dotenv()
         
-        base_dir = os.path.dirname(parent_dir) # AMP/
-        db_dir = os.path.join(base_dir, "school_assistant", "data", "faiss_index")
-        
-        if not os.path.exists(db_dir):
-            return None, None
+        if not FAISS_DIR.exists():
+            return None
             
-        embedding_function = SentenceTransformerEmbeddings(model_name="all-MiniLM-L6-v2")
-        db = FAISS.load_local(db_dir, embedding_function, allow_dangerous_deserialization=True)
-        retriever = db.as_retriever(search_kwargs={"k": 3})
-        
-        # Retourner le retriever et la clé API (Groq ou OpenAI)
-        return retriever, os.getenv("GROQ_API_KEY") or os.getenv("OPENAI_API_KEY")
+        # Les clés API sont lues par les fournisseurs LLM (chatbot/llm_providers.py)
+        return load_faiss_retriever(k=3)
     except Exception as e:
         st.error(f"Erreur chargement IA: {e}")
-        return None, None
+        return None
 
 st.title("🎓 Assistant Scolaire Intégré")
 
@@ -51,7 +44,7 @@ tab1, tab2, tab3 = st.tabs(["🤖 Chatbot Règlements", "📋 Notes de Service",
 
 with tab1:
     st.header("Posez vos questions sur le règlement")
-    retriever, api_key = load_rag_engine()
+    retriever = load_rag_engine()
     
     if retriever:
         # Historique de chat
@@ -68,50 +61,51 @@ with tab1:
                 st.markdown(prompt)
 
             with st.chat_message("assistant"):
-                # Logique RAG avec Groq en priorité
-                docs = retriever.invoke(prompt)
-                context_text = "\n\n".join([d.page_content for d in docs])
-                
-                response_text = ""
-                
-                # Tentative 1 : Groq (priorité - gratuit et rapide)
-                groq_key = os.getenv("GROQ_API_KEY")
-                if groq_key:
-                    try:
-                        from langchain_groq import ChatGroq
-                        llm = ChatGroq(
-                            model="llama-3.3-70b-versatile",
-                            groq_api_key=groq_key,
-                            temperature=0
-                        )
-                        full_prompt = f"Tu es un assistant scolaire. Utilise ce contexte pour répondre: {context_text}\n\nQuestion: {prompt}"
-                        ai_msg = llm.invoke(full_prompt)
-                        response_text = ai_msg.content
-                    except Exception as e:
-                        st.info(f"Groq indisponible : {e}")
-                        groq_key = None  # Essayer la méthode suivante
-                
-                # Tentative 2 : DeepSeek/OpenAI (si Groq a échoué)
-                if not response_text and api_key:
-                    try:
-                        from langchain_openai import ChatOpenAI
-                        llm = ChatOpenAI(
-                            model="deepseek-chat",
-                            openai_api_key=api_key,
-                            openai_api_base="https://api.deepseek.com/v1",
-                            temperature=0
-                        )
-                        full_prompt = f"Tu es un assistant scolaire. Utilise ce contexte pour répondre: {context_text}\n\nQuestion: {prompt}"
-                        ai_msg = llm.invoke(full_prompt)
-                        response_text = ai_msg.content
-                    except Exception as e:
-                        st.info(f"DeepSeek/OpenAI indisponible : {e}")
+                from chatbot.bot import build_context, find_cached_answer, remember_answer, search_faiss
+                from chatbot import answer_gating, llm_providers
+                import config
                 
-                # Fallback : Recherche documentaire
-                if not response_text:
-                    response_text = f"ℹ️ **Mode Recherche Documentaire**\n\nVoici les extraits pertinents trouvés :\n\n{context_text}"
+                # Question similaire déjà traitée : réponse immédiate
+                query_vector, cached = find_cached_answer(prompt)
+                streamed = False
+                if cached:
+                    response_text = cached["answer"]
+                    st.caption(f"♻️ Réponse en cache (similarité {cached['similarity']:.2f}) — "
+                               f"Sources : {', '.join(cached['sources'])}")
+                else:
+                    # Recherche des extraits pertinents, avec leur score
+                    docs = search_faiss(prompt)
+                    decision = answer_gating.get_policy().decide(docs)
+                    response_text = ""
+                    context_text = ""
+                    
+                    if decision == answer_gating.NOT_FOUND:
+                        response_text = f"ℹ️ {config.LLM_GATING_NOT_FOUND_MESSAGE}"
+                    elif decision == answer_gating.EXTRACTIVE:
+                        st.caption(f"🎯 Extrait quasi identique à la question (score {docs[0].metadata['score']:.2f})")
+                        response_text = answer_gating.extractive_answer(docs)
+                    else:
+                        packed = build_context(docs, query_vector)
+                        context_text = packed.text
+                        
+                        # Fournisseurs lancés en parallèle avec couverture, ordonnés par le routeur ;
+                        # la réponse s'affiche au fil de la génération
+                        stream = llm_providers.generate_stream(context_text, prompt)
+                        if stream:
+                            st.caption(f"🤖 Réponse générée par {llm_providers.provider_label(stream.provider)}")
+                            response_text = st.write_stream(stream)
+                            streamed = bool(response_text)
+                            if stream.complete:
+                                remember_answer(prompt, query_vector, stream.text, packed.documents, stream.provider)
+                            elif response_text:
+                                st.caption("⚠️ Réponse interrompue")
+                    
+                    # Fallback : Recherche documentaire
+                    if not response_text:
+                        response_text = f"ℹ️ **Mode Recherche Documentaire**\n\nVoici les extraits pertinents trouvés :\n\n{context_text}"
                 
-                st.markdown(response_text)
+                if not streamed:
+                    st.markdown(response_text)
                 st.session_state.messages.append({"role": "assistant", "content": response_text})
     else:
         st.warning("⚠️ L'index de recherche n'est pas prêt. Veuillez vérifier que 'setup_rag.py' a bien tourné.")
@@ -171,6 +165,48 @@ with tab3:
     else:
         st.warning("Dossier 'data' introuvable.")
 
+    st.markdown("### 🧠 Moteur de recherche")
+    from chatbot import engine_registry
+    registry_stats = engine_registry.stats()
+    st.text(f"- Modèles chargés : {registry_stats['embeddings']}")
+    st.text(f"- Index chargés : {registry_stats['stores']}")
+    st.text(f"- Retrievers chargés : {registry_stats['retrievers']}")
+    query_cache = registry_stats['query_cache']
+    st.text(f"- Cache des questions : {query_cache['size']} entrées, "
+            f"{query_cache['hits']} succès / {query_cache['misses']} échecs "
+            f"({query_cache['hit_rate']:.0%})")
+    from chatbot.answer_cache import get_shared_cache as get_answer_cache
+    answer_stats = get_answer_cache().stats()
+    st.text(f"- Cache des réponses : {answer_stats['entries']} réponses, "
+            f"{answer_stats['hits']} succès / {answer_stats['misses']} échecs "
+            f"({answer_stats['hit_rate']:.0%})")
+    if st.button("🔄 Recharger l'index de recherche"):
+        removed = engine_registry.invalidate()
+        st.success(f"✅ Index déchargé ({removed} entrée(s)), rechargement à la prochaine question.")
+
+    st.markdown("### 🤖 Fournisseurs LLM (ordre de routage)")
+    from chatbot import llm_providers
+    breaker_icons = {"closed": "🟢", "half_open": "🟡", "open": "🔴"}
+    for provider in llm_providers.health():
+        if not provider['configured']:
+            st.text(f"⚪ {provider['label']} : non configuré (clé API absente)")
+            continue
+        line = (f"{breaker_icons[provider['state']]} {provider['label']} : {provider['state']}, "
+                f"{provider['successes']} succès / {provider['failures']} échecs")
+        if provider['latency'] is not None:
+            line += f", {provider['latency']:.1f}s en moyenne, {provider['error_rate']:.0%} d'erreurs"
+        if provider['state'] == "open":
+            line += f", nouvel essai dans {provider['retry_in']:.0f}s"
+        st.text(line)
+        if provider['last_error'] and provider['state'] != "closed":
+            st.caption(f"Dernière erreur : {provider['last_error']}")
+    
+    from chatbot import answer_gating
+    gating = answer_gating.get_policy().stats()
+    st.text(f"🚦 Appels LLM évités : {gating['avoided']} ({gating['avoided_rate']:.0%}) — "
+            f"{gating['not_found']} hors règlements, {gating['extractive']} réponses directes, "
+            f"{gating['llm']} générées")
+
     st.markdown("### 🛠️ Outils de maintenance")
     if st.button("🗑️ Réinitialiser la base de connaissances (Clean DB)"):
         # Logique de nettoyage simple
@@ -1,10 +1,14 @@
 """
 Pipeline d'ingestion amélioré avec métadonnées et prétraitement.
 """
+import multiprocessing
 import os
 import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import List, Dict
+from typing import Dict, Iterator, List, Optional, Tuple
 import hashlib
 from datetime import datetime
 
@@ -15,6 +19,8 @@ from pypdf import PdfReader
 from langchain_core.documents import Document
 from utils.text_processing import preprocess_text, extract_section_title
 from utils.logger import setup_logger
+from scraper.extraction_cache import get_shared_cache
+import config
 
 logger = setup_logger("enhanced_ingest")
 
@@ -47,12 +53,90 @@ def classify_document(filename: str) -> str:
         return "autre"
 
 
-def extract_pdf_with_metadata(pdf_path: Path) -> List[Document]:
+def _page_to_document(
+    pdf_path: Path,
+    page_num: int,
+    raw_text: str,
+    doc_type: str,
+    extraction: str = "text"
+) -> Optional[Document]:
+    """
+    Nettoie le texte d'une page et crée le document avec métadonnées.
+    
+    Args:
+        pdf_path: Chemin du PDF source
+        page_num: Numéro de page (0-indexed)
+        raw_text: Texte brut extrait de la page
+        doc_type: Type du document
+        extraction: Origine du texte ("text" pour pypdf, "ocr" pour Tesseract)
+        
+    Returns:
+        Document, ou None si la page est vide ou trop courte
+    """
+    # Validation
+    if not raw_text or len(raw_text.strip()) < config.OCR_MIN_PAGE_CHARS:
+        if extraction == "text":
+            logger.warning(f"Page {page_num} de {pdf_path.name} trop courte ou vide")
+        else:
+            logger.warning(f"Page {page_num} de {pdf_path.name}: OCR insuffisant")
+        return None
+    
+    # Prétraitement
+    clean_text = preprocess_text(raw_text)
+    
+    if len(clean_text) < 30:
+        logger.warning(f"Page {page_num} de {pdf_path.name} vide après nettoyage")
+        return None
+    
+    # Hash pour détecter les duplications
+    content_hash = hashlib.sha256(clean_text.encode()).hexdigest()[:16]
+    
+    # Extraire un titre si possible
+    section_title = extract_section_title(clean_text)
+    
+    # Créer le document avec métadonnées
+    metadata = {
+        "source": pdf_path.name,
+        "page": page_num + 1,  # Numérotation humaine (1-indexed)
+        "doc_type": doc_type,
+        "content_hash": content_hash,
+        "section_title": section_title,
+        "char_count": len(clean_text),
+        "processed_at": datetime.now().isoformat()
+    }
+    if extraction != "text":
+        metadata["extraction"] = extraction
+    return Document(page_content=clean_text, metadata=metadata)
+
+
+def _is_image_only(page, raw_text: Optional[str]) -> bool:
+    """Indique si une page n'a (presque) pas de texte mais contient des images."""
+    if raw_text and len(raw_text.strip()) >= config.OCR_MIN_PAGE_CHARS:
+        return False
+    try:
+        return len(page.images) > 0
+    except Exception:
+        return False
+
+
+def extract_pdf_with_metadata(
+    pdf_path: Path,
+    start_page: int = 0,
+    end_page: Optional[int] = None,
+    image_pages: Optional[List[int]] = None,
+    errors: Optional[List[str]] = None
+) -> List[Document]:
     """
     Extrait le texte d'un PDF avec métadonnées enrichies.
     
     Args:
         pdf_path: Chemin vers le fichier PDF
+        start_page: Première page à extraire (0-indexed)
+        end_page: Page de fin exclue (None = jusqu'à la fin)
+        image_pages: Liste optionnelle complétée avec les numéros (0-indexed)
+            des pages sans texte mais contenant des images (candidates à l'OCR)
+        errors: Liste optionnelle complétée avec l'erreur qui a interrompu
+            l'extraction (les documents renvoyés sont alors incomplets)
         
     Returns:
         Liste de documents avec métadonnées
@@ -64,78 +148,324 @@ def extract_pdf_with_metadata(pdf_path: Path) -> List[Document]:
     
     try:
         reader = PdfReader(str(pdf_path))
+        end_page = len(reader.pages) if end_page is None else min(end_page, len(reader.pages))
         
-        for page_num, page in enumerate(reader.pages):
+        for page_num in range(start_page, end_page):
+            page = reader.pages[page_num]
             raw_text = page.extract_text()
-            
-            # Validation
-            if not raw_text or len(raw_text.strip()) < 50:
-                logger.warning(f"Page {page_num} de {pdf_path.name} trop courte ou vide")
-                continue
-            
-            # Prétraitement
-            clean_text = preprocess_text(raw_text)
-            
-            if len(clean_text) < 30:
-                logger.warning(f"Page {page_num} de {pdf_path.name} vide après nettoyage")
-                continue
-            
-            # Hash pour détecter les duplications
-            content_hash = hashlib.sha256(clean_text.encode()).hexdigest()[:16]
-            
-            # Extraire un titre si possible
-            section_title = extract_section_title(clean_text)
-            
-            # Créer le document avec métadonnées
-            documents.append(Document(
-                page_content=clean_text,
-                metadata={
-                    "source": pdf_path.name,
-                    "page": page_num + 1,  # Numérotation humaine (1-indexed)
-                    "doc_type": doc_type,
-                    "content_hash": content_hash,
-                    "section_title": section_title,
-                    "char_count": len(clean_text),
-                    "processed_at": datetime.now().isoformat()
-                }
-            ))
+            doc = _page_to_document(pdf_path, page_num, raw_text, doc_type)
+            if doc is not None:
+                documents.append(doc)
+            elif image_pages is not None and _is_image_only(page, raw_text):
+                image_pages.append(page_num)
             
         logger.info(f"✅ {pdf_path.name}: {len(documents)} pages extraites")
         
     except Exception as e:
         logger.error(f"❌ Erreur sur {pdf_path.name}: {e}", exc_info=True)
+        if errors is not None:
+            errors.append(str(e))
     
     return documents
 
 
-def ingest_all_pdfs(pdf_folder: Path) -> List[Document]:
+def list_pdfs(pdf_folder: Path) -> List[Path]:
     """
-    Ingère tous les PDFs d'un dossier.
+    Liste les PDFs d'un dossier (extensions .pdf et .PDF), triés par nom.
     
     Args:
         pdf_folder: Dossier contenant les PDFs
         
     Returns:
-        Liste de tous les documents extraits
+        Chemins des PDFs dans un ordre stable
+    """
+    return sorted(
+        (p for p in pdf_folder.iterdir() if p.is_file() and p.suffix.lower() == ".pdf"),
+        key=lambda p: p.name
+    )
+
+
+def _extract_task(pdf_path: str, start_page: int, end_page: int) -> Tuple[List[Document], List[int], bool, float]:
+    """
+    Tâche exécutée dans un processus de travail : extrait une tranche de pages.
+    
+    Returns:
+        Tuple (documents, pages image sans texte, True si l'extraction a échoué
+        en cours de route, durée en secondes)
+    """
+    start = time.perf_counter()
+    image_pages: List[int] = []
+    errors: List[str] = []
+    docs = extract_pdf_with_metadata(Path(pdf_path), start_page, end_page, image_pages=image_pages, errors=errors)
+    return docs, image_pages, bool(errors), time.perf_counter() - start
+
+
+class _OCRFallback:
+    """File d'OCR en arrière-plan pour les pages image détectées pendant l'extraction."""
+    
+    def __init__(self, enabled: bool):
+        self.engine = None
+        self.futures: Dict[int, list] = {}
+        if not enabled:
+            return
+        from scraper.ocr_engine import OCREngine, ocr_available
+        if ocr_available():
+            self.engine = OCREngine()
+        else:
+            logger.info("OCR indisponible (pytesseract/pdf2image absents) : pages image ignorées")
+    
+    def submit(self, file_index: int, pdf_path: Path, page_nums: List[int]) -> None:
+        """Met en file l'OCR des pages `page_nums` (0-indexed) dès leur détection."""
+        if self.engine is None or not page_nums:
+            return
+        logger.info(f"OCR en arrière-plan: {pdf_path.name}, pages {[p + 1 for p in page_nums]}")
+        for page_num in page_nums:
+            self.futures.setdefault(file_index, []).append(
+                (page_num, self.engine.submit(pdf_path, page_num + 1))
+            )
+    
+    def collect(self, file_index: int, pdf_path: Path) -> Tuple[List[Document], bool]:
+        """
+        Attend les OCR en cours d'un fichier.
+        
+        Returns:
+            Tuple (pages reconnues, True si l'OCR d'au moins une page a échoué)
+        """
+        documents = []
+        failed = False
+        for page_num, future in self.futures.pop(file_index, []):
+            try:
+                _, text = future.result()
+            except Exception as e:
+                logger.error(f"❌ OCR échoué pour {pdf_path.name} page {page_num + 1}: {e}")
+                failed = True
+                continue
+            doc = _page_to_document(pdf_path, page_num, text, classify_document(pdf_path.name), extraction="ocr")
+            if doc is not None:
+                documents.append(doc)
+        return documents, failed
+    
+    def shutdown(self) -> None:
+        if self.engine is not None:
+            self.engine.shutdown()
+
+
+def _page_ranges(pdf_path: Path, pages_per_task: int) -> List[Tuple[int, Optional[int]]]:
+    """Découpe un PDF en tranches de pages (page de début, page de fin exclue)."""
+    try:
+        num_pages = len(PdfReader(str(pdf_path)).pages)
+    except Exception as e:
+        logger.warning(f"Impossible de compter les pages de {pdf_path.name}: {e}")
+        return [(0, None)]
+    return [
+        (start_page, start_page + pages_per_task)
+        for start_page in range(0, max(num_pages, 1), pages_per_task)
+    ]
+
+
+def iter_pdf_documents(
+    pdf_folder: Path,
+    workers: Optional[int] = None,
+    timings: Optional[Dict[str, float]] = None,
+    use_cache: bool = True,
+    ocr_fallback: Optional[bool] = None
+) -> Iterator[Tuple[Path, List[Document]]]:
+    """
+    Extrait les PDFs d'un dossier et restitue les documents fichier par fichier.
+    
+    Les tranches de pages sont planifiées au fil de l'eau sur un pool de
+    processus, avec un nombre borné de tâches en cours : seuls les
+    documents des fichiers en cours d'extraction sont en mémoire, quelle
+    que soit la taille du corpus. Les fichiers sont restitués dans un ordre
+    stable (nom de fichier), leurs pages triées. Les PDFs inchangés sont
+    servis par le cache d'extraction ; les pages image sont passées à l'OCR
+    en arrière-plan et réintégrées à leur fichier.
+    
+    Args:
+        pdf_folder: Dossier contenant les PDFs
+        workers: Nombre de processus (défaut: config.INGEST_WORKERS ou nb de cœurs,
+            1 = extraction séquentielle)
+        timings: Dictionnaire optionnel rempli avec le temps d'extraction
+            (secondes cumulées) de chaque fichier
+        use_cache: Utiliser le cache d'extraction par empreinte de fichier
+        ocr_fallback: OCR automatique des pages image (défaut: config.OCR_FALLBACK_ENABLED)
+        
+    Yields:
+        Tuples (chemin du PDF, documents du PDF triés par page)
     """
     if not pdf_folder.is_dir():
         logger.error(f"Dossier introuvable: {pdf_folder}")
         raise FileNotFoundError(f"Le dossier PDF n'existe pas : {pdf_folder}")
     
-    logger.info(f"Début de l'ingestion depuis: {pdf_folder}")
-    logger.info(f"Contenu du dossier: {list(pdf_folder.glob('*.pdf'))}")
+    pdf_paths = list_pdfs(pdf_folder)
+    workers = workers or config.INGEST_WORKERS or os.cpu_count() or 1
+    cache = get_shared_cache() if use_cache else None
     
-    all_documents = []
+    logger.info(f"Début de l'ingestion depuis: {pdf_folder} ({len(pdf_paths)} PDFs)")
+    
+    def units():
+        """Tâches dans l'ordre des fichiers : documents en cache ou tranches à extraire."""
+        for file_index, pdf_path in enumerate(pdf_paths):
+            cached = cache.get_documents(pdf_path) if cache else None
+            if cached is not None:
+                yield file_index, cached, None
+                continue
+            for page_range in _page_ranges(pdf_path, config.INGEST_PAGES_PER_TASK):
+                yield file_index, None, page_range
+    
+    if ocr_fallback is None:
+        ocr_fallback = config.OCR_FALLBACK_ENABLED
+    ocr = _OCRFallback(enabled=ocr_fallback)
+    executor = None
+    if workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers,
+                                       mp_context=multiprocessing.get_context(config.WORKER_START_METHOD))
+    if executor is not None:
+        logger.info(f"Extraction parallèle sur {workers} processus")
+    
+    def schedule(unit):
+        """Lance une tâche ; renvoie (index du fichier, depuis le cache, résultat différé)."""
+        file_index, cached, page_range = unit
+        if cached is not None:
+            return file_index, True, lambda: (cached, [], False, 0.0)
+        args = (str(pdf_paths[file_index]), *page_range)
+        if executor is None:
+            return file_index, False, lambda: _extract_task(*args)
+        return file_index, False, executor.submit(_extract_task, *args).result
+    
+    def finish(file_index: int, docs: List[Document], from_cache: bool, incomplete: bool, elapsed: float):
+        pdf_path = pdf_paths[file_index]
+        ocr_docs, ocr_failed = ocr.collect(file_index, pdf_path)
+        docs.extend(ocr_docs)
+        docs.sort(key=lambda doc: doc.metadata['page'])
+        # Extraction ou OCR échoué : fichier incomplet, réessayé à la prochaine ingestion
+        if cache and not from_cache and not incomplete and not ocr_failed:
+            cache.put_documents(pdf_path, docs)
+        if timings is not None:
+            timings[pdf_path.name] = elapsed
+        logger.info(f"  - {pdf_path.name}: {len(docs)} pages en {elapsed:.2f}s"
+                    + (" (cache)" if from_cache else ""))
+        return pdf_path, docs
     
-    for pdf_path in pdf_folder.glob("*.pdf"):
-        docs = extract_pdf_with_metadata(pdf_path)
+    # Fenêtre bornée de tâches en cours, consommées dans l'ordre
+    max_inflight = max(workers, 1) * 2
+    pending = units()
+    inflight: deque = deque()
+    try:
+        for unit in pending:
+            inflight.append(schedule(unit))
+            if len(inflight) >= max_inflight:
+                break
+        
+        current = None
+        while inflight:
+            file_index, from_cache, result = inflight.popleft()
+            docs, image_pages, failed, elapsed = result()
+            next_unit = next(pending, None)
+            if next_unit is not None:
+                inflight.append(schedule(next_unit))
+            
+            if current is None or file_index != current[0]:
+                if current is not None:
+                    yield finish(*current)
+                # (index, documents, depuis le cache, incomplet, durée)
+                current = [file_index, [], from_cache, False, 0.0]
+            current[1].extend(docs)
+            current[4] += elapsed
+            if failed or (image_pages and ocr.engine is None):
+                # Pages illisibles ou image non reconnues : ne pas mettre ce fichier en cache
+                current[3] = True
+            ocr.submit(file_index, pdf_paths[file_index], image_pages)
+        
+        if current is not None:
+            yield finish(*current)
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+        ocr.shutdown()
+
+
+def ingest_all_pdfs(
+    pdf_folder: Path,
+    workers: Optional[int] = None,
+    timings: Optional[Dict[str, float]] = None,
+    use_cache: bool = True,
+    ocr_fallback: Optional[bool] = None
+) -> List[Document]:
+    """
+    Ingère tous les PDFs d'un dossier, en parallèle sur plusieurs processus.
+    
+    Les PDFs (et les tranches de pages des gros PDFs) sont répartis sur un
+    pool de processus. Les documents sont renvoyés dans un ordre stable
+    (nom de fichier, puis numéro de page), quel que soit l'ordre d'exécution.
+    Les PDFs inchangés depuis la dernière extraction sont servis par le
+    cache d'extraction sans être relus. Les pages sans texte mais contenant
+    des images (scans) sont passées à l'OCR en arrière-plan et réintégrées
+    au flux de documents avec leurs métadonnées de page.
+    
+    Pour les gros corpus, préférer `iter_pdf_documents` qui ne garde pas
+    tous les documents en mémoire.
+    
+    Args:
+        pdf_folder: Dossier contenant les PDFs
+        workers: Nombre de processus (défaut: config.INGEST_WORKERS ou nb de cœurs,
+            1 = extraction séquentielle)
+        timings: Dictionnaire optionnel rempli avec le temps d'extraction
+            (secondes cumulées) de chaque fichier
+        use_cache: Utiliser le cache d'extraction par empreinte de fichier
+        ocr_fallback: OCR automatique des pages image (défaut: config.OCR_FALLBACK_ENABLED)
+        
+    Returns:
+        Liste de tous les documents extraits
+    """
+    wall_start = time.perf_counter()
+    all_documents = []
+    num_files = 0
+    for _, docs in iter_pdf_documents(pdf_folder, workers, timings, use_cache, ocr_fallback):
         all_documents.extend(docs)
+        num_files += 1
     
-    logger.info(f"✅ Ingestion terminée: {len(all_documents)} documents extraits de {len(list(pdf_folder.glob('*.pdf')))} PDFs")
+    ocr_pages = sum(1 for doc in all_documents if doc.metadata.get('extraction') == "ocr")
+    if ocr_pages:
+        logger.info(f"✅ {ocr_pages} pages scannées récupérées par OCR")
+    
+    logger.info(f"✅ Ingestion terminée: {len(all_documents)} documents extraits de {num_files} PDFs "
+                f"en {time.perf_counter() - wall_start:.2f}s")
     
     return all_documents
 
 
+def ingest_pdfs_enhanced(pdf_folder: Path, output_folder: Path = None, save_txt: bool = False) -> List[Document]:
+    """
+    Ingère tous les PDFs et sauvegarde optionnellement le texte de chaque PDF.
+    
+    Args:
+        pdf_folder: Dossier contenant les PDFs
+        output_folder: Dossier de sortie des fichiers .txt
+        save_txt: Si True, écrit un fichier <nom>.txt par PDF
+        
+    Returns:
+        Liste de tous les documents extraits
+    """
+    documents = ingest_all_pdfs(Path(pdf_folder))
+    
+    if save_txt and output_folder is not None:
+        output_folder = Path(output_folder)
+        output_folder.mkdir(parents=True, exist_ok=True)
+        
+        pages_by_source: Dict[str, List[str]] = {}
+        for doc in documents:
+            pages_by_source.setdefault(doc.metadata['source'], []).append(doc.page_content)
+        
+        for source, pages in pages_by_source.items():
+            out_path = output_folder / (Path(source).stem + ".txt")
+            out_path.write_text("\n\n".join(pages), encoding="utf-8")
+        
+        logger.info(f"Textes sauvegardés dans {output_folder} ({len(pages_by_source)} fichiers)")
+    
+    return documents
+
+
 if __name__ == "__main__":
     # Chemins
     pdf_dir = Path(__file__).resolve().parents[2] / "Réglements"
@@ -5,10 +5,14 @@ Utilise Tesseract OCR pour extraire le texte des images
 """
 import os
 from pathlib import Path
-from pypdf import PdfReader
 import subprocess
 import sys
 
+sys.path.append(str(Path(__file__).parents[1]))
+
+from scraper.extraction_cache import KIND_OCR_TEXT, extract_raw_pages, get_shared_cache
+from scraper.ocr_engine import OCREngine, count_pages
+
 # Vérifier si les dépendances OCR sont installées
 def check_dependencies():
     """Vérifie que Tesseract et les bibliothèques sont installées."""
@@ -51,25 +55,23 @@ def check_dependencies():
     return True
 
 
-def extract_with_ocr(pdf_path: Path) -> str:
-    """Extrait le texte d'un PDF scanné via OCR."""
+def extract_with_ocr(pdf_path: Path, output_path: Path = None) -> str:
+    """
+    Extrait le texte d'un PDF scanné via OCR.
+    
+    Les pages sont rendues une à une et reconnues en parallèle (voir
+    `scraper.ocr_engine`) : la mémoire reste bornée quel que soit le nombre
+    de pages. Si `output_path` est fourni, le texte y est écrit au fil de l'eau.
+    """
     try:
-        from pdf2image import convert_from_path
-        import pytesseract
-        
-        print(f"   📸 Conversion en images...")
-        images = convert_from_path(str(pdf_path))
-        
-        text = ""
-        total_pages = len(images)
-        
-        for i, image in enumerate(images, 1):
-            print(f"   🔤 OCR page {i}/{total_pages}...", end='\r')
-            page_text = pytesseract.image_to_string(image, lang='fra')
-            text += page_text + "\n\n"
+        with OCREngine() as engine:
+            total_pages = count_pages(pdf_path)
+            print(f"   🔤 OCR de {total_pages} pages sur {engine.workers} processus...")
+            
+            text = engine.ocr_text(pdf_path, pages=range(1, total_pages + 1), output_path=output_path)
         
         print(f"   ✅ OCR terminé ({total_pages} pages)")
-        return text.strip()
+        return text
         
     except Exception as e:
         print(f"   ❌ Erreur OCR : {e}")
@@ -106,10 +108,9 @@ def process_empty_pdfs():
         
         print(f"🔍 Traitement : {pdf_name}")
         
-        # Vérifier d'abord l'extraction classique
+        # Vérifier d'abord l'extraction classique (servie par le cache si inchangé)
         try:
-            reader = PdfReader(str(pdf_path))
-            text = "\n".join(page.extract_text() or "" for page in reader.pages)
+            text = "\n".join(extract_raw_pages(pdf_path))
             
             if len(text.strip()) > 100:
                 print(f"   ℹ️  Extraction classique suffisante ({len(text)} caractères)")
@@ -121,8 +122,15 @@ def process_empty_pdfs():
         except Exception as e:
             print(f"   ⚠️  Extraction classique échouée : {e}")
         
-        # OCR nécessaire
-        text = extract_with_ocr(pdf_path)
+        # OCR nécessaire (résultat mis en cache par empreinte du PDF)
+        cache = get_shared_cache()
+        text = cache.get(pdf_path, KIND_OCR_TEXT)
+        if text is not None:
+            print(f"   ♻️  Texte OCR repris du cache")
+        else:
+            text = extract_with_ocr(pdf_path)
+            if len(text) >= 100:
+                cache.put(pdf_path, KIND_OCR_TEXT, text)
         
         if len(text) < 100:
             print(f"   ❌ OCR insuffisant ({len(text)} caractères)")
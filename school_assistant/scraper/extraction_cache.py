@@ -0,0 +1,188 @@
+"""
+Cache d'extraction des PDFs, indexé par empreinte de fichier.
+
+L'empreinte d'un PDF est (taille, date de modification, SHA-256). Si la taille
+et la date n'ont pas changé, le SHA-256 mémorisé est réutilisé sans relire le
+fichier ; sinon le fichier est haché à nouveau. Les extractions sont stockées
+par SHA-256 dans une base SQLite (JSON compressé zlib) : un PDF inchangé n'est
+jamais relu par pypdf ni repassé à l'OCR.
+"""
+import hashlib
+import json
+import sqlite3
+import sys
+import threading
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Any, List, Optional
+
+from langchain_core.documents import Document
+
+# Ajouter le chemin parent pour importer les utils
+sys.path.append(str(Path(__file__).parents[1]))
+
+from utils.logger import setup_logger
+import config
+
+logger = setup_logger("extraction_cache")
+
+# Espaces de noms des extractions (incrémenter la version si le traitement change)
+KIND_DOCUMENTS = "documents:v2"   # Documents nettoyés de enhanced_ingest (pages OCR incluses)
+KIND_RAW_PAGES = "raw_pages:v1"   # Texte brut pypdf, une entrée par page
+KIND_OCR_TEXT = "ocr_text:v1"     # Texte OCR complet du fichier
+
+
+def file_sha256(path: Path, block_size: int = 1 << 20) -> str:
+    """Calcule le SHA-256 d'un fichier par blocs."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    """Cache persistant des extractions de PDFs."""
+
+    def __init__(self, cache_path: Path = None):
+        self.cache_path = Path(cache_path or config.EXTRACTION_CACHE_PATH)
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.cache_path), timeout=30, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                sha256 TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS extractions (
+                sha256 TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                payload BLOB NOT NULL,
+                created_at TEXT NOT NULL,
+                PRIMARY KEY (sha256, kind)
+            );
+        """)
+        self.hits = 0
+        self.misses = 0
+
+    def fingerprint(self, pdf_path: Path) -> str:
+        """
+        Retourne le SHA-256 du fichier, sans le relire si taille et date sont inchangées.
+
+        Args:
+            pdf_path: Chemin du PDF
+
+        Returns:
+            SHA-256 hexadécimal
+        """
+        pdf_path = Path(pdf_path).resolve()
+        stat = pdf_path.stat()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime_ns, sha256 FROM files WHERE path = ?", (str(pdf_path),)
+            ).fetchone()
+        if row and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            return row[2]
+
+        sha256 = file_sha256(pdf_path)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files (path, size, mtime_ns, sha256) VALUES (?, ?, ?, ?)",
+                (str(pdf_path), stat.st_size, stat.st_mtime_ns, sha256)
+            )
+        return sha256
+
+    def get(self, pdf_path: Path, kind: str) -> Optional[Any]:
+        """
+        Retourne l'extraction en cache pour ce PDF, ou None.
+
+        Args:
+            pdf_path: Chemin du PDF
+            kind: Type d'extraction (KIND_*)
+        """
+        sha256 = self.fingerprint(pdf_path)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload FROM extractions WHERE sha256 = ? AND kind = ?", (sha256, kind)
+            ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(zlib.decompress(row[0]).decode("utf-8"))
+
+    def put(self, pdf_path: Path, kind: str, value: Any) -> None:
+        """
+        Enregistre une extraction pour ce PDF.
+
+        Args:
+            pdf_path: Chemin du PDF
+            kind: Type d'extraction (KIND_*)
+            value: Données sérialisables en JSON
+        """
+        sha256 = self.fingerprint(pdf_path)
+        payload = zlib.compress(json.dumps(value, ensure_ascii=False, default=str).encode("utf-8"))
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO extractions (sha256, kind, payload, created_at) VALUES (?, ?, ?, ?)",
+                (sha256, kind, payload, datetime.now().isoformat())
+            )
+
+    def get_documents(self, pdf_path: Path) -> Optional[List[Document]]:
+        """Retourne les documents (pages nettoyées + métadonnées) en cache."""
+        pages = self.get(pdf_path, KIND_DOCUMENTS)
+        if pages is None:
+            return None
+        documents = []
+        for page in pages:
+            metadata = dict(page["metadata"])
+            # Le même contenu peut avoir été renommé
+            metadata["source"] = Path(pdf_path).name
+            documents.append(Document(page_content=page["text"], metadata=metadata))
+        return documents
+
+    def put_documents(self, pdf_path: Path, documents: List[Document]) -> None:
+        """Enregistre les documents extraits d'un PDF."""
+        self.put(pdf_path, KIND_DOCUMENTS, [
+            {"text": doc.page_content, "metadata": doc.metadata} for doc in documents
+        ])
+
+
+_shared_cache: Optional[ExtractionCache] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_cache() -> ExtractionCache:
+    """Retourne le cache d'extraction partagé du processus."""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = ExtractionCache()
+        return _shared_cache
+
+
+def extract_raw_pages(pdf_path: Path, cache: Optional[ExtractionCache] = None) -> List[str]:
+    """
+    Retourne le texte brut de chaque page (pypdf), via le cache d'extraction.
+
+    Args:
+        pdf_path: Chemin du PDF
+        cache: Cache à utiliser (cache partagé par défaut)
+
+    Returns:
+        Liste des textes de page ("" pour une page sans texte)
+    """
+    from pypdf import PdfReader
+
+    cache = cache or get_shared_cache()
+    pages = cache.get(pdf_path, KIND_RAW_PAGES)
+    if pages is not None:
+        return pages
+
+    reader = PdfReader(str(pdf_path))
+    pages = [page.extract_text() or "" for page in reader.pages]
+    cache.put(pdf_path, KIND_RAW_PAGES, pages)
+    return pages
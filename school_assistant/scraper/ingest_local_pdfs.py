@@ -1,6 +1,10 @@
 import os
+import sys
 from pathlib import Path
-from pypdf import PdfReader
+
+sys.path.append(str(Path(__file__).parents[1]))
+
+from scraper.extraction_cache import extract_raw_pages
 
 def ingest_pdfs(pdf_folder: Path, output_folder: Path) -> None:
     """Parcourt tous les *.pdf* du dossier `pdf_folder`, extrait le texte et le sauvegarde.
@@ -20,9 +24,8 @@ def ingest_pdfs(pdf_folder: Path, output_folder: Path) -> None:
     for pdf_path in pdf_folder.glob("*.pdf"):
         print(f"🔎 Extraction de {pdf_path.name}")
         try:
-            reader = PdfReader(str(pdf_path))
-            # concatène le texte de chaque page
-            text = "\n".join(page.extract_text() or "" for page in reader.pages)
+            # concatène le texte de chaque page (pages servies par le cache si le PDF n'a pas changé)
+            text = "\n".join(extract_raw_pages(pdf_path))
             txt_name = pdf_path.stem + ".txt"
             out_path = output_folder / txt_name
             out_path.write_text(text, encoding="utf-8")
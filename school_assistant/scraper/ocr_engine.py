@@ -0,0 +1,204 @@
+"""
+Moteur OCR parallèle, page par page.
+
+Chaque page est rendue individuellement (pdf2image, `first_page`/`last_page`)
+puis passée à Tesseract dans un processus de travail : aucun processus ne
+garde plus d'une image de page en mémoire, quel que soit le nombre de pages.
+Le nombre de pages en cours est borné et les résultats sont restitués dans
+l'ordre des pages, ce qui permet d'écrire le texte au fil de l'eau.
+
+Le texte OCR de chaque page est mis en cache par empreinte de l'image rendue :
+une page déjà reconnue n'est jamais repassée à Tesseract.
+"""
+import hashlib
+import multiprocessing
+import os
+import sys
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+# Ajouter le chemin parent pour importer les utils
+sys.path.append(str(Path(__file__).parents[1]))
+
+from utils.logger import setup_logger
+import config
+
+logger = setup_logger("ocr_engine")
+
+
+def ocr_available() -> bool:
+    """Indique si pdf2image et pytesseract sont installés."""
+    try:
+        import pdf2image  # noqa: F401
+        import pytesseract  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def count_pages(pdf_path: Path) -> int:
+    """Nombre de pages d'un PDF (sans rendre les pages)."""
+    from pypdf import PdfReader
+
+    return len(PdfReader(str(pdf_path)).pages)
+
+
+def _cache_path(cache_dir: Path, key: str) -> Path:
+    return cache_dir / key[:2] / f"{key}.txt"
+
+
+def ocr_page(pdf_path: str, page_number: int, lang: str, dpi: int, cache_dir: str) -> Tuple[int, str]:
+    """
+    Rend et reconnaît une seule page (exécuté dans un processus de travail).
+
+    Args:
+        pdf_path: Chemin du PDF
+        page_number: Numéro de page (1-indexed)
+        lang: Langue Tesseract
+        dpi: Résolution de rendu
+        cache_dir: Dossier du cache OCR par page
+
+    Returns:
+        Tuple (numéro de page, texte reconnu)
+    """
+    # Tesseract est lui-même multithreadé : un seul thread par processus
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+    from pdf2image import convert_from_path
+    import pytesseract
+
+    image = convert_from_path(pdf_path, dpi=dpi, first_page=page_number, last_page=page_number)[0]
+    try:
+        digest = hashlib.sha256()
+        digest.update(f"{lang}|{image.mode}|{image.size}".encode())
+        digest.update(image.tobytes())
+        cache_file = _cache_path(Path(cache_dir), digest.hexdigest())
+
+        if cache_file.exists():
+            return page_number, cache_file.read_text(encoding="utf-8")
+
+        text = pytesseract.image_to_string(image, lang=lang)
+
+        # Écriture atomique : plusieurs processus peuvent partager le cache
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+        tmp_file.write_text(text, encoding="utf-8")
+        tmp_file.replace(cache_file)
+        return page_number, text
+    finally:
+        image.close()
+
+
+class OCREngine:
+    """Pool de processus OCR avec rendu page par page."""
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        lang: str = None,
+        dpi: int = None,
+        cache_dir: Path = None
+    ):
+        self.workers = workers or config.OCR_WORKERS or os.cpu_count() or 1
+        self.lang = lang or config.OCR_LANG
+        self.dpi = dpi or config.OCR_DPI
+        self.cache_dir = Path(cache_dir or config.OCR_CACHE_DIR)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        # Pages en cours au maximum : borne la mémoire utilisée
+        self.max_inflight = self.workers * config.OCR_MAX_INFLIGHT_PER_WORKER
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # Pas de fork : le moteur est aussi créé depuis le thread d'extraction du pipeline
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context(config.WORKER_START_METHOD)
+            )
+        return self._executor
+
+    def submit(self, pdf_path: Path, page_number: int) -> Future:
+        """
+        Planifie l'OCR d'une page en arrière-plan.
+
+        Args:
+            pdf_path: Chemin du PDF
+            page_number: Numéro de page (1-indexed)
+
+        Returns:
+            Future renvoyant (numéro de page, texte)
+        """
+        return self.executor.submit(
+            ocr_page, str(pdf_path), page_number, self.lang, self.dpi, str(self.cache_dir)
+        )
+
+    def iter_pages(self, pdf_path: Path, pages: Optional[Iterable[int]] = None) -> Iterator[Tuple[int, str]]:
+        """
+        Reconnaît les pages d'un PDF et les restitue dans l'ordre.
+
+        Args:
+            pdf_path: Chemin du PDF
+            pages: Numéros de page (1-indexed) à traiter (toutes par défaut)
+
+        Yields:
+            Tuples (numéro de page, texte)
+        """
+        if pages is None:
+            pages = range(1, count_pages(pdf_path) + 1)
+        pending = iter(pages)
+        inflight: deque = deque()
+
+        for page_number in pending:
+            inflight.append(self.submit(pdf_path, page_number))
+            if len(inflight) >= self.max_inflight:
+                break
+        while inflight:
+            yield inflight.popleft().result()
+            next_page = next(pending, None)
+            if next_page is not None:
+                inflight.append(self.submit(pdf_path, next_page))
+
+    def ocr_text(
+        self,
+        pdf_path: Path,
+        pages: Optional[Iterable[int]] = None,
+        output_path: Optional[Path] = None
+    ) -> str:
+        """
+        Reconnaît un PDF et renvoie le texte complet (pages séparées par une ligne vide).
+
+        Args:
+            pdf_path: Chemin du PDF
+            pages: Numéros de page (1-indexed) à traiter (toutes par défaut)
+            output_path: Fichier texte optionnel, écrit au fur et à mesure des pages
+
+        Returns:
+            Texte reconnu
+        """
+        parts: List[str] = []
+        out = open(output_path, "w", encoding="utf-8") if output_path else None
+        try:
+            for page_number, text in self.iter_pages(pdf_path, pages):
+                parts.append(text.strip())
+                if out:
+                    out.write(parts[-1] + "\n\n")
+                    out.flush()
+                logger.info(f"OCR {Path(pdf_path).name}: page {page_number} reconnue")
+        finally:
+            if out:
+                out.close()
+        return "\n\n".join(parts).strip()
+
+    def shutdown(self) -> None:
+        """Arrête le pool de processus."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
@@ -45,8 +45,9 @@ def split_into_sentences(text: str) -> List[str]:
     Returns:
         Liste de phrases
     """
-    # Pattern pour détecter les fins de phrases
-    sentence_pattern = r'(?<=[.!?])\s+(?=[A-Z])'
+    # Fin de phrase suivie d'une majuscule (accentuée comprise), ou début
+    # d'un élément de liste à la ligne
+    sentence_pattern = r'(?<=[.!?])\s+(?=[A-ZÀ-ÖØ-Þ«"(])|\n+\s*(?=[-•–*]\s)'
     sentences = re.split(sentence_pattern, text)
     return [s.strip() for s in sentences if s.strip()]
 
@@ -4,13 +4,14 @@ Script de test pour reconstruire l'index RAG avec les PDFs locaux
 """
 import os
 from pathlib import Path
-from pypdf import PdfReader
 from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import FAISS
 from langchain_community.embeddings import SentenceTransformerEmbeddings
 import re
 
+from school_assistant.scraper.extraction_cache import extract_raw_pages
+
 def preprocess_text(text: str) -> str:
     """Nettoie le texte extrait."""
     # Suppression des métadonnées web
@@ -32,12 +33,9 @@ def extract_pdfs():
     for pdf_path in pdf_dir.glob("*.[pP][dD][fF]"):  # Support .pdf et .PDF
         print(f"🔍 Traitement : {pdf_path.name}")
         try:
-            reader = PdfReader(str(pdf_path))
-            total_text = ""
-            
-            for page_num, page in enumerate(reader.pages):
-                text = page.extract_text() or ""
-                total_text += text + "\n"
+            # Pages servies par le cache d'extraction si le PDF n'a pas changé
+            pages = extract_raw_pages(pdf_path)
+            total_text = "\n".join(pages) + "\n"
             
             # Nettoyage
             clean_text = preprocess_text(total_text)
@@ -50,12 +48,12 @@ def extract_pdfs():
                 page_content=clean_text,
                 metadata={
                     "source": pdf_path.name,
-                    "num_pages": len(reader.pages),
+                    "num_pages": len(pages),
                     "char_count": len(clean_text)
                 }
             ))
             
-            print(f"   ✅ {len(reader.pages)} pages, {len(clean_text)} caractères")
+            print(f"   ✅ {len(pages)} pages, {len(clean_text)} caractères")
             
         except Exception as e:
             print(f"   ❌ Erreur : {e}")
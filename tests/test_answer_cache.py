@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Tests du cache sémantique des réponses
+Exécution : pytest tests/test_answer_cache.py -v
+"""
+import sys
+from pathlib import Path
+
+# Ajouter le chemin parent pour les imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from school_assistant.chatbot.answer_cache import AnswerCache
+
+ABSENCE = [1.0, 0.0, 0.0]
+ABSENCE_PARAPHRASE = [0.99, 0.1, 0.0]
+DRESS_CODE = [0.0, 1.0, 0.0]
+
+
+def make_cache(tmp_path, **kwargs):
+    return AnswerCache(tmp_path / "answers.sqlite3", threshold=0.95, **kwargs)
+
+
+class TestAnswerCache:
+    """Tests pour le cache des réponses."""
+
+    def test_paraphrase_hits_and_other_question_misses(self, tmp_path):
+        """Une question proche reçoit la réponse mémorisée, une autre non."""
+        cache = make_cache(tmp_path)
+        cache.store(tmp_path, "v1", "m", "Comment justifier une absence ?", ABSENCE,
+                    "Avec un certificat.", ["ROI.pdf"], "groq")
+
+        hit = cache.lookup(tmp_path, "v1", "m", ABSENCE_PARAPHRASE)
+        assert hit["answer"] == "Avec un certificat."
+        assert hit["sources"] == ["ROI.pdf"]
+        assert cache.lookup(tmp_path, "v1", "m", DRESS_CODE) is None
+        assert cache.lookup(tmp_path, "v2", "m", ABSENCE) is None
+
+    def test_index_update_drops_only_changed_sources(self, tmp_path):
+        """Après réindexation, seules les réponses citant une source modifiée disparaissent."""
+        cache = make_cache(tmp_path)
+        cache.store(tmp_path, "v1", "m", "absence", ABSENCE, "certificat", ["ROI.pdf"])
+        cache.store(tmp_path, "v1", "m", "tenue", DRESS_CODE, "uniforme", ["Dress.pdf"])
+
+        assert cache.on_index_updated(tmp_path, "v1", "v2", ["Dress.pdf"]) == {"kept": 1, "deleted": 1}
+        assert cache.lookup(tmp_path, "v2", "m", ABSENCE)["answer"] == "certificat"
+        assert cache.lookup(tmp_path, "v2", "m", DRESS_CODE) is None
+
+        cache.on_index_updated(tmp_path, "v2", "v3", None)
+        assert cache.stats()["entries"] == 0
+
+    def test_cache_is_persistent_and_bounded(self, tmp_path):
+        """Le cache survit à la réouverture et évince la réponse la moins récemment utilisée."""
+        cache = make_cache(tmp_path, max_entries=2)
+        cache.store(tmp_path, "v1", "m", "absence", ABSENCE, "certificat", ["ROI.pdf"])
+        cache.store(tmp_path, "v1", "m", "tenue", DRESS_CODE, "uniforme", ["Dress.pdf"])
+        cache.lookup(tmp_path, "v1", "m", ABSENCE)
+        cache.store(tmp_path, "v1", "m", "horaires", [0.0, 0.0, 1.0], "8h", ["ROI.pdf"])
+
+        reopened = make_cache(tmp_path, max_entries=2)
+        assert reopened.lookup(tmp_path, "v1", "m", ABSENCE) is not None
+        assert reopened.lookup(tmp_path, "v1", "m", DRESS_CODE) is None
+        assert reopened.stats()["entries"] == 2
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Tests de la décision d'appeler le LLM selon les scores de la recherche
+Exécution : pytest tests/test_answer_gating.py -v
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+# Ajouter le chemin parent pour les imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from langchain_core.documents import Document
+
+from school_assistant.chatbot import answer_gating
+from school_assistant.chatbot.answer_gating import (
+    EXTRACTIVE, LLM, NOT_FOUND, GatingPolicy, dense_scored, scored_search
+)
+
+
+class FakeStore:
+    """Base factice : renvoie des distances L2 au carré, comme FAISS."""
+
+    def __init__(self, results):
+        self.results = results
+
+    def similarity_search_with_score(self, question, k):
+        return self.results[:k]
+
+
+class FakeCollection:
+    def __init__(self, metadata):
+        self.metadata = metadata
+
+
+class FakeCosineChroma(FakeStore):
+    """Chroma créée avec {"hnsw:space": "cosine"} : distance = 1 - cos."""
+
+    def __init__(self, results):
+        super().__init__(results)
+        self._collection = FakeCollection({"hnsw:space": "cosine"})
+
+
+def chunk(score, doc_type="roi"):
+    return Document(page_content="Toute absence doit être justifiée.",
+                    metadata={"source": "roi.pdf", "page": 2, "doc_type": doc_type, "score": score})
+
+
+class TestScoredSearch:
+    """Tests pour la conversion des distances en similarité cosinus."""
+
+    def test_scores_are_cosine_sorted_and_metadata_copied(self):
+        """Distance 0 → 1.0, distance 2 → 0.0 ; les documents de la base ne sont pas modifiés."""
+        far = Document(page_content="Cantine", metadata={"source": "a.pdf"})
+        near = Document(page_content="Absences", metadata={"source": "b.pdf"})
+        docs = scored_search(FakeStore([(far, 2.0), (near, 0.0)]), "absence", k=2)
+        assert [doc.page_content for doc in docs] == ["Absences", "Cantine"]
+        assert [doc.metadata['score'] for doc in docs] == [1.0, 0.0]
+        assert 'score' not in near.metadata
+
+    def test_cosine_space_chroma(self, monkeypatch):
+        """En espace cosinus, la distance 0.2 vaut cos 0.8 (et non 0.9) et ne déclenche pas de réponse directe."""
+        monkeypatch.setattr(answer_gating.config, "LLM_GATING_ENABLED", True)
+        monkeypatch.setattr(answer_gating.config, "LLM_GATING_THRESHOLDS", {
+            "default": {"min_score": 0.25, "direct_score": 0.88},
+        })
+        near = Document(page_content="Absences", metadata={"source": "b.pdf"})
+        docs = scored_search(FakeCosineChroma([(near, 0.2)]), "absence", k=1)
+        assert docs[0].metadata['score'] == pytest.approx(0.8)
+        assert GatingPolicy().decide(docs) == LLM
+
+        far = scored_search(FakeCosineChroma([(near, 1.5)]), "absence", k=1)
+        assert far[0].metadata['score'] == pytest.approx(-0.5)
+        assert GatingPolicy().decide(far) == NOT_FOUND
+
+
+    def test_retriever_results_are_gated_on_dense_score(self, monkeypatch):
+        """Résultats hybrides : le score fusionné est ignoré, le meilleur cosinus décide ; BM25 seul → LLM."""
+        monkeypatch.setattr(answer_gating.config, "LLM_GATING_ENABLED", True)
+        monkeypatch.setattr(answer_gating.config, "LLM_GATING_THRESHOLDS", {
+            "default": {"min_score": 0.3, "direct_score": 0.9},
+        })
+        hybrid = [Document(page_content="Cantine", metadata={"score": 0.9, "dense_score": 0.2}),
+                  Document(page_content="Absences", metadata={"score": 0.7, "dense_score": 0.95})]
+        docs = dense_scored(hybrid)
+        assert [doc.page_content for doc in docs] == ["Absences", "Cantine"]
+        assert GatingPolicy().decide(docs) == EXTRACTIVE
+        assert hybrid[0].metadata['score'] == 0.9
+
+        assert GatingPolicy().decide(dense_scored(hybrid[:1])) == NOT_FOUND
+        lexical = [Document(page_content="Absences", metadata={"lexical_score": 7.2})]
+        assert GatingPolicy().decide(dense_scored(lexical)) == LLM
+
+
+class TestGatingPolicy:
+    """Tests pour les seuils par type de document et le comptage des appels évités."""
+
+    def test_decisions_follow_doc_type_thresholds(self, monkeypatch):
+        """Un type sans réglage reprend "default" ; un type réglé remplace seulement ses valeurs."""
+        monkeypatch.setattr(answer_gating.config, "LLM_GATING_ENABLED", True)
+        monkeypatch.setattr(answer_gating.config, "LLM_GATING_THRESHOLDS", {
+            "default": {"min_score": 0.3, "direct_score": 0.9},
+            "Protocole": {"direct_score": 0.8},
+        })
+        policy = GatingPolicy()
+        assert policy.decide([chunk(0.2)]) == NOT_FOUND
+        assert policy.decide([chunk(0.5)]) == LLM
+        assert policy.decide([chunk(0.85)]) == LLM
+        assert policy.decide([chunk(0.85, doc_type="protocole")]) == EXTRACTIVE
+        assert policy.decide([]) == NOT_FOUND
+
+        stats = policy.stats()
+        assert (stats[LLM], stats[NOT_FOUND], stats[EXTRACTIVE]) == (2, 2, 1)
+        assert stats["avoided"] == 3
+        assert stats["avoided_rate"] == 0.6
+
+    def test_disabled_gating_always_calls_llm(self, monkeypatch):
+        """Sans filtrage, seuls les résultats vides évitent l'appel."""
+        monkeypatch.setattr(answer_gating.config, "LLM_GATING_ENABLED", False)
+        policy = GatingPolicy()
+        assert policy.decide([chunk(0.05)]) == LLM
+        assert policy.decide([chunk(0.99)]) == LLM
+
+    def test_extractive_answer_cites_source(self):
+        """La réponse directe reprend le meilleur extrait et sa page."""
+        answer = answer_gating.extractive_answer([chunk(0.95)])
+        assert answer.startswith("Toute absence doit être justifiée.")
+        assert answer.endswith("Source : roi.pdf, page 2")
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Tests de l'index BM25 précalculé
+Exécution : pytest tests/test_bm25_index.py -v
+"""
+import sys
+from pathlib import Path
+
+# Ajouter le chemin parent pour les imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from school_assistant.chatbot.bm25_index import (
+    BM25IndexBuilder,
+    PrebuiltBM25Retriever,
+    load_bm25_index,
+)
+
+TEXTS = [
+    "Toute absence doit être justifiée par un certificat médical.",
+    "Le GSM est interdit pendant les cours et à l'atelier.",
+    "Les horaires de cours commencent à 8h20.",
+]
+
+
+def build(tmp_path, version="v1"):
+    builder = BM25IndexBuilder()
+    builder.add(TEXTS, [{"source": f"doc{i}.pdf"} for i in range(len(TEXTS))])
+    return builder.save(tmp_path / "bm25", index_version=version)
+
+
+class TestBM25Index:
+    """Tests pour la construction et la recherche BM25."""
+
+    def test_top_result_matches_query_terms(self, tmp_path):
+        """Le document contenant les termes de la requête arrive en tête."""
+        index = load_bm25_index(build(tmp_path), expected_version="v1")
+
+        results = index.top_k("justifier une absence certificat", k=2)
+
+        assert results[0][0] == 0
+        assert index.get_document(0).page_content == TEXTS[0]
+        assert index.get_document(0).metadata["source"] == "doc0.pdf"
+
+    def test_stale_version_is_ignored(self, tmp_path):
+        """Un index construit pour une autre version de la base est ignoré."""
+        index_dir = build(tmp_path, version="v1")
+
+        assert load_bm25_index(index_dir, expected_version="v2") is None
+        assert load_bm25_index(tmp_path / "absent", expected_version="v1") is None
+
+    def test_retriever_returns_documents(self, tmp_path):
+        """Le retriever LangChain renvoie des Documents."""
+        index = load_bm25_index(build(tmp_path), expected_version="v1")
+        retriever = PrebuiltBM25Retriever(index=index, k=1)
+
+        docs = retriever.invoke("GSM atelier")
+
+        assert len(docs) == 1
+        assert docs[0].metadata["source"] == "doc1.pdf"
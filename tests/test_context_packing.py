@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Tests de l'assemblage du contexte du prompt (fusion des chunks, compression, budget de tokens)
+Exécution : pytest tests/test_context_packing.py -v
+"""
+import sys
+from pathlib import Path
+
+# Ajouter le chemin parent pour les imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from school_assistant.chatbot.context_packing import merge_chunks, pack_context
+from school_assistant.chatbot.context_compression import compress_documents
+
+
+def count_words(text):
+    """Compteur de tokens déterministe pour les tests."""
+    return len(text.split())
+
+
+def split(text, source="roi.pdf", page=1):
+    splitter = RecursiveCharacterTextSplitter(chunk_size=200, chunk_overlap=60)
+    return splitter.split_documents([Document(page_content=text, metadata={"source": source, "page": page})])
+
+
+TEXT = " ".join(f"Article {i} : l'élève justifie toute absence dans les trois jours." for i in range(30))
+
+
+class TestMergeChunks:
+    """Tests pour la fusion des chunks qui se recouvrent."""
+
+    def test_overlapping_chunks_are_merged_in_text_order(self):
+        """Des chunks voisins (récupérés dans le désordre) redonnent le texte d'origine, sans répétition."""
+        chunks = split(TEXT)
+        merged = merge_chunks([chunks[4], chunks[2], chunks[3], chunks[3]])
+        assert len(merged) == 1
+        assert merged[0].metadata['merged_chunks'] == 4
+        assert merged[0].page_content.startswith(chunks[2].page_content)
+        assert merged[0].page_content.endswith(chunks[4].page_content)
+        assert merged[0].page_content in TEXT
+
+    def test_other_sources_and_pages_are_kept_apart(self):
+        """Un texte identique sur une autre page n'est pas fusionné."""
+        first = split(TEXT, page=1)[0]
+        other_page = split(TEXT, page=2)[0]
+        consecutive = [Document(page_content="Début du passage.", metadata={"source": "rge.pdf", "chunk_id": 7}),
+                       Document(page_content="Suite du passage.", metadata={"source": "rge.pdf", "chunk_id": 8})]
+        merged = merge_chunks([first, other_page, consecutive[1], consecutive[0]])
+        assert [doc.metadata['merged_chunks'] for doc in merged] == [1, 1, 2]
+        assert merged[2].page_content == "Début du passage.\nSuite du passage."
+
+
+class TestPackContext:
+    """Tests pour le remplissage du budget de tokens."""
+
+    def test_budget_is_filled_in_score_order(self):
+        """Les passages les plus pertinents passent d'abord, les suivants trop longs sont écartés."""
+        docs = [
+            Document(page_content="un deux trois", metadata={"source": "a.pdf"}),
+            Document(page_content=" ".join(["long"] * 50), metadata={"source": "b.pdf"}),
+            Document(page_content="quatre cinq", metadata={"source": "c.pdf"}),
+        ]
+        packed = pack_context(docs, token_budget=10, separator=" | ", count_tokens=count_words)
+        assert packed.text == "un deux trois | quatre cinq"
+        assert packed.tokens <= 10
+        assert packed.dropped == 1
+        assert packed.saved_tokens == packed.raw_tokens - packed.tokens
+
+    def test_duplicate_overlap_saves_tokens(self):
+        """Les chevauchements ne sont comptés qu'une fois ; le premier passage est tronqué si nécessaire."""
+        chunks = split(TEXT)[:4]
+        packed = pack_context(chunks, token_budget=10_000, count_tokens=count_words)
+        assert len(packed.documents) == 1
+        assert packed.saved_tokens > 0
+
+        truncated = pack_context(chunks, token_budget=20, count_tokens=count_words)
+        assert truncated.tokens <= 20
+        assert truncated.text.endswith("…")
+
+
+class KeywordEmbeddings:
+    """Embeddings factices : une dimension par mot-clé."""
+
+    KEYWORDS = ["absence", "retard", "cantine", "sport"]
+
+    def embed_documents(self, texts):
+        self.calls = getattr(self, "calls", 0) + 1
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        lowered = text.lower()
+        return [float(keyword in lowered) + 0.01 for keyword in self.KEYWORDS]
+
+
+class TestCompression:
+    """Tests pour la compression extractive du contexte."""
+
+    def test_keeps_best_sentences_with_neighbours_and_metadata(self):
+        """Phrases pertinentes + voisines, dans l'ordre, en un seul lot d'embeddings ; source conservée."""
+        embeddings = KeywordEmbeddings()
+        docs = [
+            Document(page_content="La cantine ouvre à midi. Le menu est affiché. Toute absence doit être "
+                                  "justifiée. Le justificatif est remis au secrétariat. Le sport a lieu le jeudi.",
+                     metadata={"source": "roi.pdf", "page": 3}),
+            Document(page_content="Le sport est obligatoire. Les tenues sont fournies.",
+                     metadata={"source": "rge.pdf", "page": 1}),
+        ]
+        compressed = compress_documents(embeddings.embed_query("Comment justifier une absence ?"),
+                                        docs, embeddings, top_sentences=1, neighbours=1)
+        assert embeddings.calls == 1
+        assert len(compressed) == 1
+        assert compressed[0].page_content == ("Le menu est affiché. Toute absence doit être justifiée. "
+                                              "Le justificatif est remis au secrétariat.")
+        assert compressed[0].metadata['source'] == "roi.pdf"
+        assert compressed[0].metadata['sentences_kept'] == "3/5"
+
+    def test_gaps_are_marked_and_packing_uses_compression(self):
+        """Les phrases non contiguës sont séparées par « … » ; pack_context applique l'étape."""
+        embeddings = KeywordEmbeddings()
+        doc = Document(page_content="Absence du matin. La cantine ouvre. Le menu varie. Le sport. Retard ou absence.",
+                       metadata={"source": "roi.pdf"})
+        query = embeddings.embed_query("absence")
+        packed = pack_context([doc], count_tokens=count_words,
+                              compress=lambda docs: compress_documents(query, docs, embeddings,
+                                                                       top_sentences=2, neighbours=0))
+        assert packed.text == "Absence du matin. … Retard ou absence."
+        assert packed.saved_tokens > 0
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Tests de la réduction de dimension des embeddings stockés
+Exécution : pytest tests/test_dimension_reduction.py -v
+"""
+import sys
+from pathlib import Path
+
+import numpy as np
+
+# Ajouter le chemin parent pour les imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from school_assistant.chatbot.dimension_reduction import Projection, fit_projection
+from school_assistant.chatbot import numpy_store
+from school_assistant.chatbot.numpy_store import NumpyVectorStore, open_or_export, save_numpy_store
+
+COUNT, DIM, RANK = 300, 48, 6
+
+
+def corpus(seed=4):
+    """Vecteurs proches d'un sous-espace de faible rang, comme des embeddings de phrases."""
+    rng = np.random.default_rng(seed)
+    basis = rng.standard_normal((RANK, DIM))
+    vectors = rng.standard_normal((COUNT, RANK)) @ basis + 0.01 * rng.standard_normal((COUNT, DIM))
+    queries = rng.standard_normal((10, RANK)) @ basis
+    return vectors.astype(np.float32), queries.astype(np.float32)
+
+
+class QueryEmbeddings:
+    """Embeddings factices : la question est déjà un vecteur."""
+
+    def __init__(self, queries):
+        self.queries = queries
+
+    def embed_query(self, text):
+        return self.queries[int(text)].tolist()
+
+
+class FakeChroma:
+    """Base d'origine factice, au format de `Chroma.get`."""
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+        self.exports = 0
+
+    def get(self, include=None):
+        self.exports += 1
+        return {"ids": [str(i) for i in range(COUNT)], "documents": [f"Chunk {i}" for i in range(COUNT)],
+                "metadatas": [{} for _ in range(COUNT)], "embeddings": self.vectors}
+
+
+class TestDimensionReduction:
+    """Tests pour la projection PCA stockée avec la base NumPy."""
+
+    def test_pca_keeps_neighbours_of_low_rank_corpus(self):
+        """Sur un corpus de faible rang, la PCA garde la variance et les plus proches voisins."""
+        vectors, queries = corpus()
+        projection = fit_projection(vectors, RANK)
+        unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+        assert projection.explained_variance > 0.99
+        for query in queries:
+            exact = np.argsort(-(unit @ query))[:5]
+            reduced = np.argsort(-(projection.transform(vectors) @ projection.transform(query)))[:5]
+            assert exact.tolist() == reduced.tolist()
+
+    def test_store_projects_documents_and_queries(self, tmp_path):
+        """La base stocke les vecteurs réduits ; questions brutes ou réduites donnent le même résultat."""
+        vectors, queries = corpus()
+        store_dir = save_numpy_store(tmp_path / "store", [str(i) for i in range(COUNT)],
+                                     [f"Chunk {i}" for i in range(COUNT)], [{} for _ in range(COUNT)],
+                                     vectors, "model", reduce_dim=8)
+        store = NumpyVectorStore(store_dir, QueryEmbeddings(queries))
+
+        assert store.vectors.shape == (COUNT, 8)
+        assert store.manifest["reduction"] == {"method": "pca", "dim": 8, "source_dim": DIM}
+        reduced_query = store.embeddings.embed_query("0")
+        assert len(reduced_query) == 8
+        assert store.search_vectors(reduced_query, 5)[0].tolist() == store.search_vectors(queries[0], 5)[0].tolist()
+        assert store.similarity_search("0", k=1)[0].page_content == f"Chunk {store.search_vectors(queries[0], 1)[0][0]}"
+        assert len(store.max_marginal_relevance_search("0", k=3, fetch_k=10)) == 3
+
+    def test_export_follows_reduction_setting(self, tmp_path, monkeypatch):
+        """Changer la dimension réduite dans la configuration provoque un nouvel export."""
+        vectors, queries = corpus()
+        native = FakeChroma(vectors)
+        monkeypatch.setattr(numpy_store.config, "EMBEDDING_REDUCTION_DIM", 16)
+        store = open_or_export(tmp_path, QueryEmbeddings(queries), "model", "v1", lambda: native)
+        open_or_export(tmp_path, QueryEmbeddings(queries), "model", "v1", lambda: native)
+        assert store.vectors.shape[1] == 16 and native.exports == 1
+
+        monkeypatch.setattr(numpy_store.config, "EMBEDDING_REDUCTION_DIM", None)
+        store = open_or_export(tmp_path, QueryEmbeddings(queries), "model", "v1", lambda: native)
+        assert store.vectors.shape[1] == DIM and store.projection is None and native.exports == 2
+
+    def test_projection_file_is_closed_after_loading(self, tmp_path, monkeypatch):
+        """Le fichier de projection est lu puis refermé : aucun descripteur gardé par la base."""
+        vectors, _ = corpus()
+        path = tmp_path / "projection.npz"
+        fit_projection(vectors, 8).save(path)
+        opened = []
+        original = np.load
+        monkeypatch.setattr(np, "load", lambda *args, **kwargs: opened.append(original(*args, **kwargs)) or opened[-1])
+
+        projection = Projection.load(path)
+
+        assert projection.dim == 8 and projection.method == "pca"
+        npz, = opened
+        assert npz.fid is None
+
+    def test_export_is_reused_when_reduction_does_not_apply(self, tmp_path, monkeypatch):
+        """Une dimension cible au moins égale à celle du modèle n'entraîne pas d'export à chaque ouverture."""
+        vectors, queries = corpus()
+        native = FakeChroma(vectors)
+        monkeypatch.setattr(numpy_store.config, "EMBEDDING_REDUCTION_DIM", DIM)
+        open_or_export(tmp_path, QueryEmbeddings(queries), "model", "v1", lambda: native)
+        store = open_or_export(tmp_path, QueryEmbeddings(queries), "model", "v1", lambda: native)
+        assert store.projection is None and native.exports == 1
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Tests du registre de moteurs partagé
+Exécution : pytest tests/test_engine_registry.py -v
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+# Ajouter le chemin parent pour les imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from school_assistant.chatbot import engine_registry
+
+
+@pytest.fixture(autouse=True)
+def clean_registry():
+    engine_registry.clear()
+    yield
+    engine_registry.clear()
+
+
+class TestEngineRegistry:
+    """Tests pour le chargement unique et l'invalidation."""
+
+    def test_retriever_built_once(self, tmp_path):
+        """Le retriever n'est construit qu'une fois par configuration."""
+        calls = []
+        factory = lambda: calls.append(1) or object()
+
+        first = engine_registry.get_retriever(tmp_path, "model", "hybrid", factory)
+        second = engine_registry.get_retriever(tmp_path, "model", "hybrid", factory)
+
+        assert first is second
+        assert len(calls) == 1
+
+    def test_invalidate_forces_reload(self, tmp_path):
+        """Après invalidation, le retriever est reconstruit."""
+        first = engine_registry.get_retriever(tmp_path, "model", "hybrid", object)
+        assert engine_registry.invalidate(tmp_path) == 1
+
+        second = engine_registry.get_retriever(tmp_path, "model", "hybrid", object)
+        assert first is not second
+
+    def test_new_index_version_is_picked_up(self, tmp_path):
+        """Une version écrite par un autre processus provoque un rechargement."""
+        first = engine_registry.get_retriever(tmp_path, "model", "semantic", object)
+
+        (tmp_path / engine_registry.INDEX_VERSION_FILE).write_text("v2", encoding="utf-8")
+        assert engine_registry.read_index_version(tmp_path) == "v2"
+
+        second = engine_registry.get_retriever(tmp_path, "model", "semantic", object)
+        assert first is not second
+        assert engine_registry.get_retriever(tmp_path, "model", "semantic", object) is second
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Tests de la recherche hybride vectorisée (sémantique + BM25)
+Exécution : pytest tests/test_hybrid_search.py -v
+"""
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# Ajouter le chemin parent pour les imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from school_assistant.chatbot.bm25_index import BM25IndexBuilder, load_bm25_index
+from school_assistant.chatbot.hybrid_search import HybridRetriever, HybridSearchEngine, align_vectors
+
+TEXTS = [
+    "Toute absence doit être justifiée par un certificat médical.",
+    "Le GSM est interdit pendant les cours et à l'atelier.",
+    "Les horaires de cours commencent à 8h20.",
+    "La cantine est ouverte de midi à 13h30.",
+]
+# Axes sémantiques factices : absences, téléphone, horaires, repas
+VECTORS = np.eye(4, dtype=np.float32)
+
+
+def build_engine(tmp_path, fusion="rrf", query_vector=(0, 0, 1, 0)):
+    builder = BM25IndexBuilder()
+    builder.add(TEXTS, [{"source": f"doc{i}.pdf", "chunk_hash": f"h{i}"} for i in range(len(TEXTS))])
+    index = load_bm25_index(builder.save(tmp_path / "bm25", index_version="v1"), expected_version="v1")
+    return HybridSearchEngine(index, VECTORS, lambda text: list(query_vector), fusion=fusion,
+                              dense_weight=0.7, lexical_weight=0.3, fetch_k=2, rrf_k=60)
+
+
+class TestHybridSearch:
+    """Tests pour la fusion des scores sémantiques et lexicaux."""
+
+    @pytest.mark.parametrize("fusion", ["rrf", "weighted"])
+    def test_both_signals_are_fused_and_exposed(self, tmp_path, fusion):
+        """Le document fort des deux côtés passe devant ; les scores sont dans les métadonnées."""
+        # Sémantique : horaires ; lexical : GSM (« GSM », « cours ») devant horaires (« cours »)
+        engine = build_engine(tmp_path, fusion=fusion)
+        docs = engine.search("GSM cours", k=2)
+
+        assert [doc.metadata['source'] for doc in docs] == ["doc2.pdf", "doc1.pdf"]
+        assert docs[0].metadata['dense_score'] == pytest.approx(1.0)
+        assert docs[1].metadata['dense_score'] == pytest.approx(0.0)
+        assert docs[1].metadata['lexical_score'] > docs[0].metadata['lexical_score'] > 0
+        assert docs[0].metadata['score'] > docs[1].metadata['score']
+
+    def test_rrf_weights(self, tmp_path):
+        """Sans poids lexical, seul le rang sémantique compte ; avec 0.7/0.3, les deux côtés comptent."""
+        engine = build_engine(tmp_path, query_vector=(0.2, 0, 0, 1))
+        retriever = HybridRetriever(engine=engine, k=2)
+
+        docs = retriever.invoke("certificat absence")
+        assert [doc.metadata['source'] for doc in docs] == ["doc0.pdf", "doc3.pdf"]
+        assert docs[1].metadata['lexical_score'] == 0
+
+        engine.lexical_weight = 0.0
+        assert [doc.metadata['source'] for doc in retriever.invoke("certificat absence")] == ["doc3.pdf", "doc0.pdf"]
+
+    def test_rebuilt_engines_share_the_embedding_pool(self, tmp_path):
+        """Reconstruire le moteur (mise à jour de l'index) ne crée pas de nouveau thread."""
+        import threading
+
+        build_engine(tmp_path).search("GSM cours", k=1)
+        before = threading.active_count()
+        for _ in range(5):
+            build_engine(tmp_path).search("GSM cours", k=1)
+        assert threading.active_count() == before
+
+    def test_vectors_are_aligned_on_chunk_ids(self):
+        """Les vecteurs de la base sont rangés dans l'ordre BM25, doublons compris."""
+        metadatas = [{"chunk_hash": "a"}, {"chunk_hash": "b"}, {"chunk_hash": "a"}, {"chunk_hash": "z"}]
+        matrix = align_vectors(metadatas, ["b", "a-1", "a"], [[0, 2], [3, 0], [1, 0]])
+
+        assert matrix.tolist() == [[1, 0], [0, 1], [1, 0], [0, 0]]
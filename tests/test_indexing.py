@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Tests de la chaîne d'indexation (réindexation incrémentale, caches)
+Exécution : pytest tests/test_indexing.py -v
+"""
+import sys
+from pathlib import Path
+
+import pytest
+from langchain_core.documents import Document
+
+# Ajouter le chemin parent pour les imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from school_assistant.chatbot.incremental_index import assign_chunk_ids
+
+
+class FakeChroma:
+    """Imite l'API Chroma utilisée par l'indexation en flux."""
+
+    def __init__(self):
+        self.docs = {}
+        self._collection = self
+
+    def get(self, include=None):
+        ids = list(self.docs)
+        return {"ids": ids, "metadatas": [self.docs[i]["metadata"] for i in ids]}
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        for chunk_id, text, metadata in zip(ids, documents, metadatas):
+            self.docs[chunk_id] = {"text": text, "metadata": metadata}
+
+    def delete(self, ids):
+        for chunk_id in ids:
+            del self.docs[chunk_id]
+
+
+def chunk(text, source="ROI.pdf", page=1):
+    return Document(page_content=text, metadata={"source": source, "page": page})
+
+
+class TestIncrementalIndex:
+    """Tests pour la réindexation incrémentale."""
+
+    def test_ids_are_stable(self):
+        """Un même chunk reçoit toujours le même identifiant."""
+        assert assign_chunk_ids([chunk("a")]) == assign_chunk_ids([chunk("a")])
+        assert assign_chunk_ids([chunk("a")]) != assign_chunk_ids([chunk("a", page=2)])
+
+    def test_duplicate_chunks_get_distinct_ids(self):
+        """Deux chunks identiques sur la même page restent distincts."""
+        ids = assign_chunk_ids([chunk("a"), chunk("a")])
+        assert len(set(ids)) == 2
+
+
+class CountingEmbeddings:
+    """Modèle factice qui compte les textes embeddés."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += len(texts)
+        return [[float(len(t)), 1.0, 0.5] for t in texts]
+
+    def embed_query(self, text):
+        return [float(len(text)), 1.0, 0.5]
+
+
+class TestEmbeddingCache:
+    """Tests pour le cache disque des embeddings."""
+
+    def test_second_build_does_no_inference(self, tmp_path):
+        """Des textes déjà vus sont servis par le cache."""
+        from school_assistant.chatbot.embedding_cache import CachedEmbeddings, EmbeddingCache
+
+        model = CountingEmbeddings()
+        cache = EmbeddingCache(tmp_path, dtype="float32")
+        embeddings = CachedEmbeddings("fake", loader=lambda: model, cache=cache)
+
+        first = embeddings.embed_documents(["Article 1", "Article 2"])
+        second = embeddings.embed_documents(["Article  1", "Article 3", "Article 2"])
+
+        assert model.calls == 3
+        assert second[0] == first[0]
+        assert second[2] == first[1]
+
+    def test_cache_is_persistent_and_float16(self, tmp_path):
+        """Le cache survit à la réouverture, y compris en float16."""
+        from school_assistant.chatbot.embedding_cache import EmbeddingCache
+
+        EmbeddingCache(tmp_path, dtype="float16").put_many("m", ["a", "b"], [[1, 2], [3, 4]])
+        reopened = EmbeddingCache(tmp_path, dtype="float16")
+
+        vectors = reopened.get_many("m", ["b", "c"])
+        assert vectors[0].tolist() == [3.0, 4.0]
+        assert vectors[1] is None
+        assert reopened.count("m") == 2
+
+    def test_repeated_query_skips_model(self, tmp_path):
+        """Une question déjà posée (aux espaces près) n'appelle plus le modèle."""
+        from school_assistant.chatbot.embedding_cache import (
+            CachedEmbeddings, EmbeddingCache, QueryEmbeddingCache
+        )
+
+        class CountingQueries(CountingEmbeddings):
+            def embed_query(self, text):
+                self.calls += 1
+                return super().embed_query(text)
+
+        model = CountingQueries()
+        query_cache = QueryEmbeddingCache(max_size=2, ttl_seconds=0)
+        embeddings = CachedEmbeddings("fake", loader=lambda: model, cache=EmbeddingCache(tmp_path),
+                                      query_cache=query_cache)
+
+        first = embeddings.embed_query("Comment justifier une absence ?")
+        assert embeddings.embed_query("Comment  justifier une absence ? ") == first
+        assert model.calls == 1
+
+        embeddings.embed_query("Dress code ?")
+        embeddings.embed_query("Horaires ?")  # évince la plus ancienne question
+        embeddings.embed_query("Comment justifier une absence ?")
+        assert model.calls == 4
+        assert query_cache.stats()["hits"] == 1
+
+    def test_sentence_embeddings_stay_in_memory(self, monkeypatch):
+        """Les phrases de la compression sont servies par un LRU en mémoire, sans écriture sur disque."""
+        from school_assistant.chatbot.embedding_cache import EmbeddingCache, SentenceEmbeddings
+
+        monkeypatch.setattr(EmbeddingCache, "put_many",
+                            lambda *args: pytest.fail("phrase écrite dans le cache disque"))
+        model = CountingEmbeddings()
+        embeddings = SentenceEmbeddings("fake", loader=lambda: model, max_size=2)
+
+        first = embeddings.embed_documents(["Phrase A", "Phrase B", "Phrase  A"])
+        assert model.calls == 2
+        assert first[2] == first[0]
+        assert embeddings.embed_documents(["Phrase B"]) == [first[1]]
+        assert model.calls == 2
+
+        embeddings.embed_documents(["Phrase C"])  # évince la phrase la plus ancienne
+        embeddings.embed_documents(["Phrase A"])
+        assert model.calls == 4
+
+
+class TestExtractionCache:
+    """Tests pour le cache d'extraction des PDFs."""
+
+    def test_unchanged_file_is_served_from_cache(self, tmp_path):
+        """Un fichier inchangé est servi par le cache, un fichier modifié non."""
+        from school_assistant.scraper.extraction_cache import ExtractionCache
+
+        pdf = tmp_path / "ROI.pdf"
+        pdf.write_bytes(b"%PDF-1.4 contenu")
+        cache = ExtractionCache(tmp_path / "cache.sqlite3")
+        docs = [Document(page_content="Article 1", metadata={"source": "ROI.pdf", "page": 1})]
+
+        assert cache.get_documents(pdf) is None
+        cache.put_documents(pdf, docs)
+        cached = cache.get_documents(pdf)
+        assert cached[0].page_content == "Article 1"
+        assert cached[0].metadata["page"] == 1
+
+        pdf.write_bytes(b"%PDF-1.4 contenu modifie")
+        assert cache.get_documents(pdf) is None
+
+
+class TestStreamingPipeline:
+    """Tests pour l'indexation en flux."""
+
+    @staticmethod
+    def source(pages):
+        def iter_files():
+            for name, texts in pages.items():
+                yield Path(name), [
+                    Document(page_content=text, metadata={"source": name, "page": i + 1, "doc_type": "autre"})
+                    for i, text in enumerate(texts)
+                ]
+        return iter_files
+
+    def test_batches_are_written_and_reindex_is_incremental(self):
+        """Tous les chunks sont écrits par lots ; une réindexation ne réembedde que le nouveau."""
+        from school_assistant.chatbot.streaming_pipeline import stream_index
+
+        store = {}
+        def writer(ids, chunks, vectors):
+            assert len(ids) <= 2 and len(vectors) == len(chunks)
+            store.update(zip(ids, chunks))
+
+        model = CountingEmbeddings()
+        pages = {"ROI.pdf": ["Article 1 " * 10, "Article 2 " * 10], "RGE.pdf": ["Évaluation " * 10]}
+        stats = stream_index(None, model, writer, batch_size=2, queue_size=1,
+                             documents_source=self.source(pages))
+        assert stats["chunks"] == stats["added"] == len(store) == model.calls == 3
+        assert stats["batches"] == 2
+
+        pages["RGE.pdf"] = ["Évaluation modifiée " * 5]
+        existing = {chunk_id: chunk.metadata["source"] for chunk_id, chunk in store.items()}
+        deleted = []
+        stats = stream_index(None, model, writer, existing=existing, delete=deleted.extend,
+                             batch_size=2, documents_source=self.source(pages))
+        assert (stats["added"], stats["unchanged"], stats["deleted"]) == (1, 2, 1)
+        assert stats["changed_sources"] == ["RGE.pdf"]
+        assert model.calls == 4
+
+    def test_chroma_reindex_embeds_only_changed_chunks(self):
+        """Sur Chroma, seuls les chunks nouveaux sont embeddés, ceux des sources disparues supprimés."""
+        from school_assistant.chatbot.streaming_pipeline import stream_index_chroma
+
+        db = FakeChroma()
+        model = CountingEmbeddings()
+        pages = {"ROI.pdf": ["Article 1 " * 10, "Article 2 " * 10], "Dress.pdf": ["Tenue " * 10]}
+        stream_index_chroma(None, db, model, documents_source=self.source(pages))
+        assert model.calls == len(db.docs) == 3
+
+        pages = {"ROI.pdf": ["Article 1 " * 10, "Article 2 modifié " * 10]}
+        stats = stream_index_chroma(None, db, model, documents_source=self.source(pages))
+
+        assert (stats["added"], stats["deleted"], stats["unchanged"]) == (1, 2, 1)
+        assert stats["changed_sources"] == ["Dress.pdf", "ROI.pdf"]
+        assert model.calls == 4
+        assert len(db.docs) == 2
+
+    def test_stage_error_is_raised(self):
+        """Une erreur dans une étape arrête le pipeline et remonte à l'appelant."""
+        import pytest
+        from school_assistant.chatbot.streaming_pipeline import stream_index
+
+        class FailingEmbeddings:
+            def embed_documents(self, texts):
+                raise RuntimeError("modèle indisponible")
+
+        pages = {f"{i}.pdf": [f"Article {i} " * 10] for i in range(20)}
+        with pytest.raises(RuntimeError):
+            stream_index(None, FailingEmbeddings(), lambda *a: None, batch_size=1, queue_size=1,
+                         documents_source=self.source(pages))
+
+
+class WordTokenizer:
+    """Tokenizer factice : un token par mot."""
+
+    def encode(self, text, add_special_tokens=True):
+        tokens = text.split()
+        return ["<s>", *tokens, "</s>"] if add_special_tokens else tokens
+
+
+class TestTokenChunking:
+    """Tests pour le découpage mesuré en tokens du modèle."""
+
+    def test_chunks_fit_model_sequence(self):
+        """Aucun chunk ne dépasse la séquence du modèle ; la troncature est rapportée."""
+        from school_assistant.chatbot.chunking_strategy import (
+            TokenBudget, chunk_source_documents, get_chunk_statistics
+        )
+
+        budget = TokenBudget(WordTokenizer(), max_seq_length=12)
+        page = chunk(" ".join(f"mot{i}" for i in range(100)))
+        page.metadata["doc_type"] = "reglement_ordre_interieur"
+        chunks = chunk_source_documents([page], budget)
+
+        assert len(chunks) > 1
+        assert all(budget.count(c.page_content) <= budget.chunk_size == 10 for c in chunks)
+        assert get_chunk_statistics(chunks, budget)["truncated_tokens"] == 0
+
+        stats = get_chunk_statistics([page], budget)
+        assert stats["truncated_chunks"] == 1
+        assert stats["truncated_tokens"] == 90
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Tests de l'ingestion des PDFs (extraction parallèle, OCR des pages image)
+Exécution : pytest tests/test_ingest.py -v
+"""
+import sys
+import threading
+import time
+import types
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+from langchain_core.documents import Document
+
+# Ajouter le chemin parent pour les imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from school_assistant.scraper import enhanced_ingest
+
+PAGES_PER_FILE = 4
+PAGES_PER_TASK = 2
+
+
+class TrackingExecutor:
+    """Pool de threads à la place du pool de processus ; mesure les tâches en cours."""
+
+    instances = []
+
+    def __init__(self, max_workers, mp_context=None):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers)
+        self.start_method = mp_context.get_start_method() if mp_context else None
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+        TrackingExecutor.instances.append(self)
+
+    def submit(self, fn, *args):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        future = self.pool.submit(fn, *args)
+        executor = self
+
+        class Tracked:
+            def result(self):
+                value = future.result()
+                with executor.lock:
+                    executor.running -= 1
+                return value
+        return Tracked()
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.pool.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+
+def fake_extract(pdf_path, start_page, end_page):
+    """Extraction factice : les premières tranches finissent en dernier, pages dans le désordre."""
+    name = Path(pdf_path).name
+    time.sleep(0.02 if name == "a.pdf" and start_page == 0 else 0.001)
+    docs = [
+        Document(page_content=f"{name} page {page + 1}", metadata={"source": name, "page": page + 1})
+        for page in reversed(range(start_page, end_page))
+    ]
+    return docs, [], False, 0.0
+
+
+def make_folder(tmp_path, names):
+    for name in names:
+        (tmp_path / name).write_bytes(b"%PDF-1.4")
+    return tmp_path
+
+
+class StubOCREngine:
+    """Moteur OCR factice : la page 4 de b.pdf échoue."""
+
+    def __init__(self):
+        self.pages = []
+
+    def submit(self, pdf_path, page_number):
+        self.pages.append((Path(pdf_path).name, page_number))
+        future = Future()
+        if (Path(pdf_path).name, page_number) == ("b.pdf", 4):
+            future.set_exception(RuntimeError("Tesseract indisponible"))
+        else:
+            future.set_result((page_number, f"Texte reconnu par OCR sur la page scannée numéro {page_number}."))
+        return future
+
+    def shutdown(self):
+        pass
+
+
+class FakeCache:
+    """Cache d'extraction factice : toujours vide, enregistre les écritures."""
+
+    def __init__(self):
+        self.stored = {}
+
+    def get_documents(self, pdf_path):
+        return None
+
+    def put_documents(self, pdf_path, docs):
+        self.stored[Path(pdf_path).name] = docs
+
+
+def text_and_image_pages(pdf_path, start_page, end_page):
+    """Pages 1 et 3 avec du texte, pages 2 et 4 image seule (0-indexed : 1 et 3)."""
+    name = Path(pdf_path).name
+    docs = [Document(page_content=f"Texte de {name}, page {page}", metadata={"source": name, "page": page})
+            for page in (1, 3)]
+    return docs, [1, 3], False, 0.0
+
+
+def unreadable_b(pdf_path, start_page, end_page):
+    """b.pdf échoue après sa première page ; a.pdf est lu en entier."""
+    name = Path(pdf_path).name
+    pages = [1] if name == "b.pdf" else [1, 2]
+    docs = [Document(page_content=f"Texte de {name}, page {page}", metadata={"source": name, "page": page})
+            for page in pages]
+    return docs, [], name == "b.pdf", 0.0
+
+
+class TestParallelExtraction:
+    """Tests pour l'extraction parallèle, bornée et restituée dans l'ordre."""
+
+    def test_out_of_order_tasks_are_yielded_in_order_within_window(self, tmp_path, monkeypatch):
+        """Les fichiers sortent triés par nom, leurs pages triées ; au plus 2 tâches par processus en cours."""
+        monkeypatch.setattr(enhanced_ingest, "ProcessPoolExecutor", TrackingExecutor)
+        monkeypatch.setattr(enhanced_ingest, "_extract_task", fake_extract)
+        monkeypatch.setattr(enhanced_ingest, "_page_ranges", lambda pdf_path, pages_per_task: [
+            (start, start + PAGES_PER_TASK) for start in range(0, PAGES_PER_FILE, PAGES_PER_TASK)
+        ])
+        TrackingExecutor.instances.clear()
+        folder = make_folder(tmp_path, ["c.pdf", "a.pdf", "b.pdf", "d.PDF"])
+
+        results = list(enhanced_ingest.iter_pdf_documents(folder, workers=2, use_cache=False,
+                                                          ocr_fallback=False))
+
+        assert [path.name for path, _ in results] == ["a.pdf", "b.pdf", "c.pdf", "d.PDF"]
+        for _, docs in results:
+            assert [doc.metadata["page"] for doc in docs] == list(range(1, PAGES_PER_FILE + 1))
+        executor, = TrackingExecutor.instances
+        assert executor.max_running == 2 * 2
+        assert executor.running == 0
+        # Pool créé depuis le thread d'extraction du pipeline : pas de fork
+        assert executor.start_method not in (None, "fork")
+
+    def test_failed_extraction_is_not_cached(self, tmp_path, monkeypatch):
+        """Un PDF dont l'extraction échoue en cours de route est restitué tel quel, sans être mis en cache."""
+        monkeypatch.setattr(enhanced_ingest, "_extract_task", unreadable_b)
+        monkeypatch.setattr(enhanced_ingest, "_page_ranges", lambda pdf_path, pages_per_task: [(0, None)])
+        cache = FakeCache()
+        monkeypatch.setattr(enhanced_ingest, "get_shared_cache", lambda: cache)
+        folder = make_folder(tmp_path, ["a.pdf", "b.pdf"])
+
+        results = dict(enhanced_ingest.iter_pdf_documents(folder, workers=1, ocr_fallback=False))
+
+        assert [doc.metadata["page"] for doc in results[folder / "b.pdf"]] == [1]
+        assert list(cache.stored) == ["a.pdf"]
+
+
+class TestOCRFallback:
+    """Tests pour l'OCR des pages image pendant l'ingestion."""
+
+    def test_image_pages_are_merged_back_in_page_order(self, tmp_path, monkeypatch):
+        """Les pages image sont reconnues et réintégrées à leur place ; un OCR échoué n'est pas mis en cache."""
+        engine = StubOCREngine()
+        fake_module = types.ModuleType("scraper.ocr_engine")
+        fake_module.OCREngine = lambda: engine
+        fake_module.ocr_available = lambda: True
+        monkeypatch.setitem(sys.modules, "scraper.ocr_engine", fake_module)
+        monkeypatch.setattr(enhanced_ingest, "_extract_task", text_and_image_pages)
+        monkeypatch.setattr(enhanced_ingest, "_page_ranges", lambda pdf_path, pages_per_task: [(0, None)])
+        cache = FakeCache()
+        monkeypatch.setattr(enhanced_ingest, "get_shared_cache", lambda: cache)
+        folder = make_folder(tmp_path, ["a.pdf", "b.pdf"])
+
+        results = dict(enhanced_ingest.iter_pdf_documents(folder, workers=1, ocr_fallback=True))
+        docs_a = results[folder / "a.pdf"]
+
+        assert engine.pages == [("a.pdf", 2), ("a.pdf", 4), ("b.pdf", 2), ("b.pdf", 4)]
+        assert [doc.metadata["page"] for doc in docs_a] == [1, 2, 3, 4]
+        assert [doc.metadata.get("extraction") for doc in docs_a] == [None, "ocr", None, "ocr"]
+        assert docs_a[0].page_content == "Texte de a.pdf, page 1"
+        assert docs_a[0].metadata == {"source": "a.pdf", "page": 1}
+        assert [doc.metadata["page"] for doc in results[folder / "b.pdf"]] == [1, 2, 3]
+        assert list(cache.stored) == ["a.pdf"]
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Tests de la couche fournisseurs LLM (répartition, couverture)
+Exécution : pytest tests/test_llm_providers.py -v
+"""
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+# Ajouter le chemin parent pour les imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from school_assistant.chatbot.provider_dispatch import dispatch, from_sync, generate_hedged
+from school_assistant.chatbot import llm_providers
+from school_assistant.chatbot.llm_providers import LLMProvider
+from school_assistant.chatbot.circuit_breaker import CircuitBreaker
+from school_assistant.chatbot.provider_router import ProviderRouter
+
+
+@pytest.fixture(autouse=True)
+def isolated_router(tmp_path, monkeypatch):
+    """Statistiques de routage dans un dossier temporaire."""
+    router = ProviderRouter(tmp_path / "router.json")
+    monkeypatch.setattr(llm_providers, "get_router", lambda: router)
+    return router
+
+
+def provider(answer, delay=0.0, error=None):
+    """Fournisseur factice asynchrone."""
+    async def call(context, question):
+        await asyncio.sleep(delay)
+        if error:
+            raise error
+        return answer
+    return call
+
+
+class TestHedgedDispatch:
+    """Tests pour le répartiteur avec requêtes couvertes."""
+
+    def test_slow_provider_is_hedged(self):
+        """Un fournisseur lent est doublé par le suivant après le budget de latence."""
+        start = time.perf_counter()
+        result = generate_hedged(
+            [("groq", provider("lent", delay=2.0)), ("ollama", provider("rapide", delay=0.05))],
+            "contexte", "question", hedge_delay=0.1, deadline=5
+        )
+        assert result == ("ollama", "rapide")
+        assert time.perf_counter() - start < 1.0
+
+    def test_failure_launches_next_without_waiting(self):
+        """Un échec (exception ou None) passe immédiatement au fournisseur suivant."""
+        start = time.perf_counter()
+        result = generate_hedged(
+            [("openai", provider(None, error=RuntimeError("429"))),
+             ("groq", provider(None)),
+             ("ollama", from_sync(lambda context, question: "réponse"))],
+            "contexte", "question", hedge_delay=10, deadline=20
+        )
+        assert result == ("ollama", "réponse")
+        assert time.perf_counter() - start < 1.0
+
+    def test_deadline_gives_up(self):
+        """Au-delà du délai global, aucune réponse n'est renvoyée."""
+        start = time.perf_counter()
+        result = generate_hedged(
+            [("groq", provider("trop tard", delay=2.0))],
+            "contexte", "question", hedge_delay=0.1, deadline=0.2
+        )
+        assert result is None
+        assert time.perf_counter() - start < 1.0
+
+    def test_results_finished_with_the_winner_are_released(self):
+        """Deux réponses arrivées dans le même lot : celle qui n'est pas retenue est libérée."""
+        async def scenario():
+            ready = asyncio.Event()
+            released = []
+
+            def gated(answer):
+                async def call(context, question):
+                    await ready.wait()
+                    return answer
+                return call
+
+            async def release(result):
+                released.append(result)
+
+            asyncio.get_running_loop().call_later(0.1, ready.set)
+            result = await dispatch(
+                [("groq", gated("flux groq")), ("ollama", gated("flux ollama"))],
+                "contexte", "question", hedge_delay=0.01, deadline=5, release=release
+            )
+            return result, released
+
+        (_, answer), released = asyncio.run(scenario())
+        assert released == [{"flux groq", "flux ollama"}.difference({answer}).pop()]
+
+
+class FakeChatModel:
+    """Client LangChain factice : échoue `failures` fois puis répond."""
+
+    def __init__(self, failures=None, chunks=("répo", "nse"), delay=0.0, fail_at=None):
+        self.failures = list(failures or [])
+        self.prompts = []
+        self.chunks = chunks
+        self.delay = delay
+        self.fail_at = fail_at
+
+    async def ainvoke(self, prompt):
+        self.prompts.append(prompt)
+        if self.failures:
+            raise self.failures.pop(0)
+        return "réponse"
+
+    async def astream(self, prompt):
+        self.prompts.append(prompt)
+        await asyncio.sleep(self.delay)
+        if self.failures:
+            raise self.failures.pop(0)
+        for i, chunk in enumerate(self.chunks):
+            if i == self.fail_at:
+                raise ConnectionError("flux coupé")
+            yield chunk
+
+
+def fake_provider(name, client, max_retries=1, api_key_env=None):
+    settings = {"client": "openai", "model": "test", "timeout": 5,
+                "max_retries": max_retries, "api_key_env": api_key_env or []}
+    return LLMProvider(name, settings, client=client)
+
+
+class TestLLMProviders:
+    """Tests pour les fournisseurs partagés (client réutilisé, nouvelles tentatives)."""
+
+    def test_transient_error_is_retried_with_same_client(self, monkeypatch):
+        """Un délai dépassé est retenté, sur le même client, avec le gabarit fourni."""
+        monkeypatch.setattr(llm_providers.config, "LLM_RETRY_BACKOFF_SECONDS", 0)
+        client = FakeChatModel(failures=[TimeoutError()])
+        answer = asyncio.run(fake_provider("groq", client).agenerate(
+            "ctx", "q", prompt_template="{context}|{question}"
+        ))
+        assert answer == "réponse"
+        assert client.prompts == ["ctx|q", "ctx|q"]
+
+    def test_quota_error_is_not_retried(self, monkeypatch):
+        """Un quota épuisé échoue immédiatement et le fournisseur suivant répond."""
+        quota = FakeChatModel(failures=[RuntimeError("Error code: 429 - insufficient_quota")])
+        providers = {"openai": fake_provider("openai", quota),
+                     "ollama": fake_provider("ollama", FakeChatModel())}
+        monkeypatch.setattr(llm_providers, "get_provider", providers.get)
+        result = llm_providers.generate("ctx", "q", names=["openai", "ollama"])
+        assert result == ("ollama", "réponse")
+        assert len(quota.prompts) == 1
+
+    def test_provider_without_key_is_skipped(self, monkeypatch):
+        """Un fournisseur dont la clé API est absente n'est pas interrogé."""
+        monkeypatch.delenv("TEST_LLM_KEY", raising=False)
+        providers = {"groq": fake_provider("groq", FakeChatModel(), api_key_env=["TEST_LLM_KEY"])}
+        monkeypatch.setattr(llm_providers, "get_provider", providers.get)
+        assert llm_providers.provider_calls(["groq", "inconnu"]) == []
+        monkeypatch.setenv("TEST_LLM_KEY", "clé")
+        assert [name for name, _ in llm_providers.provider_calls(["groq"])] == ["groq"]
+
+
+class FakeClock:
+    """Horloge contrôlée par le test."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCircuitBreaker:
+    """Tests pour le disjoncteur des fournisseurs."""
+
+    def test_opens_after_threshold_then_probes(self):
+        """Ouvert après N échecs, une seule requête de test après le délai, refermé sur succès."""
+        clock = FakeClock()
+        breaker = CircuitBreaker("ollama", failure_threshold=2, cooldown_seconds=30, clock=clock)
+        for _ in range(2):
+            assert breaker.allow()
+            breaker.record_failure(ConnectionError("Connection refused"))
+        assert breaker.state == "open"
+        assert not breaker.allow()
+
+        clock.now = 31
+        assert breaker.available()
+        assert breaker.allow()
+        assert not breaker.allow()  # Une seule requête de test à la fois
+        breaker.record_success()
+        assert breaker.state == "closed"
+
+    def test_failed_probe_reopens(self):
+        """Un échec en semi-ouvert rouvre pour un nouveau délai complet."""
+        clock = FakeClock()
+        breaker = CircuitBreaker("groq", failure_threshold=1, cooldown_seconds=30, clock=clock)
+        breaker.record_failure(TimeoutError())
+        clock.now = 30
+        assert breaker.allow()
+        breaker.record_failure(TimeoutError())
+        assert breaker.state == "open"
+        assert breaker.snapshot()["retry_in"] == 30
+
+    def test_quota_error_trips_and_skips_provider(self, monkeypatch):
+        """Un quota épuisé ouvre immédiatement : le fournisseur n'est plus appelé."""
+        quota = FakeChatModel(failures=[RuntimeError("Error code: 429 - insufficient_quota")])
+        providers = {"openai": fake_provider("openai", quota),
+                     "ollama": fake_provider("ollama", FakeChatModel())}
+        monkeypatch.setattr(llm_providers, "get_provider", providers.get)
+        for _ in range(3):
+            assert llm_providers.generate("ctx", "q", names=["openai", "ollama"]) == ("ollama", "réponse")
+        assert len(quota.prompts) == 1
+        assert providers["openai"].breaker.state == "open"
+
+
+class TestProviderRouter:
+    """Tests pour le routage selon la latence observée."""
+
+    def test_orders_by_expected_time_and_persists(self, tmp_path, monkeypatch):
+        """Le plus rapide passe en tête, les statistiques survivent au redémarrage."""
+        monkeypatch.setattr(llm_providers.config, "LLM_ROUTER_FREE_FACTOR", 1.0)
+        path = tmp_path / "stats.json"
+        router = ProviderRouter(path, alpha=0.5)
+        router.record("groq", "test", 4.0, "success")
+        router.record("ollama", "test", 1.0, "success")
+        router.record("openai", "test", 0.5, "failure")
+        router.record("openai", "test", 0.5, "failure")
+        router.flush()
+
+        groq, ollama, openai = (fake_provider(name, FakeChatModel()) for name in ("groq", "ollama", "openai"))
+        restarted = ProviderRouter(path, alpha=0.5)
+        assert [p.name for p in restarted.order([groq, openai, ollama])] == ["ollama", "openai", "groq"]
+        assert restarted.snapshot("openai", "test")["error_rate"] == pytest.approx(0.75, abs=1e-3)
+
+    def test_stats_are_written_in_batches(self, tmp_path):
+        """Pas d'écriture à chaque appel : toutes les N observations, après un délai, ou à la demande."""
+        clock = FakeClock()
+        path = tmp_path / "stats.json"
+        router = ProviderRouter(path, clock=clock, flush_every=3, flush_interval=60)
+        router.record("groq", "test", 1.0, "success")
+        router.record("groq", "test", 1.0, "success")
+        assert not path.exists()
+        router.record("groq", "test", 1.0, "success")
+        assert ProviderRouter(path).snapshot("groq", "test")["samples"] == 3
+
+        router.record("groq", "test", 1.0, "success")
+        clock.now = 60
+        router.record("groq", "test", 1.0, "success")
+        assert ProviderRouter(path).snapshot("groq", "test")["samples"] == 5
+
+        router.record("groq", "test", 1.0, "success")
+        router.flush()
+        assert ProviderRouter(path).snapshot("groq", "test")["samples"] == 6
+
+    def test_free_preference_and_censored_latency(self, tmp_path):
+        """Préférence pour les fournisseurs gratuits ; une annulation ne fait qu'augmenter la latence."""
+        router = ProviderRouter(tmp_path / "stats.json", alpha=0.5)
+        router.record("openai", "test", 1.0, "success")
+        router.record("ollama", "test", 1.2, "success")
+        openai, ollama = fake_provider("openai", None), fake_provider("ollama", None)
+        ollama.settings["local"] = True
+        assert [p.name for p in router.order([openai, ollama])] == ["ollama", "openai"]
+
+        router.record("ollama", "test", 0.2, "cancelled")
+        assert router.snapshot("ollama", "test")["latency"] == pytest.approx(1.2)
+        router.record("ollama", "test", 3.2, "cancelled")
+        assert router.snapshot("ollama", "test")["latency"] == pytest.approx(2.2)
+
+    def test_generate_feeds_router(self, isolated_router):
+        """Chaque appel d'un fournisseur alimente les statistiques du routeur."""
+        provider = fake_provider("groq", FakeChatModel())
+        asyncio.run(provider.agenerate("ctx", "q"))
+        assert isolated_router.snapshot("groq", "test")["samples"] == 1
+
+
+class TestStreaming:
+    """Tests pour la génération en streaming."""
+
+    def test_first_token_wins_and_full_text_is_kept(self, monkeypatch):
+        """Le premier fournisseur à commencer est retenu, le texte complet est reconstitué."""
+        monkeypatch.setattr(llm_providers.config, "LLM_HEDGE_DELAY_SECONDS", 0.1)
+        providers = {"groq": fake_provider("groq", FakeChatModel(delay=2.0)),
+                     "ollama": fake_provider("ollama", FakeChatModel(chunks=("Bon", "jour")))}
+        monkeypatch.setattr(llm_providers, "get_provider", providers.get)
+        start = time.perf_counter()
+        stream = llm_providers.generate_stream("ctx", "q", names=["groq", "ollama"])
+        assert stream.provider == "ollama"
+        assert list(stream) == ["Bon", "jour"]
+        assert stream.complete and stream.text == "Bonjour"
+        assert time.perf_counter() - start < 1.0
+
+    def test_interrupted_stream_is_not_complete(self, monkeypatch):
+        """Une coupure en cours de réponse garde le texte partiel, sans le marquer complet."""
+        provider = fake_provider("groq", FakeChatModel(chunks=("a", "b", "c"), fail_at=2))
+        monkeypatch.setattr(llm_providers, "get_provider", {"groq": provider}.get)
+        stream = llm_providers.generate_stream("ctx", "q", names=["groq"])
+        assert list(stream) == ["a", "b"]
+        assert not stream.complete
+        assert isinstance(stream.error, ConnectionError)
+        assert provider.breaker.snapshot()["failures"] == 1
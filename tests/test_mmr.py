@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Tests du MMR vectorisé
+Exécution : pytest tests/test_mmr.py -v
+"""
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# Ajouter le chemin parent pour les imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from langchain_core.vectorstores.utils import maximal_marginal_relevance
+
+from school_assistant.chatbot.mmr import MMRReranker, MMRRetriever
+
+
+class FakeCollection:
+    """Collection Chroma factice : renvoie toujours les mêmes candidats."""
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+        self.queries = 0
+
+    def query(self, query_embeddings, n_results, include):
+        self.queries += 1
+        n = min(n_results, len(self.vectors))
+        return {
+            "ids": [[f"c{i}" for i in range(n)]],
+            "embeddings": [self.vectors[:n]],
+            "documents": [[f"Chunk {i}" for i in range(n)]],
+            "metadatas": [[{"page": i} for i in range(n)]],
+        }
+
+
+class FakeChroma:
+    def __init__(self, vectors, query_vector):
+        self._collection = FakeCollection(vectors)
+        self.embeddings = self
+        self.query_vector = query_vector
+
+    def embed_query(self, text):
+        return self.query_vector
+
+
+class TestMMR:
+    """Tests pour la sélection MMR et le cache des matrices de similarité."""
+
+    def test_same_selection_as_langchain(self):
+        """Sur un pool de 300 candidats, la sélection est identique à celle de LangChain."""
+        rng = np.random.default_rng(1)
+        vectors = rng.standard_normal((300, 64)).astype(np.float32)
+        query = rng.standard_normal(64).astype(np.float32)
+        for lambda_mult in (0.3, 0.7):
+            expected = maximal_marginal_relevance(query, vectors, lambda_mult=lambda_mult, k=8)
+            assert MMRReranker().select(query, range(300), vectors, 8, lambda_mult) == expected
+
+    def test_similarity_matrix_is_cached_per_candidate_set(self):
+        """Une question qui retombe sur les mêmes candidats réutilise la matrice ; le cache est borné."""
+        rng = np.random.default_rng(2)
+        vectors = rng.standard_normal((50, 16)).astype(np.float32)
+        reranker = MMRReranker(cache_size=1)
+        reranker.select(rng.standard_normal(16), list(range(50)), vectors, 5, 0.7)
+        reranker.select(rng.standard_normal(16), list(range(50)), vectors, 5, 0.7)
+        reranker.select(rng.standard_normal(16), list(range(1, 50)), vectors[1:], 5, 0.7)
+
+        assert reranker.stats() == {"entries": 1, "hits": 1, "misses": 2}
+
+    def test_retriever_over_chroma_skips_near_duplicates(self):
+        """Le retriever interroge Chroma une fois, écarte le quasi-doublon et note la similarité cosinus."""
+        vectors = np.array([[1.0, 0.0], [0.99, 0.05], [0.6, 0.8]], dtype=np.float32)
+        store = FakeChroma(vectors, [1.0, 0.0])
+        retriever = MMRRetriever(store=store, reranker=MMRReranker(), k=2, fetch_k=3, lambda_mult=0.3)
+
+        docs = retriever.invoke("absence")
+
+        assert [doc.page_content for doc in docs] == ["Chunk 0", "Chunk 2"]
+        assert docs[1].metadata == {"page": 2, "dense_score": pytest.approx(0.6)}
+        assert docs[0].metadata["dense_score"] == pytest.approx(1.0)
+        assert store._collection.queries == 1
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Tests de la base vectorielle exacte en NumPy
+Exécution : pytest tests/test_numpy_store.py -v
+"""
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# Ajouter le chemin parent pour les imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from school_assistant.chatbot.numpy_store import NumpyVectorStore, open_or_export, save_numpy_store
+
+TEXTS = ["Absences justifiées", "Absences non justifiées", "GSM interdit", "Horaires des cours"]
+METADATAS = [{"source": "roi.pdf", "page": 1}, {"source": "roi.pdf", "page": 2},
+             {"source": "rge.pdf", "page": 1, "doc_type": "protocole"}, {"source": "rge.pdf"}]
+VECTORS = [[1.0, 0.1, 0.0], [1.0, 0.12, 0.0], [0.6, 0.8, 0.0], [0.0, 0.0, 2.0]]
+
+
+class AxisEmbeddings:
+    """Embeddings factices : la question est déjà un vecteur."""
+
+    def embed_query(self, text):
+        return {"absence": [1.0, 0.0, 0.0], "horaires": [0.0, 0.0, 1.0]}[text]
+
+
+class FakeChroma:
+    """Base d'origine factice, au format de `Chroma.get`."""
+
+    def __init__(self):
+        self.exports = 0
+
+    def get(self, include=None):
+        self.exports += 1
+        return {"ids": ["a", "b", "c", "d"], "documents": TEXTS, "metadatas": METADATAS,
+                "embeddings": VECTORS}
+
+
+def build(tmp_path, dtype="float32"):
+    return NumpyVectorStore(
+        save_numpy_store(tmp_path / dtype, ["a", "b", "c", "d"], TEXTS, METADATAS, VECTORS, "model", dtype=dtype),
+        AxisEmbeddings()
+    )
+
+
+class TestNumpyVectorStore:
+    """Tests pour la recherche exacte et la table de métadonnées."""
+
+    @pytest.mark.parametrize("dtype", ["float32", "float16"])
+    def test_top_k_with_l2_distances_and_metadata(self, tmp_path, dtype):
+        """Résultats exacts, distance L2 au carré comme FAISS, métadonnées restituées telles quelles."""
+        store = build(tmp_path, dtype)
+        results = store.similarity_search_with_score("absence", k=3)
+
+        assert [doc.page_content for doc, _ in results] == TEXTS[:3]
+        cosine = 1 / np.linalg.norm(VECTORS[0])
+        assert results[0][1] == pytest.approx(2 - 2 * cosine, abs=1e-3)
+        assert [doc.metadata for doc, _ in results] == METADATAS[:3]
+        assert store.similarity_search("horaires", k=1)[0].metadata == {"source": "rge.pdf"}
+
+    def test_float16_stays_mapped_and_store_is_read_only(self, tmp_path):
+        """Une base float16 reste en mémoire mappée ; les écritures sont refusées."""
+        store = build(tmp_path, "float16")
+        assert isinstance(store.vectors, np.memmap) and store.vectors.dtype == np.float16
+        np.testing.assert_allclose(store.scores([1.0, 0.0, 0.0]), build(tmp_path, "float32").scores([1.0, 0.0, 0.0]),
+                                   atol=1e-3)
+        with pytest.raises(NotImplementedError):
+            store.add_texts(["Nouveau chunk"])
+
+    def test_mmr_skips_near_duplicates(self, tmp_path):
+        """MMR écarte le quasi-doublon au profit d'un document différent ; la similarité cosinus est notée."""
+        store = build(tmp_path)
+        docs = store.max_marginal_relevance_search("absence", k=2, fetch_k=3, lambda_mult=0.3)
+        assert [doc.page_content for doc in docs] == ["Absences justifiées", "GSM interdit"]
+        assert docs[0].metadata["dense_score"] > docs[1].metadata["dense_score"]
+
+        retriever = store.as_retriever(search_type="mmr", search_kwargs={"k": 2, "fetch_k": 3})
+        assert len(retriever.invoke("absence")) == 2
+
+    def test_export_is_reused_until_index_version_changes(self, tmp_path):
+        """L'export depuis la base d'origine n'a lieu qu'une fois par version de l'index."""
+        native = FakeChroma()
+        first = open_or_export(tmp_path, AxisEmbeddings(), "model", "v1", lambda: native)
+        again = open_or_export(tmp_path, AxisEmbeddings(), "model", "v1", lambda: native)
+        assert native.exports == 1
+        assert len(again) == 4
+        assert first.get(include=["embeddings"])["ids"] == ["a", "b", "c", "d"]
+
+        open_or_export(tmp_path, AxisEmbeddings(), "model", "v2", lambda: native)
+        assert native.exports == 2
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Tests du moteur OCR page par page (flux et cache)
+Exécution : pytest tests/test_ocr_engine.py -v
+"""
+import sys
+import types
+from concurrent.futures import Future
+from pathlib import Path
+
+import pytest
+
+# Ajouter le chemin parent pour les imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from school_assistant.scraper import extract_with_ocr, ocr_engine
+from school_assistant.scraper.ocr_engine import OCREngine, ocr_page
+
+
+class FakeImage:
+    """Image de page factice : son contenu dépend du numéro de page."""
+
+    def __init__(self, page_number):
+        self.mode = "L"
+        self.size = (10, 10)
+        self.page_number = page_number
+
+    def tobytes(self):
+        return bytes([self.page_number]) * 100
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def recognizer(monkeypatch):
+    """pdf2image et pytesseract factices ; compte les pages reconnues."""
+    calls = []
+    pdf2image = types.ModuleType("pdf2image")
+    pdf2image.convert_from_path = lambda path, dpi, first_page, last_page: [FakeImage(first_page)]
+    pytesseract = types.ModuleType("pytesseract")
+
+    def image_to_string(image, lang):
+        calls.append(image.page_number)
+        return f"Texte de la page {image.page_number}"
+
+    pytesseract.image_to_string = image_to_string
+    monkeypatch.setitem(sys.modules, "pdf2image", pdf2image)
+    monkeypatch.setitem(sys.modules, "pytesseract", pytesseract)
+    return calls
+
+
+class InlineExecutor:
+    """Exécute les tâches dans le processus courant ; compte les tâches soumises."""
+
+    def __init__(self):
+        self.submitted = 0
+
+    def submit(self, fn, *args):
+        self.submitted += 1
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+class TestOCREngine:
+    """Tests pour la reconnaissance en flux et le cache par page."""
+
+    def test_pages_are_streamed_in_order_with_bounded_window(self, tmp_path, recognizer, monkeypatch):
+        """Chaque page est restituée dès que possible, sans soumettre tout le PDF d'avance."""
+        monkeypatch.setattr(ocr_engine.config, "OCR_MAX_INFLIGHT_PER_WORKER", 2)
+        engine = OCREngine(workers=1, cache_dir=tmp_path / "cache")
+        engine._executor = executor = InlineExecutor()
+
+        pages = engine.iter_pages(tmp_path / "scan.pdf", pages=range(1, 7))
+        assert next(pages) == (1, "Texte de la page 1")
+        assert executor.submitted == 2
+        assert [number for number, _ in pages] == [2, 3, 4, 5, 6]
+        assert executor.submitted == 6
+
+    def test_script_writes_pages_as_they_are_recognized(self, tmp_path, recognizer, monkeypatch):
+        """Le script d'extraction OCR renvoie le texte et l'écrit page par page dans le fichier de sortie."""
+        engine = OCREngine(workers=1, cache_dir=tmp_path / "cache")
+        engine._executor = InlineExecutor()
+        monkeypatch.setattr(extract_with_ocr, "OCREngine", lambda: engine)
+        monkeypatch.setattr(extract_with_ocr, "count_pages", lambda pdf_path: 2)
+
+        output = tmp_path / "scan.txt"
+        text = extract_with_ocr.extract_with_ocr(tmp_path / "scan.pdf", output)
+
+        assert text == "Texte de la page 1\n\nTexte de la page 2"
+        assert output.read_text(encoding="utf-8") == "Texte de la page 1\n\nTexte de la page 2\n\n"
+        assert recognizer == [1, 2]
+
+    def test_cached_pages_are_not_recognized_again(self, tmp_path, recognizer):
+        """Une page déjà reconnue est servie par le cache, sans appel à Tesseract."""
+        cache_dir = str(tmp_path / "cache")
+        assert ocr_page("scan.pdf", 1, "fra", 200, cache_dir) == (1, "Texte de la page 1")
+        assert ocr_page("autre.pdf", 1, "fra", 200, cache_dir) == (1, "Texte de la page 1")
+        assert recognizer == [1]
+
+        ocr_page("scan.pdf", 2, "fra", 200, cache_dir)
+        ocr_page("scan.pdf", 2, "eng", 200, cache_dir)
+        assert recognizer == [1, 2, 2]
+
+    def test_workers_are_not_forked(self, tmp_path, monkeypatch):
+        """Le pool est créé sans fork : l'ingestion le crée depuis un thread du pipeline."""
+        created = []
+        monkeypatch.setattr(ocr_engine, "ProcessPoolExecutor",
+                            lambda max_workers, mp_context: created.append(mp_context) or InlineExecutor())
+        engine = OCREngine(workers=2, cache_dir=tmp_path / "cache")
+
+        assert engine.executor is engine.executor
+        context, = created
+        assert context.get_start_method() != "fork"
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Tests de la base vectorielle quantifiée (int8 + binaire)
+Exécution : pytest tests/test_quantized_store.py -v
+"""
+import sys
+from pathlib import Path
+
+import numpy as np
+
+# Ajouter le chemin parent pour les imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from school_assistant.chatbot.numpy_store import NumpyVectorStore, save_numpy_store
+from school_assistant.chatbot.quantized_store import QuantizedVectorStore
+
+COUNT, DIM = 600, 64
+
+
+def build(tmp_path):
+    rng = np.random.default_rng(3)
+    centers = rng.standard_normal((12, DIM))
+    vectors = centers[rng.integers(12, size=COUNT)] + rng.standard_normal((COUNT, DIM))
+    texts = [f"Chunk {i}" for i in range(COUNT)]
+    store_dir = save_numpy_store(tmp_path / "store", [str(i) for i in range(COUNT)], texts,
+                                 [{"page": i} for i in range(COUNT)], vectors, "model")
+    queries = centers[rng.integers(12, size=30)] + rng.standard_normal((30, DIM))
+    return store_dir, queries
+
+
+def recall(store, exact, queries, k=5):
+    return np.mean([
+        len(set(store.search_vectors(q, k)[0].tolist()) & set(exact.search_vectors(q, k)[0].tolist())) / k
+        for q in queries
+    ])
+
+
+class TestQuantizedVectorStore:
+    """Tests pour la recherche en cascade Hamming → int8 → float."""
+
+    def test_rescoring_recovers_exact_results(self, tmp_path):
+        """Avec rescoring, les résultats et scores sont ceux de la recherche exacte."""
+        store_dir, queries = build(tmp_path)
+        exact = NumpyVectorStore(store_dir, embedding=None)
+        store = QuantizedVectorStore(store_dir, embedding=None, binary_candidates=150, rescore_candidates=30)
+
+        assert recall(store, exact, queries) == 1.0
+        ids, scores = store.search_vectors(queries[0], 3)
+        exact_ids, exact_scores = exact.search_vectors(queries[0], 3)
+        assert ids.tolist() == exact_ids.tolist()
+        np.testing.assert_allclose(scores, exact_scores, rtol=1e-5)
+        assert store.similarity_search_by_vector(queries[0], k=1)[0].metadata == {"page": int(ids[0])}
+
+    def test_codes_are_compact_and_int8_alone_is_close(self, tmp_path):
+        """Les codes tiennent en ~1/3,5 des vecteurs float ; int8 seul garde un bon rappel."""
+        store_dir, queries = build(tmp_path)
+        store = QuantizedVectorStore(store_dir, embedding=None, binary_candidates=0, rescore_candidates=0)
+
+        assert store.resident_bytes < COUNT * DIM * 4 / 3.5
+        assert recall(store, NumpyVectorStore(store_dir, embedding=None), queries) >= 0.9
+        assert (store_dir / "codes_binary.npy").exists()